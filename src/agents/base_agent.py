@@ -1,67 +1,191 @@
 import google.generativeai as genai
-from typing import Dict, Any, List, Optional
+from typing import Callable, Dict, Any, List, Optional
 from ..config import config
 from ..services.observability import observability
+from ..clients.transport import GEMINI_HOST, extract_function_calls, wrap_model
+from ..services.circuit_breaker import CircuitOpenError, breakers
+from ..services.rate_limit import RateLimitedError, rate_limits
+from ..services.deadline import Deadline
+from ..services.profiler import TracedExecutor
+from ..services.context_builder import estimate_tokens
+from ..models import encode_json
+from .tool_dispatcher import ToolDispatcher
+import time
+from concurrent.futures import TimeoutError as FutureTimeout
 import uuid
 import json
 
 genai.configure(api_key=config.GOOGLE_API_KEY)
 
+# Model calls run here when a deadline is set, so the caller can stop waiting on time
+llm_pool = TracedExecutor(max_workers=config.LLM_WORKERS)
+
 class BaseAgent:
-    def __init__(self, name: str, instructions: str, tools: Optional[List] = None):
+    def __init__(self, name: str, instructions: str, tools: Optional[List] = None,
+                 tool_handlers: Optional[Dict[str, Callable[..., Any]]] = None):
         self.name = name
         self.instructions = instructions
         self.tools = tools or []
-        self.model = genai.GenerativeModel(
+        self.dispatcher = ToolDispatcher(tool_handlers or {}, config.TOOL_TIMEOUT_SECONDS)
+        self._tool_declarations = None
+        self.model = wrap_model(genai.GenerativeModel(
             model_name=config.MODEL_NAME,
             system_instruction=instructions
-        )
+        ), name)
     
-    def run(self, message: str, context: str = "", trace_id: Optional[str] = None) -> Dict[str, Any]:
+    def run(self, message: str, context: str = "", trace_id: Optional[str] = None,
+            deadline: Optional[Deadline] = None, session_id: str = "") -> Dict[str, Any]:
         if not trace_id:
             trace_id = str(uuid.uuid4())[:8]
         
         observability.log_agent_call(self.name, message, trace_id)
         
         full_prompt = f"{context}\n\nUser: {message}" if context else message
+        observability.log_prompt_size(self.name, estimate_tokens(full_prompt), len(full_prompt), trace_id)
+        
+        if deadline and deadline.remaining() < config.MIN_LLM_BUDGET:
+            deadline.mark_partial(f"{self.name} skipped, no time budget left")
+            return {"response": "⏱️ I ran out of time to think about that one. Please try again.", "tool_calls": []}
         
         try:
-            if self.tools:
-                response = self._run_with_tools(full_prompt, trace_id)
+            request_options = {"timeout": deadline.remaining()} if deadline else {}
+            if deadline:
+                response = llm_pool.submit(
+                    self._generate, full_prompt, trace_id, request_options, session_id, deadline
+                ).result(timeout=deadline.remaining())
             else:
-                chat = self.model.start_chat()
-                response = chat.send_message(full_prompt)
-                response = {"response": response.text, "tool_calls": []}
+                response = self._generate(full_prompt, trace_id, request_options, session_id)
             
             observability.log_agent_response(self.name, response["response"], trace_id)
             return response
             
+        except RateLimitedError:
+            # Surfaced to the API as a 429 rather than a canned answer
+            raise
+        except CircuitOpenError:
+            observability.logger.warning(f"[{trace_id}] {self.name}: Gemini circuit open, failing fast")
+            return {"response": "⚠️ The assistant is temporarily unavailable. Search, library and recommendations still work.", "tool_calls": []}
+        except FutureTimeout:
+            deadline.mark_partial(f"{self.name} timed out")
+            return {"response": "⏱️ That took too long to answer. Please try again.", "tool_calls": []}
         except Exception as e:
+            if deadline and deadline.expired:
+                deadline.mark_partial(f"{self.name} timed out")
+                return {"response": "⏱️ That took too long to answer. Please try again.", "tool_calls": []}
             error_msg = f"Error in {self.name}: {str(e)}"
             observability.logger.error(f"[{trace_id}] {error_msg}")
             return {"response": error_msg, "tool_calls": []}
     
-    def _run_with_tools(self, prompt: str, trace_id: str) -> Dict[str, Any]:
-        chat = self.model.start_chat(enable_automatic_function_calling=True)
+    def _generate(self, prompt: str, trace_id: str, request_options: Dict[str, Any], session_id: str = "",
+                  deadline: Optional[Deadline] = None) -> Dict[str, Any]:
+        if self.tools:
+            return self._run_with_tools(prompt, trace_id, request_options, session_id, deadline)
+        chat = self.model.start_chat()
+        response = self._send_message(chat, prompt, request_options)
+        return {"response": response.text, "tool_calls": []}
+    
+    def _send_message(self, chat: Any, content: Any, request_options: Dict[str, Any], **kwargs) -> Any:
+        # Every model call takes its own quota token and breaker check, not just the first of a turn
+        rate_limits.acquire_upstream(GEMINI_HOST)
+        breaker = breakers.get(GEMINI_HOST)
+        if not breaker.allow():
+            raise CircuitOpenError(f"Circuit open for {GEMINI_HOST}")
         
-        tool_declarations = []
-        for tool_def in self.tools:
-            tool_declarations.append(genai.protos.Tool(
-                function_declarations=[
-                    genai.protos.FunctionDeclaration(
-                        name=tool_def["name"],
-                        description=tool_def["description"],
-                        parameters=tool_def.get("parameters", {})
-                    )
-                ]
-            ))
+        start = time.perf_counter()
+        try:
+            response = chat.send_message(content, **self._send_kwargs(request_options), **kwargs)
+        except Exception:
+            breaker.record_failure(time.perf_counter() - start)
+            raise
+        breaker.record_success(time.perf_counter() - start)
+        return response
+    
+    def _send_kwargs(self, request_options: Dict[str, Any]) -> Dict[str, Any]:
+        return {"request_options": request_options} if request_options else {}
+    
+    def _run_with_tools(self, prompt: str, trace_id: str, request_options: Optional[Dict[str, Any]] = None,
+                        session_id: str = "", deadline: Optional[Deadline] = None) -> Dict[str, Any]:
+        # Function calls are executed here rather than by the SDK, so independent calls can run in parallel
+        chat = self.model.start_chat()
+        tools = self._get_tool_declarations()
         
-        response = chat.send_message(prompt, tools=tool_declarations)
+        response = self._send_message(chat, prompt, request_options or {}, tools=tools)
+        tool_calls = []
+        for _ in range(config.TOOL_MAX_STEPS):
+            calls = extract_function_calls(response)
+            if not calls:
+                break
+            # Past the deadline the caller has already been answered, so nothing may change after that
+            if deadline and deadline.expired:
+                deadline.mark_partial(f"{self.name} stopped before running its tool calls")
+                break
+            records = self.dispatcher.dispatch(calls, session_id, trace_id, deadline)
+            tool_calls.extend(records)
+            if deadline and deadline.expired:
+                deadline.mark_partial(f"{self.name} stopped after its tool calls")
+                break
+            options = {"timeout": deadline.remaining()} if deadline else request_options or {}
+            try:
+                response = self._send_message(chat, self._function_responses(records), options, tools=tools)
+            except (RateLimitedError, CircuitOpenError) as e:
+                # Tools have run by now, so a 429 would have the client resend and apply their writes twice
+                observability.logger.warning(f"[{trace_id}] {self.name}: follow-up model call refused after tools ran: {e}")
+                return self._partial_after_tools(tool_calls)
         
-        result_text = response.text if hasattr(response, 'text') else str(response)
+        result_text = self._response_text(response)
+        if not result_text and extract_function_calls(response):
+            if deadline and deadline.expired:
+                result_text = "⏱️ That took too long to answer. Please try again."
+            else:
+                result_text = "I needed more steps than allowed to finish that. Please try a narrower request."
         
         return {
             "response": result_text,
-            "tool_calls": [],
+            "tool_calls": tool_calls,
             "raw_response": response
-        }
\ No newline at end of file
+        }
+    
+    def _partial_after_tools(self, tool_calls: List[Dict[str, Any]]) -> Dict[str, Any]:
+        done = list(dict.fromkeys(record["name"] for record in tool_calls if "error" not in record))
+        failed = list(dict.fromkeys(record["name"] for record in tool_calls if "error" in record))
+        lines = ["⚠️ The assistant is busy, so I couldn't finish writing this answer."]
+        if done:
+            lines.append(f"These steps did complete and are saved: {', '.join(done)}. There's no need to send that again.")
+        if failed:
+            lines.append(f"These steps failed: {', '.join(failed)}.")
+        return {"response": "\n".join(lines), "tool_calls": tool_calls, "partial": True}
+    
+    def _get_tool_declarations(self) -> List[Any]:
+        if self._tool_declarations is None:
+            self._tool_declarations = [genai.protos.Tool(function_declarations=[
+                genai.types.FunctionDeclaration(
+                    name=tool_def["name"],
+                    description=tool_def["description"],
+                    parameters=self._schema(tool_def.get("parameters"))
+                ).to_proto()
+                for tool_def in self.tools
+            ])]
+        return self._tool_declarations
+    
+    def _schema(self, schema: Any) -> Any:
+        # The declaration schema has no "default"; the descriptions already state defaults
+        if isinstance(schema, dict):
+            return {key: self._schema(value) for key, value in schema.items() if key != "default"}
+        return schema
+    
+    def _function_responses(self, records: List[Dict[str, Any]]) -> List[Any]:
+        parts = []
+        for record in records:
+            payload = {"error": record["error"]} if "error" in record else {"result": record["result"]}
+            parts.append(genai.protos.Part(function_response=genai.protos.FunctionResponse(
+                name=record["name"],
+                response=json.loads(encode_json(payload))
+            )))
+        return parts
+    
+    def _response_text(self, response: Any) -> str:
+        try:
+            return response.text
+        except (ValueError, AttributeError):
+            # Responses that are only function calls have no text
+            return ""
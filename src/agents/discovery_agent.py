@@ -1,5 +1,7 @@
 from .base_agent import BaseAgent
 from ..tools.search_tools import SearchTools
+from ..services.deadline import Deadline
+from typing import Optional
 
 class DiscoveryAgent(BaseAgent):
     def __init__(self, search_tools: SearchTools):
@@ -24,12 +26,13 @@ Be smart, concise, and impressive in your recommendations."""
         super().__init__(
             name="DiscoveryAgent",
             instructions=instructions,
-            tools=search_tools.get_tool_definitions()
+            tools=search_tools.get_tool_definitions(),
+            tool_handlers=search_tools.get_tool_handlers()
         )
         self.search_tools = search_tools
     
-    def search(self, query: str, media_type: str, limit: int = 10) -> dict:
-        results = self.search_tools.search_media(query, media_type, limit)
+    def search(self, query: str, media_type: str, limit: int = 10, deadline: Optional[Deadline] = None) -> dict:
+        results = self.search_tools.search_media(query, media_type, limit, deadline)
         return {
             "response": f"Found {len(results)} {media_type} results for '{query}'",
             "results": results
@@ -24,6 +24,7 @@ Be organized, accurate, and helpful in managing the user's collection."""
         super().__init__(
             name="LibraryAgent",
             instructions=instructions,
-            tools=library_tools.get_tool_definitions()
+            tools=library_tools.get_tool_definitions(),
+            tool_handlers=library_tools.get_tool_handlers()
         )
         self.library_tools = library_tools
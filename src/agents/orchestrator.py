@@ -4,19 +4,50 @@ from .library_agent import LibraryAgent
 from .recommender_agent import RecommenderAgent
 from ..services.session_service import SessionService
 from ..services.memory_service import MemoryService
-from typing import Dict, Any
+from ..services.deadline import Deadline
+from ..services.precompute import PrecomputeScheduler
+from ..services.context_builder import ContextBuilder
+from ..config import config
+from typing import Dict, Any, Optional
 import re
 
+SIMILAR_RE = re.compile(r"\b(?:similar to|more like)\s+(.+?)[\s?.!]*$", re.IGNORECASE)
+ITEM_ID_RE = re.compile(r"\b((?:tmdb|anilist)_[a-z]+_\d+)\b")
+RESULT_NUMBER_RE = re.compile(r"#?\d+")
+ORDINALS = {"first": 1, "second": 2, "third": 3, "fourth": 4, "fifth": 5, "sixth": 6,
+            "seventh": 7, "eighth": 8, "ninth": 9, "tenth": 10, "last": -1}
+REFERENCE_WORDS = {"the", "one", "that", "this", "it", "number", "no.", "result", "from", "list"} | set(ORDINALS)
+MAX_RESULT_SETS = 3
+# Admission priorities: local lookups first, then upstream searches, then free-form Gemini turns
+PRIORITY_LOCAL = 0
+PRIORITY_UPSTREAM = 1
+PRIORITY_LLM = 2
+
 class OrchestratorAgent(BaseAgent):
     def __init__(self, discovery_agent: DiscoveryAgent, library_agent: LibraryAgent, 
                  recommender_agent: RecommenderAgent, session_service: SessionService,
-                 memory_service: MemoryService):
+                 memory_service: MemoryService, precompute: Optional[PrecomputeScheduler] = None):
         
         self.discovery_agent = discovery_agent
         self.library_agent = library_agent
         self.recommender_agent = recommender_agent
         self.session_service = session_service
         self.memory_service = memory_service
+        self.similarity_index = discovery_agent.search_tools.similarity_index
+        memory_service.subscribe(self.similarity_index.on_library_event)
+        self.precompute = precompute or PrecomputeScheduler(
+            memory_service, recommender_agent.recommendation_tools,
+            workers=config.PRECOMPUTE_WORKERS,
+            debounce=config.PRECOMPUTE_DEBOUNCE_SECONDS,
+            max_wait=config.PRECOMPUTE_MAX_WAIT_SECONDS,
+            active_window=config.PRECOMPUTE_ACTIVE_SECONDS
+        )
+        self.context_builder = ContextBuilder(
+            session_service,
+            token_budget=config.CONTEXT_TOKEN_BUDGET,
+            recent_turns=config.CONTEXT_RECENT_TURNS,
+            summary_tokens=config.CONTEXT_SUMMARY_TOKENS
+        )
         
         instructions = """You are the Orchestrator Agent - the intelligent brain coordinating all media tracking operations.
 
@@ -42,31 +73,49 @@ Always:
 - Chain agents when needed (e.g., search → add to library)
 - Impress with your intelligence and helpfulness"""
 
-        super().__init__(name="OrchestratorAgent", instructions=instructions)
+        # Free-form turns can call any specialist's tools directly
+        agents = [discovery_agent, library_agent, recommender_agent]
+        super().__init__(
+            name="OrchestratorAgent",
+            instructions=instructions,
+            tools=[tool for agent in agents for tool in agent.tools],
+            tool_handlers={name: handler for agent in agents for name, handler in agent.dispatcher.handlers.items()}
+        )
     
-    def process(self, session_id: str, message: str) -> Dict[str, Any]:
+    def process(self, session_id: str, message: str, deadline: Optional[Deadline] = None,
+                trace_id: Optional[str] = None) -> Dict[str, Any]:
         session = self.session_service.get_session(session_id)
         if not session:
             session = self.session_service.create_session(session_id)
         
-        context = self.memory_service.get_context_summary(session_id)
+        self.precompute.touch(session_id)
         message_lower = message.lower()
+        agent_partial = False
+        similar_match = SIMILAR_RE.search(message)
+        
+        if similar_match:
+            response = self._similar_response(session_id, similar_match, message_lower[:similar_match.start()])
         
-        if any(word in message_lower for word in ["add", "save"]) and any(word in message_lower for word in ["library", "collection", "list"]):
+        elif self._is_add_request(message_lower):
             title = self._extract_title(message)
-            media_type = self._extract_media_type(message_lower) or "anime"
+            media_type = self._extract_media_type(message_lower)
+            item = self._resolve_result(session_id, title, media_type)
             
-            if title:
-                search_result = self.discovery_agent.search(title, media_type, 5)
-                
+            # Bare numbers can be titles ("86"); "#2" and "that one" never are
+            if item is None and title and not title.startswith("#") and not all(word in REFERENCE_WORDS for word in title.split()):
+                search_result = self.discovery_agent.search(title, media_type or self._last_media_type(session_id), 5, deadline)
                 if search_result.get("results"):
-                    first_item = search_result["results"][0]
-                    add_result = self.library_agent.library_tools.add_to_library(session_id, first_item)
-                    
-                    response = f"✅ Added **{first_item['title']}** to your library!\n"
-                    response += f"Type: {first_item['type']} | Score: {first_item.get('score', 'N/A')}/10"
-                else:
-                    response = f"❌ Couldn't find '{title}'. Try searching first to see available options."
+                    item = search_result["results"][0]
+            
+            if item:
+                add_result = self.library_agent.library_tools.add_to_library(session_id, item)
+                
+                response = f"✅ Added **{item['title']}** to your library!\n"
+                response += f"Type: {item['type']} | Score: {item.get('score', 'N/A')}/10"
+            elif self._is_reference(title):
+                response = "❌ I don't have recent results to pick from. Search first, then say e.g. 'add #2'."
+            elif title:
+                response = f"❌ Couldn't find '{title}'. Try searching first to see available options."
             else:
                 response = "Please specify what you want to add. Example: 'add Naruto to my library'"
         
@@ -74,15 +123,21 @@ Always:
             media_type = self._extract_media_type(message_lower)
             if media_type:
                 query = message.replace("search", "").replace("find", "").replace(media_type, "").strip()
-                result = self.discovery_agent.search(query, media_type)
+                result = self.discovery_agent.search(query, media_type, deadline=deadline)
+                self._remember_results(session_id, query, media_type, result.get("results", []))
+                self.discovery_agent.search_tools.prefetch_details(result.get("results", []), config.PREFETCH_TOP_RESULTS)
                 response = self._format_search_results(result)
             else:
                 response = "What type of media would you like to search for? (anime, movie, tv, or manga)"
         
         elif any(word in message_lower for word in ["recommend", "suggestion", "what should i"]):
             media_type = self._extract_media_type(message_lower)
-            recs = self.recommender_agent.recommendation_tools.get_recommendations(session_id, media_type, 5)
+            recs = self.precompute.recommendations(session_id, media_type, 5)
             response = self._format_recommendations(recs)
+            
+            also_tracked = self.precompute.also_tracked(session_id, media_type, 5)
+            if also_tracked:
+                response += self._format_also_tracked(also_tracked)
         
         elif any(word in message_lower for word in ["library", "list", "show my", "my collection"]):
             items = self.library_agent.library_tools.list_library(session_id)
@@ -106,7 +161,16 @@ Try saying:
 
 What would you like to do?"""
             else:
-                response = self.run(message, context)["response"]
+                context = self.context_builder.build(session_id, self.precompute.context_summary(session_id))
+                result = self.run(message, context, trace_id=trace_id, deadline=deadline, session_id=session_id)
+                response = result["response"]
+                # The agent's own partial answers explain themselves
+                agent_partial = bool(result.get("partial"))
+        
+        timed_out = bool(deadline and deadline.partial)
+        if timed_out and not response.startswith("⏱️"):
+            response += "\n\n⏱️ Some results took too long and were left out. Ask again to load the rest."
+        partial = timed_out or agent_partial
         
         self.session_service.update_session(session_id, {
             "role": "user",
@@ -117,10 +181,95 @@ What would you like to do?"""
             "content": response
         })
         
-        return {"response": response, "session_id": session_id}
+        return {"response": response, "session_id": session_id, "partial": partial}
+    
+    def classify(self, message: str) -> int:
+        # Mirrors the routing in process without doing any of the work
+        message_lower = message.lower()
+        if SIMILAR_RE.search(message):
+            return PRIORITY_LOCAL
+        if self._is_add_request(message_lower):
+            return PRIORITY_UPSTREAM
+        if any(word in message_lower for word in ["search", "find", "discover", "look for"]):
+            return PRIORITY_UPSTREAM
+        if any(word in message_lower for word in ["recommend", "suggestion", "what should i", "library", "list",
+                                                  "show my", "my collection", "hello", "hi", "hey", "help"]):
+            return PRIORITY_LOCAL
+        return PRIORITY_LLM
+    
+    def _similar_response(self, session_id: str, match: re.Match, prefix: str) -> str:
+        target = match.group(1).strip().strip("\"'")
+        id_match = ITEM_ID_RE.search(target)
+        item = self.similarity_index.get(id_match.group(1)) if id_match else self.similarity_index.find_by_title(target)
+        if not item:
+            return f"❌ I haven't seen '{target}' yet. Search for it first, then ask for similar titles."
+        
+        # Only filter on an explicit type word; "show me ..." is not a request for TV
+        media_type = next((t for t in ["anime", "movie", "manga", "tv"] if t in prefix.split()), None)
+        results = self.discovery_agent.search_tools.find_similar(item.id, 5, media_type)
+        if not results:
+            return f"❌ I don't know enough titles like **{item.title}** yet. Try a few more searches!"
+        
+        self._remember_results(session_id, item.title, media_type or item.type, [result["item"] for result in results])
+        response = f"🔗 Titles similar to **{item.title}**:\n\n"
+        for i, result in enumerate(results, 1):
+            similar = result["item"]
+            response += f"{i}. **{similar['title']}** ({similar['type']}) - Similarity: {result['similarity']}\n"
+            if similar.get('overview'):
+                response += f"   📝 {similar['overview'][:100]}...\n"
+            response += f"   🆔 ID: {similar['id']}\n\n"
+        
+        return response
+    
+    def _is_add_request(self, message_lower: str) -> bool:
+        words = message_lower.split()
+        if not any(word in message_lower for word in ["add", "save"]):
+            return False
+        if any(word in message_lower for word in ["library", "collection", "list"]):
+            return True
+        # "add #2", "add the second one", "save that one"
+        return bool(words) and words[0] in ["add", "save"] and self._is_reference(self._extract_title(message_lower))
+    
+    def _is_reference(self, title: str) -> bool:
+        words = title.split()
+        return bool(words) and all(word in REFERENCE_WORDS or RESULT_NUMBER_RE.fullmatch(word) for word in words)
+    
+    def _remember_results(self, session_id: str, query: str, media_type: str, results: list):
+        if not results:
+            return
+        state = self.session_service.get_workflow_state(session_id)
+        result_sets = [{"query": query, "media_type": media_type, "results": results}]
+        result_sets += state.get("result_sets", [])[:MAX_RESULT_SETS - 1]
+        self.session_service.save_workflow_state(session_id, {**state, "result_sets": result_sets})
+    
+    def _last_media_type(self, session_id: str) -> str:
+        result_sets = self.session_service.get_workflow_state(session_id).get("result_sets", [])
+        return result_sets[0]["media_type"] if result_sets else "anime"
+    
+    def _resolve_result(self, session_id: str, title: str, media_type: str) -> Optional[Dict[str, Any]]:
+        result_sets = self.session_service.get_workflow_state(session_id).get("result_sets", [])
+        if not result_sets or not title:
+            return None
+        
+        if self._is_reference(title):
+            results = result_sets[0]["results"]
+            words = title.split()
+            position = next((int(word.lstrip("#")) for word in words if RESULT_NUMBER_RE.fullmatch(word)), None)
+            if position is None:
+                position = next((ORDINALS[word] for word in words if word in ORDINALS), 1)
+            index = position - 1 if position > 0 else len(results) + position
+            return results[index] if 0 <= index < len(results) else None
+        
+        # A title the user just saw: exact match first, then the first partial match, newest set first
+        candidates = [
+            result for result_set in result_sets for result in result_set["results"]
+            if not media_type or result["type"] == media_type
+        ]
+        exact = next((result for result in candidates if result["title"].lower() == title), None)
+        return exact or next((result for result in candidates if title in result["title"].lower()), None)
     
     def _extract_title(self, message: str) -> str:
-        words_to_remove = ["add", "save", "to", "my", "library", "collection", "please", "can", "you", 
+        words_to_remove = ["add", "save", "to", "my", "library", "collection", "list", "please", "can", "you", 
                             "anime", "movie", "tv", "show", "manga", "series"]
     
         words = message.lower().split()
@@ -167,6 +316,16 @@ What would you like to do?"""
         
         return response
     
+    def _format_also_tracked(self, recs: list) -> str:
+        response = "👥 Users with similar libraries also tracked:\n\n"
+        for i, rec in enumerate(recs, 1):
+            item = rec["item"]
+            response += f"{i}. **{item['title']}** ({item['type']})\n"
+            response += f"   📌 {rec['reason']}\n"
+            response += f"   🆔 ID: {item['id']}\n\n"
+        
+        return response
+    
     def _format_library(self, items: list) -> str:
         if not items:
             return "📚 Your library is empty. Start by searching and adding some content!"
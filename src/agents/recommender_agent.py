@@ -25,6 +25,7 @@ Be insightful and make users excited about your suggestions!"""
         super().__init__(
             name="RecommenderAgent",
             instructions=instructions,
-            tools=recommendation_tools.get_tool_definitions()
+            tools=recommendation_tools.get_tool_definitions(),
+            tool_handlers=recommendation_tools.get_tool_handlers()
         )
         self.recommendation_tools = recommendation_tools
@@ -0,0 +1,63 @@
+import time
+from concurrent.futures import TimeoutError as FutureTimeout
+from typing import Any, Callable, Dict, List, Optional
+
+from ..config import config
+from ..services.deadline import Deadline
+from ..services.observability import observability
+from ..services.profiler import TracedExecutor
+
+# (session_id, args, deadline) -> JSON-serializable result
+ToolHandler = Callable[[str, Dict[str, Any], Optional[Deadline]], Any]
+
+# Tool calls from one model turn run here side by side; shared so many turns cannot oversubscribe upstreams
+tool_pool = TracedExecutor(max_workers=config.TOOL_WORKERS)
+
+class ToolDispatcher:
+    def __init__(self, handlers: Dict[str, ToolHandler], timeout: float = 10.0):
+        self.handlers = handlers
+        self.timeout = timeout
+
+    def dispatch(self, calls: List[Dict[str, Any]], session_id: str, trace_id: str,
+                 deadline: Optional[Deadline] = None) -> List[Dict[str, Any]]:
+        # Even a single call goes through the pool, so the tool timeout and the deadline always bound it
+        futures = [tool_pool.submit(self._run, call, session_id, trace_id, deadline) for call in calls]
+        records = []
+        give_up_at = time.monotonic() + self.timeout
+        for call, future in zip(calls, futures):
+            # The turn takes as long as its slowest tool, bounded by the tool timeout and the request deadline
+            timeout = give_up_at - time.monotonic()
+            if deadline:
+                timeout = min(timeout, deadline.remaining())
+            timeout = max(timeout, 0)
+            try:
+                records.append(future.result(timeout=timeout))
+            except FutureTimeout:
+                if deadline:
+                    deadline.mark_partial(f"Tool {call['name']} timed out")
+                records.append({"name": call["name"], "args": call.get("args") or {},
+                                "error": "timed out", "elapsed_ms": round(timeout * 1000, 2)})
+        return records
+
+    def _run(self, call: Dict[str, Any], session_id: str, trace_id: str,
+             deadline: Optional[Deadline] = None) -> Dict[str, Any]:
+        name = call["name"]
+        args = call.get("args") or {}
+        observability.log_tool_call(name, args, trace_id)
+
+        record = {"name": name, "args": args}
+        start = time.perf_counter()
+        handler = self.handlers.get(name)
+        try:
+            if handler is None:
+                raise ValueError(f"Unknown tool '{name}'")
+            if deadline and deadline.expired:
+                # Queued past the deadline: the turn has already been answered without it
+                raise TimeoutError("skipped, the request ran out of time")
+            record["result"] = handler(session_id, args, deadline)
+        except Exception as e:
+            record["error"] = str(e)
+        record["elapsed_ms"] = round((time.perf_counter() - start) * 1000, 2)
+
+        observability.log_tool_result(name, record.get("result", record.get("error")), trace_id, record["elapsed_ms"])
+        return record
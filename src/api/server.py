@@ -1,6 +1,14 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, Header, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import Response, StreamingResponse
 from pydantic import BaseModel
-from typing import Optional
+from typing import Any, BinaryIO, Dict, List, Optional, Tuple
+import asyncio
+import hmac
+import os
+import random
+import re
+import tempfile
 import uuid
 
 from ..agents.orchestrator import OrchestratorAgent
@@ -10,16 +18,50 @@ from ..agents.recommender_agent import RecommenderAgent
 from ..tools.search_tools import SearchTools
 from ..tools.library_tools import LibraryTools
 from ..tools.recommendation_tools import RecommendationTools
+from ..tools.import_tools import ImportTools
 from ..services.session_service import SessionService
 from ..services.memory_service import MemoryService
 from ..services.observability import observability
+from ..services.deadline import Deadline
+from ..services.circuit_breaker import OPEN, breakers
+from ..services.single_flight import flights
+from ..services.rate_limit import AdmissionController, RateLimitedError, rate_limits
+from ..services.poster_cache import get_poster_cache
+from ..services.similarity_index import SimilarityIndex
+from ..services.snapshot import SnapshotManager, decode_page, encode_page
+from ..services.profiler import DETERMINISTIC, SAMPLE, profiles
+from ..config import config
+from ..models import encode_json
 
 session_service = SessionService()
 memory_service = MemoryService()
 
-search_tools = SearchTools()
+# Libraries must be back before the recommendation models index them
+snapshots = SnapshotManager(config.SNAPSHOT_PATH, session_service)
+snapshots.register("memory", 1, memory_service.export_state, memory_service.import_state)
+snapshots.register("journal", 1, memory_service.journal.export_state, memory_service.journal.import_state)
+
+similarity_index = SimilarityIndex(config.SIMILARITY_INDEX_PATH, max_items=config.SIMILARITY_MAX_ITEMS)
+similarity_index.start_autosave(config.SIMILARITY_SAVE_SECONDS)
+
+search_tools = SearchTools(similarity_index)
+snapshots.register_cache("tmdb_search", search_tools.tmdb.guard.cache, encode_page, decode_page)
+snapshots.register_cache("anilist_search", search_tools.anilist.guard.cache, encode_page, decode_page)
+snapshots.register_cache("tmdb_tv_details", search_tools.tmdb.detail_cache)
+snapshots.register("tmdb_genres", 1, search_tools.tmdb.export_genres, search_tools.tmdb.import_genres)
+snapshots.start_periodic(config.SNAPSHOT_INTERVAL_SECONDS)
 library_tools = LibraryTools(memory_service)
 recommendation_tools = RecommendationTools(memory_service)
+poster_cache = get_poster_cache()
+recommendation_tools.similarity.start_background_refresh(config.CF_REFRESH_SECONDS)
+import_tools = ImportTools(
+    search_tools, memory_service,
+    max_workers=config.IMPORT_MAX_WORKERS,
+    batch_size=config.IMPORT_BATCH_SIZE,
+    resolve_timeout=config.IMPORT_RESOLVE_TIMEOUT_SECONDS,
+    max_attempts=config.IMPORT_MAX_ATTEMPTS,
+    report_titles=config.IMPORT_REPORT_TITLES
+)
 
 discovery_agent = DiscoveryAgent(search_tools)
 library_agent = LibraryAgent(library_tools)
@@ -29,8 +71,79 @@ orchestrator = OrchestratorAgent(
     session_service, memory_service
 )
 
+# Shared by every batch so concurrent batches cannot multiply the cap
+batch_slots = asyncio.Semaphore(config.CHAT_BATCH_CONCURRENCY)
+admission = AdmissionController(
+    config.ADMISSION_MAX_INFLIGHT,
+    config.ADMISSION_QUEUE_SIZE,
+    config.ADMISSION_MAX_WAIT_SECONDS
+)
+
 app = FastAPI(title="Media Recommendation Agent System", version="1.0.0")
 
+@app.on_event("shutdown")
+def save_indexes():
+    similarity_index.save()
+    snapshots.save()
+
+class FileRangeResponse(Response):
+    chunk_size = 64 * 1024
+
+    def __init__(self, file: BinaryIO, offset: int, length: int, status_code: int,
+                 headers: Dict[str, str], media_type: str):
+        self.file = file
+        self.offset = offset
+        self.length = length
+        self.status_code = status_code
+        self.media_type = media_type
+        self.background = None
+        self.init_headers({**headers, "content-length": str(length)})
+
+    async def __call__(self, scope: Dict[str, Any], receive: Any, send: Any):
+        try:
+            await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+            if scope["method"] == "HEAD" or not self.length:
+                await send({"type": "http.response.body", "body": b"", "more_body": False})
+                return
+
+            # Let the server sendfile() straight from the page cache when it supports it
+            if "http.response.zerocopysend" in scope.get("extensions", {}):
+                await send({"type": "http.response.zerocopysend", "file": self.file,
+                            "offset": self.offset, "count": self.length})
+                return
+
+            offset, remaining = self.offset, self.length
+            while remaining:
+                chunk = await run_in_threadpool(os.pread, self.file.fileno(), min(self.chunk_size, remaining), offset)
+                if not chunk:
+                    break
+                offset += len(chunk)
+                remaining -= len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+            if remaining:
+                await send({"type": "http.response.body", "body": b"", "more_body": False})
+        finally:
+            self.file.close()
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    # Single byte ranges only; anything else is served as a full response
+    match = re.fullmatch(r"\s*bytes=(\d*)-(\d*)\s*", header or "")
+    if not match or not any(match.groups()):
+        return None
+    start, end = match.groups()
+    if not start:
+        length = min(int(end), size)
+        return (size - length, size - 1) if length else (size, size - 1)
+    start = int(start)
+    end = min(int(end), size - 1) if end else size - 1
+    return start, end
+
+def etag_matches(header: Optional[str], etag: str) -> bool:
+    if not header:
+        return False
+    candidates = [value.strip().removeprefix("W/") for value in header.split(",")]
+    return "*" in candidates or etag in candidates
+
 class ChatRequest(BaseModel):
     message: str
     session_id: Optional[str] = None
@@ -38,27 +151,303 @@ class ChatRequest(BaseModel):
 class ChatResponse(BaseModel):
     response: str
     session_id: str
+    partial: bool = False
+
+class BatchChatRequest(BaseModel):
+    items: List[ChatRequest]
+
+class BatchChatResult(BaseModel):
+    index: int
+    session_id: str
+    trace_id: str
+    response: Optional[str] = None
+    partial: bool = False
+    # Mirrors what /chat would have answered for this message alone
+    status: int = 200
+    error: Optional[str] = None
+    retry_after: Optional[int] = None
+
+class BatchChatResponse(BaseModel):
+    results: List[BatchChatResult]
+
+def too_many_requests(error: RateLimitedError) -> HTTPException:
+    return HTTPException(status_code=429, detail=str(error), headers={"Retry-After": error.retry_after_header})
+
+def is_profile_admin(token: Optional[str]) -> bool:
+    return bool(config.PROFILE_TOKEN) and hmac.compare_digest(token or "", config.PROFILE_TOKEN)
+
+def profile_mode(raw: Request) -> Optional[str]:
+    requested = raw.headers.get("X-Profile") or raw.query_params.get("profile")
+    if requested and is_profile_admin(raw.headers.get("X-Profile-Token")):
+        return DETERMINISTIC if requested == DETERMINISTIC else SAMPLE
+    if config.PROFILE_SAMPLE_RATE and random.random() < config.PROFILE_SAMPLE_RATE:
+        return SAMPLE
+    return None
+
+async def admitted_process(session_id: str, message: str, trace_id: str,
+                           profile: Optional[str] = None) -> Dict[str, Any]:
+    async with admission.slot(orchestrator.classify(message)):
+        # The deadline starts once admitted, so queueing never eats into the work budget
+        deadline = Deadline(config.CHAT_DEADLINE_SECONDS)
+        if profile:
+            work = run_in_threadpool(
+                profiles.run, trace_id, f"chat {session_id}", profile,
+                orchestrator.process, session_id, message, deadline, trace_id
+            )
+        else:
+            work = run_in_threadpool(orchestrator.process, session_id, message, deadline, trace_id)
+        try:
+            return await asyncio.wait_for(work, config.CHAT_DEADLINE_SECONDS + config.CHAT_DEADLINE_GRACE)
+        except asyncio.TimeoutError:
+            # The worker thread finishes on its own; the client gets its answer on time
+            observability.logger.warning(f"[{trace_id}] chat for {session_id} overran its deadline")
+            return {"response": "⏱️ That took too long to answer. Please try again.",
+                    "session_id": session_id, "partial": True}
 
 @app.post("/chat", response_model=ChatResponse)
-async def chat(request: ChatRequest):
+async def chat(request: ChatRequest, raw: Request, response: Response):
+    session_id = request.session_id or str(uuid.uuid4())
+    wait = rate_limits.session_wait(session_id)
+    if wait:
+        raise too_many_requests(RateLimitedError("Too many messages for this session", wait))
+    trace_id = uuid.uuid4().hex[:12]
+    profile = profile_mode(raw)
+    response.headers["X-Trace-Id"] = trace_id
+    if profile:
+        response.headers["X-Profile-Id"] = trace_id
     try:
-        session_id = request.session_id or str(uuid.uuid4())
-        result = orchestrator.process(session_id, request.message)
+        result = await admitted_process(session_id, request.message, trace_id, profile)
         return ChatResponse(
             response=result["response"],
-            session_id=result["session_id"]
+            session_id=result["session_id"],
+            partial=result["partial"]
         )
+    except RateLimitedError as e:
+        raise too_many_requests(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/chat/batch", response_model=BatchChatResponse)
+async def chat_batch(request: BatchChatRequest):
+    if len(request.items) > config.CHAT_BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"At most {config.CHAT_BATCH_MAX_ITEMS} items per batch")
+    
+    # Items without a session id each start their own session
+    sessions: Dict[str, List[int]] = {}
+    session_ids = []
+    for index, item in enumerate(request.items):
+        session_id = item.session_id or str(uuid.uuid4())
+        session_ids.append(session_id)
+        sessions.setdefault(session_id, []).append(index)
+    
+    results: List[Optional[BatchChatResult]] = [None] * len(request.items)
+    
+    def rate_limited(index: int, session_id: str, trace_id: str, error: RateLimitedError) -> BatchChatResult:
+        return BatchChatResult(
+            index=index, session_id=session_id, trace_id=trace_id, status=429,
+            error=f"{error}; retry after {error.retry_after_header}s",
+            retry_after=int(error.retry_after_header)
+        )
+    
+    async def run_session(session_id: str, indexes: List[int]):
+        # One session's messages run in order; different sessions interleave
+        for index in indexes:
+            trace_id = uuid.uuid4().hex[:12]
+            # Each message costs a session token, exactly as it would through /chat
+            wait = rate_limits.session_wait(session_id)
+            if wait:
+                results[index] = rate_limited(index, session_id, trace_id,
+                                              RateLimitedError("Too many messages for this session", wait))
+                continue
+            async with batch_slots:
+                try:
+                    result = await admitted_process(session_id, request.items[index].message, trace_id)
+                    results[index] = BatchChatResult(
+                        index=index, session_id=session_id, trace_id=trace_id,
+                        response=result["response"], partial=result["partial"]
+                    )
+                except RateLimitedError as e:
+                    results[index] = rate_limited(index, session_id, trace_id, e)
+                except Exception as e:
+                    results[index] = BatchChatResult(index=index, session_id=session_id, trace_id=trace_id,
+                                                     status=500, error=str(e))
+    
+    await asyncio.gather(*(run_session(session_id, indexes) for session_id, indexes in sessions.items()))
+    return BatchChatResponse(results=results)
+
 @app.get("/health")
 async def health():
-    return {"status": "healthy", "metrics": observability.get_metrics()}
+    upstreams = breakers.snapshot()
+    status = "degraded" if any(b["state"] == OPEN for b in upstreams.values()) else "healthy"
+    return {
+        "status": status,
+        "metrics": observability.get_metrics(),
+        "upstreams": upstreams,
+        "coalescing": flights.snapshot(),
+        "posters": poster_cache.snapshot(),
+        "tools": observability.get_tool_timings(),
+        "admission": admission.snapshot(),
+        "snapshots": snapshots.snapshot(),
+        "rate_limits": rate_limits.snapshot(),
+        "precompute": orchestrator.precompute.snapshot()
+    }
+
+@app.get("/search")
+async def search(q: str = "",
+                 media_type: str = Query("anime", alias="type"),
+                 cursor: Optional[str] = None,
+                 limit: int = Query(20, ge=1, le=config.SEARCH_MAX_LIMIT)):
+    try:
+        page = await run_in_threadpool(search_tools.search_page, q, media_type, cursor, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return Response(content=encode_json(page), media_type="application/json")
+
+@app.get("/admin/profiles")
+async def list_profiles(x_profile_token: Optional[str] = Header(None)):
+    if not is_profile_admin(x_profile_token):
+        raise HTTPException(status_code=403, detail="Profiling is not enabled for this token")
+    return {"profiles": profiles.list()}
+
+@app.get("/admin/profiles/{trace_id}")
+async def get_profile(trace_id: str, format: str = "folded", x_profile_token: Optional[str] = Header(None)):
+    if not is_profile_admin(x_profile_token):
+        raise HTTPException(status_code=403, detail="Profiling is not enabled for this token")
+    profile = profiles.get(trace_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="No recent profile for that trace")
+    
+    if format == "folded":
+        return Response(content=profile.folded_text(), media_type="text/plain",
+                        headers={"Content-Disposition": f'attachment; filename="{trace_id}.folded"'})
+    if format == "pstats" and profile.stats:
+        return Response(content=profile.pstats_bytes(), media_type="application/octet-stream",
+                        headers={"Content-Disposition": f'attachment; filename="{trace_id}.pstats"'})
+    if format == "text":
+        return Response(content=profile.text(), media_type="text/plain")
+    if format == "json":
+        return dict(profile.summary(), folded=profile.folded)
+    raise HTTPException(status_code=400, detail=f"Format must be one of {profile.summary()['formats'] + ['json']}")
 
 @app.get("/library/{session_id}")
-async def get_library(session_id: str):
-    items = library_tools.list_library(session_id)
-    return {"session_id": session_id, "items": items}
+async def get_library(session_id: str,
+                      media_type: Optional[str] = Query(None, alias="type"),
+                      status: Optional[str] = None,
+                      genre: Optional[str] = None,
+                      min_score: Optional[float] = None,
+                      max_score: Optional[float] = None,
+                      sort: str = "added",
+                      order: str = "asc",
+                      cursor: Optional[str] = None,
+                      limit: int = Query(50, ge=1, le=500),
+                      fields: Optional[str] = None,
+                      format: str = "json"):
+    filters = {
+        "media_type": media_type, "status": status, "genre": genre,
+        "min_score": min_score, "max_score": max_score, "sort": sort, "order": order,
+        "fields": [f.strip() for f in fields.split(",") if f.strip()] if fields else None
+    }
+    
+    try:
+        if format == "ndjson":
+            rows = library_tools.iter_library(session_id, **filters)
+            first = next(rows, None)
+            
+            def export():
+                if first is None:
+                    return
+                lines = [encode_json(first)]
+                for row in rows:
+                    lines.append(encode_json(row))
+                    if len(lines) >= 256:
+                        yield "\n".join(lines) + "\n"
+                        lines = []
+                if lines:
+                    yield "\n".join(lines) + "\n"
+            
+            return StreamingResponse(export(), media_type="application/x-ndjson")
+        
+        page = library_tools.query_library(session_id, cursor=cursor, limit=limit, **filters)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    body = {"session_id": session_id, "items": page["items"], "next_cursor": page["next_cursor"]}
+    return Response(content=encode_json(body), media_type="application/json")
+
+@app.get("/analytics/{session_id}")
+async def analytics(session_id: str, weeks: int = Query(12, ge=1, le=104)):
+    return memory_service.journal.analytics(session_id, weeks)
+
+@app.post("/library/{session_id}/import")
+async def import_library(session_id: str, request: Request, format: Optional[str] = None,
+                         media_type: str = "anime"):
+    # Spool the upload so large exports never sit fully in memory
+    with tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024) as upload:
+        async for chunk in request.stream():
+            upload.write(chunk)
+        upload.seek(0)
+        try:
+            report = await run_in_threadpool(
+                import_tools.import_library, session_id, upload, format, media_type
+            )
+        except (ValueError, SyntaxError) as e:
+            raise HTTPException(status_code=400, detail=f"Invalid export file: {e}")
+    return report
+
+@app.api_route("/posters/{key}", methods=["GET", "HEAD"])
+async def get_poster(key: str, request: Request):
+    if not re.fullmatch(r"[0-9a-f]{32}", key):
+        raise HTTPException(status_code=404, detail="Unknown poster")
+    try:
+        poster = await poster_cache.get_async(key, request.query_params.get("src"))
+    except Exception as e:
+        observability.logger.warning(f"Poster {key} unavailable: {e}")
+        raise HTTPException(status_code=502, detail="Poster unavailable upstream")
+    if poster is None:
+        raise HTTPException(status_code=404, detail="Unknown poster")
+    
+    headers = {"ETag": poster.etag, "Cache-Control": "public, max-age=86400", "Accept-Ranges": "bytes"}
+    if etag_matches(request.headers.get("if-none-match"), poster.etag):
+        return Response(status_code=304, headers=headers)
+    
+    try:
+        file = open(poster.path, "rb")
+    except FileNotFoundError:
+        # Evicted between lookup and open
+        raise HTTPException(status_code=503, detail="Poster is being refreshed, retry shortly", headers={"Retry-After": "1"})
+    size = os.fstat(file.fileno()).st_size
+    
+    byte_range = None
+    if_range = request.headers.get("if-range")
+    if not if_range or if_range == poster.etag:
+        byte_range = parse_range(request.headers.get("range"), size)
+    if byte_range is None:
+        return FileRangeResponse(file, 0, size, 200, headers, poster.content_type)
+    
+    start, end = byte_range
+    if start >= size or start > end:
+        file.close()
+        return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{size}"})
+    headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    return FileRangeResponse(file, start, end - start + 1, 206, headers, poster.content_type)
+
+def import_main(path: str, session_id: Optional[str], fmt: Optional[str], media_type: str):
+    session_id = session_id or str(uuid.uuid4())
+    print(f"Importing {path} into session {session_id}")
+    
+    def show_progress(report):
+        print(f"  processed={report['processed']} added={report['added']} "
+              f"unresolved={report['unresolved_count']} failed={report['failed_count']} ({report['elapsed_seconds']}s)")
+    
+    with open(path, "rb") as f:
+        report = import_tools.import_library(session_id, f, fmt, media_type, show_progress)
+    
+    print(f"Done: {report['added']} added, {report['duplicates']} duplicates, "
+          f"{report['unresolved_count']} unresolved, {report['failed_count']} failed, {report['cache_hits']} cache hits")
+    for title in report["unresolved"][:20]:
+        print(f"  - not found: {title}")
+    for title in report["failed"][:20]:
+        print(f"  - lookup failed, import again to retry: {title}")
 
 def cli_main():
     print("Media Recommendation Agent System")
@@ -85,7 +474,16 @@ def cli_main():
 
 if __name__ == "__main__":
     import sys
-    if "--cli" in sys.argv:
+    
+    def arg_value(flag: str, default: Optional[str] = None) -> Optional[str]:
+        if flag in sys.argv and sys.argv.index(flag) + 1 < len(sys.argv):
+            return sys.argv[sys.argv.index(flag) + 1]
+        return default
+    
+    if "--import" in sys.argv:
+        import_main(arg_value("--import"), arg_value("--session"), arg_value("--format"),
+                    arg_value("--type", "anime"))
+    elif "--cli" in sys.argv:
         cli_main()
     else:
         import uvicorn
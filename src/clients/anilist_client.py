@@ -1,16 +1,30 @@
-import requests
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterator, Optional, Tuple
+from urllib.parse import urlparse
 from ..config import config
 from ..models import MediaItem
+from ..services.deadline import Deadline, budget
+from .paging import iter_pages
+from .resilience import UpstreamGuard
+from .transport import HTTPTransport, get_transport
 
 class AniListClient:
-    def __init__(self):
+    def __init__(self, transport: Optional[HTTPTransport] = None):
+        self.transport = transport or get_transport()
         self.api_url = config.ANILIST_API_URL
-        
-    def search_anime(self, query: str, limit: int = 10) -> List[MediaItem]:
+        self.guard = UpstreamGuard(urlparse(self.api_url).netloc, "AniList")
+    
+    def search_anime(self, query: str, limit: int = 10, deadline: Optional[Deadline] = None) -> List[MediaItem]:
+        return list(self.iter_anime(query, limit, deadline))
+    
+    def search_manga(self, query: str, limit: int = 10, deadline: Optional[Deadline] = None) -> List[MediaItem]:
+        return list(self.iter_manga(query, limit, deadline))
+    
+    def iter_anime(self, query: str, max_items: Optional[int] = None,
+                   deadline: Optional[Deadline] = None) -> Iterator[MediaItem]:
         query_gql = """
-        query ($search: String, $perPage: Int) {
-          Page(page: 1, perPage: $perPage) {
+        query ($search: String, $page: Int, $perPage: Int) {
+          Page(page: $page, perPage: $perPage) {
+            pageInfo { hasNextPage }
             media(search: $search, type: ANIME) {
               id
               title { romaji english }
@@ -24,12 +38,14 @@ class AniListClient:
           }
         }
         """
-        return self._execute_query(query_gql, query, limit, "anime")
+        return self._iter_media(query_gql, query, "anime", max_items, deadline)
     
-    def search_manga(self, query: str, limit: int = 10) -> List[MediaItem]:
+    def iter_manga(self, query: str, max_items: Optional[int] = None,
+                   deadline: Optional[Deadline] = None) -> Iterator[MediaItem]:
         query_gql = """
-        query ($search: String, $perPage: Int) {
-          Page(page: 1, perPage: $perPage) {
+        query ($search: String, $page: Int, $perPage: Int) {
+          Page(page: $page, perPage: $perPage) {
+            pageInfo { hasNextPage }
             media(search: $search, type: MANGA) {
               id
               title { romaji english }
@@ -43,43 +59,54 @@ class AniListClient:
           }
         }
         """
-        return self._execute_query(query_gql, query, limit, "manga")
+        return self._iter_media(query_gql, query, "manga", max_items, deadline)
     
-    def _execute_query(self, query_gql: str, search: str, limit: int, media_type: str) -> List[MediaItem]:
-        try:
-            variables = {"search": search, "perPage": limit}
-            response = requests.post(
-                self.api_url,
-                json={"query": query_gql, "variables": variables},
-                timeout=10
+    def _iter_media(self, query_gql: str, search: str, media_type: str, max_items: Optional[int],
+                    deadline: Optional[Deadline] = None) -> Iterator[MediaItem]:
+        # Small lookups ask for a small page; the size stays fixed for the whole walk
+        per_page = min(max_items, config.SEARCH_PAGE_SIZE) if max_items else config.SEARCH_PAGE_SIZE
+        return iter_pages(
+            lambda page, wanted: self.guard.call(
+                (media_type, search, page, per_page),
+                lambda d: self._execute_query(query_gql, search, page, per_page, media_type, d),
+                ([], False), deadline
+            ),
+            max_items
+        )
+    
+    def _execute_query(self, query_gql: str, search: str, page: int, per_page: int, media_type: str,
+                       deadline: Optional[Deadline] = None) -> Tuple[List[MediaItem], bool]:
+        variables = {"search": search, "page": page, "perPage": per_page}
+        response = self.transport.post(
+            self.api_url,
+            json={"query": query_gql, "variables": variables},
+            timeout=budget(deadline, config.UPSTREAM_TIMEOUT)
+        )
+        response.raise_for_status()
+        data = response.json()
+        
+        page_data = data.get("data", {}).get("Page", {})
+        items = []
+        for result in page_data.get("media", []):
+            title = result.get("title", {}).get("english") or result.get("title", {}).get("romaji", "Unknown")
+            year = result.get("seasonYear") or (result.get("startDate", {}).get("year") if result.get("startDate") else None)
+            
+            item = MediaItem(
+                id=f"anilist_{media_type}_{result['id']}",
+                source="anilist",
+                type=media_type,
+                title=title,
+                overview=result.get("description", "")[:500] if result.get("description") else "",
+                year=year,
+                genres=result.get("genres", []),
+                score=result.get("averageScore", 0) / 10 if result.get("averageScore") else None,
+                poster_url=result.get("coverImage", {}).get("large")
             )
-            response.raise_for_status()
-            data = response.json()
             
-            items = []
-            for result in data.get("data", {}).get("Page", {}).get("media", []):
-                title = result.get("title", {}).get("english") or result.get("title", {}).get("romaji", "Unknown")
-                year = result.get("seasonYear") or (result.get("startDate", {}).get("year") if result.get("startDate") else None)
-                
-                item = MediaItem(
-                    id=f"anilist_{media_type}_{result['id']}",
-                    source="anilist",
-                    type=media_type,
-                    title=title,
-                    overview=result.get("description", "")[:500] if result.get("description") else "",
-                    year=year,
-                    genres=result.get("genres", []),
-                    score=result.get("averageScore", 0) / 10 if result.get("averageScore") else None,
-                    poster_url=result.get("coverImage", {}).get("large")
-                )
-                
-                if media_type == "anime":
-                    item.total_episodes = result.get("episodes")
-                else:
-                    item.total_chapters = result.get("chapters")
-                    
-                items.append(item)
-            return items
-        except Exception as e:
-            print(f"AniList {media_type} search error: {e}")
-            return []
+            if media_type == "anime":
+                item.total_episodes = result.get("episodes")
+            else:
+                item.total_chapters = result.get("chapters")
+            
+            items.append(item)
+        return items, bool(page_data.get("pageInfo", {}).get("hasNextPage"))
@@ -0,0 +1,73 @@
+from concurrent.futures import Future
+from typing import Callable, Generic, Iterator, List, Optional, Tuple, TypeVar
+
+from ..config import config
+from ..services.profiler import TracedExecutor
+
+T = TypeVar("T")
+
+# (items, has_next_page) for a 1-based page number and how many items the caller still wants
+PageFetcher = Callable[[int, Optional[int]], Tuple[List[T], bool]]
+
+page_pool = TracedExecutor(max_workers=config.SEARCH_PREFETCH_WORKERS)
+
+class PageWalk(Generic[T]):
+    def __init__(self, fetch_page: PageFetcher, max_items: Optional[int] = None):
+        self.fetch_page = fetch_page
+        self.max_items = max_items
+        self.yielded = 0
+        self._walk = self._pages()
+
+    def __iter__(self) -> Iterator[T]:
+        return self
+
+    def __next__(self) -> T:
+        return next(self._walk)
+
+    def extend(self, more: int):
+        # A paged caller asks for its next page without restarting the walk
+        if self.max_items is not None:
+            self.max_items += more
+
+    def close(self):
+        self._walk.close()
+
+    def _wanted(self, buffered: int = 0) -> Optional[int]:
+        return None if self.max_items is None else self.max_items - self.yielded - buffered
+
+    def _pages(self) -> Iterator[T]:
+        page = 1
+        items, has_next = self.fetch_page(page, self._wanted())
+        next_page: Optional[Future] = None
+
+        try:
+            while True:
+                # Start on the next page while this one is consumed, but only if this one is not enough
+                wanted = self._wanted(len(items))
+                if has_next and items and (wanted is None or wanted > 0):
+                    next_page = page_pool.submit(self.fetch_page, page + 1, wanted)
+
+                for item in items:
+                    # Checked before each item rather than after, so extend() can still reach the rest of a page
+                    if self.max_items is not None and self.yielded >= self.max_items:
+                        return
+                    yield item
+                    self.yielded += 1
+
+                if next_page is not None:
+                    items, has_next = next_page.result()
+                    next_page = None
+                else:
+                    # Extended after this page was judged enough
+                    wanted = self._wanted()
+                    if not has_next or not items or (wanted is not None and wanted <= 0):
+                        return
+                    items, has_next = self.fetch_page(page + 1, wanted)
+                page += 1
+        finally:
+            # Abandoned iterators must not leave a prefetch queued
+            if next_page is not None:
+                next_page.cancel()
+
+def iter_pages(fetch_page: PageFetcher, max_items: Optional[int] = None) -> PageWalk:
+    return PageWalk(fetch_page, max_items)
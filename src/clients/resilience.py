@@ -0,0 +1,152 @@
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import TimeoutError as FutureTimeout
+from typing import Any, Callable, Hashable, List, Optional, Tuple
+
+from ..config import config
+from ..services.circuit_breaker import CircuitOpenError, HALF_OPEN, breakers
+from ..services.deadline import Deadline
+from ..services.profiler import TracedExecutor
+from ..services.rate_limit import RateLimitedError
+from ..services.single_flight import flights
+
+refresh_pool = TracedExecutor(max_workers=4)
+fetch_pool = TracedExecutor(max_workers=config.UPSTREAM_FETCH_WORKERS)
+
+class StaleCache:
+    def __init__(self, max_entries: int = 2048):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        # Snapshot entries waiting to be decoded on first use
+        self._pending: Optional[Tuple[Callable[[], Any], Optional[Callable[[Any], Any]]]] = None
+
+    def get(self, key: Hashable, max_age: Optional[float] = None) -> Optional[Any]:
+        self._restore_pending()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if max_age is not None and time.time() - entry[0] > max_age:
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def put(self, key: Hashable, value: Any):
+        self._restore_pending()
+        with self._lock:
+            self._entries[key] = (time.time(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def export_entries(self, encode: Optional[Callable[[Any], Any]] = None) -> List[List[Any]]:
+        self._restore_pending()
+        with self._lock:
+            entries = list(self._entries.items())
+        return [[list(key) if isinstance(key, tuple) else key, stored_at, encode(value) if encode else value]
+                for key, (stored_at, value) in entries]
+
+    def restore_later(self, load: Callable[[], Any], decode: Optional[Callable[[Any], Any]] = None):
+        self._pending = (load, decode)
+
+    def _restore_pending(self):
+        if self._pending is None:
+            return
+        with self._lock:
+            if self._pending is None:
+                return
+            load, decode = self._pending
+            self._pending = None
+            # Newest first, each pushed to the old end, so the snapshot's LRU order is kept
+            for key, stored_at, value in reversed(load() or []):
+                key = tuple(key) if isinstance(key, list) else key
+                # Anything cached since startup is newer than the snapshot
+                if key not in self._entries:
+                    self._entries[key] = (stored_at, decode(value) if decode else value)
+                    self._entries.move_to_end(key, last=False)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+def normalize_key(key: Hashable) -> Hashable:
+    if isinstance(key, tuple):
+        return tuple(" ".join(part.lower().split()) if isinstance(part, str) else part for part in key)
+    return key
+
+class UpstreamGuard:
+    def __init__(self, host: str, label: str):
+        self.host = host
+        self.label = label
+        self.cache = StaleCache(config.STALE_CACHE_ENTRIES)
+        self.flights = flights.get(label)
+        self._refreshing = set()
+        self._lock = threading.Lock()
+
+    def call(self, key: Hashable, fetch: Callable[[Optional[Deadline]], Any], default: Any,
+             deadline: Optional[Deadline] = None) -> Any:
+        key = normalize_key(key)
+        stale = self.cache.get(key)
+
+        if deadline and deadline.expired:
+            deadline.mark_partial(f"{self.label} {key[0]} skipped")
+            return stale if stale is not None else default
+
+        if stale is not None and breakers.get(self.host).current_state() == HALF_OPEN:
+            # Answer from stale data and let a background call probe the recovering host
+            self._refresh_in_background(key, fetch)
+            return stale
+
+        try:
+            # Identical concurrent requests share one upstream call. It runs on its own UPSTREAM_TIMEOUT rather than
+            # any one caller's deadline, so nobody inherits a result cut short by another request's budget
+            return self.flights.do(key, lambda: self._fetch_and_store(key, fetch),
+                                   timeout=deadline.remaining() if deadline else None, executor=fetch_pool)
+        except CircuitOpenError:
+            if deadline:
+                deadline.mark_partial(f"{self.label} {key[0]} unavailable")
+            return stale if stale is not None else default
+        except FutureTimeout as e:
+            # Also a socket timeout from the fetch itself, which can happen with no caller deadline at all
+            if deadline:
+                deadline.mark_partial(f"{self.label} {key[0]} timed out")
+            else:
+                print(f"{self.label} {key[0]} search error: {e or 'timed out'}")
+            return stale if stale is not None else default
+        except RateLimitedError:
+            # Over our own quota for this host: degrade to what we have rather than queue
+            if deadline:
+                deadline.mark_partial(f"{self.label} {key[0]} rate limited")
+            return stale if stale is not None else default
+        except Exception as e:
+            # Either way the default is not a real empty answer, and callers that retry need to tell
+            if deadline:
+                deadline.mark_partial(f"{self.label} {key[0]} {'timed out' if deadline.expired else 'failed'}")
+            print(f"{self.label} {key[0]} search error: {e}")
+            return stale if stale is not None else default
+
+    def _fetch_and_store(self, key: Hashable, fetch: Callable[[Optional[Deadline]], Any]) -> Any:
+        # Stored here so a result everyone stopped waiting for still serves the next request
+        result = fetch(None)
+        self.cache.put(key, result)
+        return result
+
+    def _refresh_in_background(self, key: Hashable, fetch: Callable[[Optional[Deadline]], Any]):
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+
+        def refresh():
+            try:
+                self.cache.put(key, fetch(None))
+            except Exception:
+                pass
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        refresh_pool.submit(refresh)
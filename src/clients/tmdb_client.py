@@ -1,75 +1,220 @@
-import requests
-from typing import List, Dict, Any, Optional
+from concurrent.futures import Future, wait
+from typing import List, Dict, Any, Iterator, Optional, Tuple
+from urllib.parse import urlparse
+import threading
+import time
 from ..config import config
 from ..models import MediaItem
+from ..services.deadline import Deadline, budget
+from ..services.profiler import TracedExecutor
+from ..services.single_flight import flights
+from .paging import iter_pages
+from .resilience import StaleCache, UpstreamGuard, refresh_pool
+from .transport import HTTPTransport, get_transport
 
 class TMDBClient:
-    def __init__(self):
+    def __init__(self, transport: Optional[HTTPTransport] = None):
+        self.transport = transport or get_transport()
         self.api_key = config.TMDB_API_KEY
         self.base_url = config.TMDB_BASE_URL
+        self.guard = UpstreamGuard(urlparse(self.base_url).netloc, "TMDB")
+        self.detail_pool = TracedExecutor(max_workers=config.TMDB_DETAIL_WORKERS)
+        self.detail_cache = StaleCache(config.TMDB_DETAIL_CACHE_ENTRIES)
+        self.detail_flights = flights.get("TMDB tv details")
+        self.genre_flights = flights.get("TMDB genres")
+        # kind -> (genre id -> name, fetched at); failed fetches keep an empty table until retried
+        self.genre_tables: Dict[str, Tuple[Dict[int, str], float]] = {}
+        self._genre_lock = threading.Lock()
+        self._genre_refreshing = set()
+    
+    def search_movies(self, query: str, limit: int = 10, deadline: Optional[Deadline] = None) -> List[MediaItem]:
+        return list(self.iter_movies(query, limit, deadline))
+    
+    def search_tv(self, query: str, limit: int = 10, deadline: Optional[Deadline] = None) -> List[MediaItem]:
+        return list(self.iter_tv(query, limit, deadline))
+    
+    def iter_movies(self, query: str, max_items: Optional[int] = None,
+                    deadline: Optional[Deadline] = None) -> Iterator[MediaItem]:
+        return iter_pages(lambda page, wanted: self._movie_page(query, page, deadline), max_items)
+    
+    def iter_tv(self, query: str, max_items: Optional[int] = None,
+                deadline: Optional[Deadline] = None) -> Iterator[MediaItem]:
+        def fetch(page: int, wanted: Optional[int]) -> Tuple[List[MediaItem], bool]:
+            items, has_next = self._tv_page(query, page, deadline)
+            # Episode counts cost one call per show, so only look up the ones the caller will reach
+            self.attach_tv_details(items if wanted is None else items[:wanted], deadline)
+            return items, has_next
+        return iter_pages(fetch, max_items)
+    
+    def _movie_page(self, query: str, page: int, deadline: Optional[Deadline] = None) -> Tuple[List[MediaItem], bool]:
+        return self.guard.call(("movie", query, page), lambda d: self._search_movies(query, page, d), ([], False), deadline)
+    
+    def _tv_page(self, query: str, page: int, deadline: Optional[Deadline] = None) -> Tuple[List[MediaItem], bool]:
+        return self.guard.call(("tv", query, page), lambda d: self._search_tv(query, page, d), ([], False), deadline)
+    
+    def _search_movies(self, query: str, page: int, deadline: Optional[Deadline] = None) -> Tuple[List[MediaItem], bool]:
+        url = f"{self.base_url}/search/movie"
+        params = {"api_key": self.api_key, "query": query, "page": page}
+        response = self.transport.get(url, params=params, timeout=budget(deadline, config.UPSTREAM_TIMEOUT))
+        response.raise_for_status()
+        data = response.json()
         
-    def search_movies(self, query: str, limit: int = 10) -> List[MediaItem]:
-        try:
-            url = f"{self.base_url}/search/movie"
-            params = {"api_key": self.api_key, "query": query, "page": 1}
-            response = requests.get(url, params=params, timeout=10)
-            response.raise_for_status()
-            data = response.json()
-            
-            items = []
-            for result in data.get("results", [])[:limit]:
-                items.append(MediaItem(
-                    id=f"tmdb_movie_{result['id']}",
-                    source="tmdb",
-                    type="movie",
-                    title=result.get("title", "Unknown"),
-                    overview=result.get("overview", ""),
-                    year=int(result.get("release_date", "")[:4]) if result.get("release_date") else None,
-                    genres=[],
-                    score=result.get("vote_average"),
-                    poster_url=f"https://image.tmdb.org/t/p/w500{result.get('poster_path')}" if result.get('poster_path') else None
-                ))
-            return items
-        except Exception as e:
-            print(f"TMDB movie search error: {e}")
+        items = []
+        for result in data.get("results", []):
+            items.append(MediaItem(
+                id=f"tmdb_movie_{result['id']}",
+                source="tmdb",
+                type="movie",
+                title=result.get("title", "Unknown"),
+                overview=result.get("overview", ""),
+                year=int(result.get("release_date", "")[:4]) if result.get("release_date") else None,
+                genres=self._genre_names("movie", result.get("genre_ids"), deadline),
+                score=result.get("vote_average"),
+                poster_url=f"https://image.tmdb.org/t/p/w500{result.get('poster_path')}" if result.get('poster_path') else None
+            ))
+        return items, page < data.get("total_pages", 1)
+    
+    def _search_tv(self, query: str, page: int, deadline: Optional[Deadline] = None) -> Tuple[List[MediaItem], bool]:
+        url = f"{self.base_url}/search/tv"
+        params = {"api_key": self.api_key, "query": query, "page": page}
+        response = self.transport.get(url, params=params, timeout=budget(deadline, config.UPSTREAM_TIMEOUT))
+        response.raise_for_status()
+        data = response.json()
+        
+        items = []
+        for result in data.get("results", []):
+            items.append(MediaItem(
+                id=f"tmdb_tv_{result['id']}",
+                source="tmdb",
+                type="tv",
+                title=result.get("name", "Unknown"),
+                overview=result.get("overview", ""),
+                year=int(result.get("first_air_date", "")[:4]) if result.get("first_air_date") else None,
+                genres=self._genre_names("tv", result.get("genre_ids"), deadline),
+                score=result.get("vote_average"),
+                poster_url=f"https://image.tmdb.org/t/p/w500{result.get('poster_path')}" if result.get('poster_path') else None
+            ))
+        return items, page < data.get("total_pages", 1)
+    
+    def attach_tv_details(self, items: List[MediaItem], deadline: Optional[Deadline] = None):
+        missing = [item for item in items if item.total_episodes is None]
+        if not missing:
+            return
+        details = self._get_tv_details_batch([int(item.id.rsplit("_", 1)[1]) for item in missing], deadline)
+        for item in missing:
+            detail = details.get(int(item.id.rsplit("_", 1)[1]), {})
+            if detail.get("number_of_episodes") is not None:
+                item.total_episodes = detail["number_of_episodes"]
+    
+    def export_genres(self) -> Dict[str, Any]:
+        return {kind: [list(table.items()), fetched_at] for kind, (table, fetched_at) in list(self.genre_tables.items())}
+    
+    def import_genres(self, state: Dict[str, Any]):
+        for kind, (table, fetched_at) in state.items():
+            # Empty tables are failed fetches; let them be retried
+            if table:
+                self.genre_tables[kind] = ({int(genre_id): name for genre_id, name in table}, fetched_at)
+    
+    def _genre_names(self, kind: str, genre_ids: Optional[List[int]], deadline: Optional[Deadline] = None) -> List[str]:
+        if not genre_ids:
             return []
+        table = self._genre_table(kind, deadline)
+        if not table and deadline:
+            deadline.mark_partial(f"TMDB {kind} genres unavailable")
+        return [table[genre_id] for genre_id in genre_ids if genre_id in table]
     
-    def search_tv(self, query: str, limit: int = 10) -> List[MediaItem]:
+    def _genre_table(self, kind: str, deadline: Optional[Deadline] = None) -> Dict[int, str]:
+        entry = self.genre_tables.get(kind)
+        if entry is None:
+            try:
+                # Fetched once on its own timeout; a caller short on budget stops waiting but never caches the miss
+                entry = self.genre_flights.do(kind, lambda: self._load_genres(kind),
+                                              timeout=deadline.remaining() if deadline else None,
+                                              executor=refresh_pool)
+            except Exception:
+                return {}
+        
+        table, fetched_at = entry
+        ttl = config.TMDB_GENRE_TTL if table else config.TMDB_GENRE_RETRY
+        if time.time() - fetched_at > ttl:
+            self._refresh_genres(kind)
+        return table
+    
+    def _refresh_genres(self, kind: str):
+        with self._genre_lock:
+            if kind in self._genre_refreshing:
+                return
+            self._genre_refreshing.add(kind)
+        
+        def refresh():
+            try:
+                table = self._fetch_genres(kind)
+                if table:
+                    self.genre_tables[kind] = (table, time.time())
+                else:
+                    # Keep serving the old table and retry after TMDB_GENRE_RETRY
+                    old_table = self.genre_tables.get(kind, ({}, 0.0))[0]
+                    retry_at = time.time() - config.TMDB_GENRE_TTL + config.TMDB_GENRE_RETRY if old_table else time.time()
+                    self.genre_tables[kind] = (old_table, retry_at)
+            finally:
+                with self._genre_lock:
+                    self._genre_refreshing.discard(kind)
+        
+        refresh_pool.submit(refresh)
+    
+    def _load_genres(self, kind: str) -> Tuple[Dict[int, str], float]:
+        entry = (self._fetch_genres(kind), time.time())
+        self.genre_tables[kind] = entry
+        return entry
+    
+    def _fetch_genres(self, kind: str) -> Dict[int, str]:
         try:
-            url = f"{self.base_url}/search/tv"
-            params = {"api_key": self.api_key, "query": query, "page": 1}
-            response = requests.get(url, params=params, timeout=10)
+            url = f"{self.base_url}/genre/{kind}/list"
+            params = {"api_key": self.api_key}
+            response = self.transport.get(url, params=params, timeout=config.UPSTREAM_TIMEOUT)
             response.raise_for_status()
-            data = response.json()
-            
-            items = []
-            for result in data.get("results", [])[:limit]:
-                tv_id = result['id']
-                detail = self._get_tv_details(tv_id)
-                
-                items.append(MediaItem(
-                    id=f"tmdb_tv_{tv_id}",
-                    source="tmdb",
-                    type="tv",
-                    title=result.get("name", "Unknown"),
-                    overview=result.get("overview", ""),
-                    year=int(result.get("first_air_date", "")[:4]) if result.get("first_air_date") else None,
-                    genres=[],
-                    score=result.get("vote_average"),
-                    total_episodes=detail.get("number_of_episodes"),
-                    poster_url=f"https://image.tmdb.org/t/p/w500{result.get('poster_path')}" if result.get('poster_path') else None
-                ))
-            return items
+            return {genre["id"]: genre["name"] for genre in response.json().get("genres", [])}
         except Exception as e:
-            print(f"TMDB TV search error: {e}")
-            return []
+            print(f"TMDB {kind} genre list error: {e}")
+            return {}
     
-    def _get_tv_details(self, tv_id: int) -> Dict[str, Any]:
+    def _get_tv_details_batch(self, tv_ids: List[int], deadline: Optional[Deadline] = None) -> Dict[int, Dict[str, Any]]:
+        futures = {self.detail_pool.submit(self._get_tv_details, tv_id, deadline): tv_id for tv_id in tv_ids}
+        done, not_done = wait(futures, timeout=budget(deadline, config.UPSTREAM_TIMEOUT) if deadline else None)
+        
+        if not_done:
+            for future in not_done:
+                future.cancel()
+            deadline.mark_partial(f"{len(not_done)} tv detail lookups cut off")
+        
+        return {futures[future]: future.result() for future in done}
+    
+    def prefetch_tv_details(self, tv_id: int) -> Future:
+        return self.detail_pool.submit(self._get_tv_details, tv_id)
+    
+    def _get_tv_details(self, tv_id: int, deadline: Optional[Deadline] = None) -> Dict[str, Any]:
+        cached = self.detail_cache.get(tv_id, max_age=config.TMDB_DETAIL_TTL)
+        if cached is not None:
+            return cached
+        # An expired entry is still better than nothing if the refetch fails
+        stale = self.detail_cache.get(tv_id) or {}
+        if deadline and deadline.expired:
+            deadline.mark_partial(f"tv details for {tv_id} skipped")
+            return stale
         try:
-            url = f"{self.base_url}/tv/{tv_id}"
-            params = {"api_key": self.api_key}
-            response = requests.get(url, params=params, timeout=10)
-            response.raise_for_status()
-            return response.json()
+            # Shared with other requests, so fetched on UPSTREAM_TIMEOUT rather than this caller's budget
+            return self.detail_flights.do(tv_id, lambda: self._fetch_tv_details(tv_id),
+                                          timeout=deadline.remaining() if deadline else None)
         except:
-            return {}
\ No newline at end of file
+            if deadline and deadline.expired:
+                deadline.mark_partial(f"tv details for {tv_id} timed out")
+            return stale
+    
+    def _fetch_tv_details(self, tv_id: int) -> Dict[str, Any]:
+        url = f"{self.base_url}/tv/{tv_id}"
+        params = {"api_key": self.api_key}
+        response = self.transport.get(url, params=params, timeout=config.UPSTREAM_TIMEOUT)
+        response.raise_for_status()
+        detail = response.json()
+        self.detail_cache.put(tv_id, detail)
+        return detail
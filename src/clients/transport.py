@@ -0,0 +1,349 @@
+import base64
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Optional, Union
+from urllib.parse import urlparse
+
+import requests
+from google.api_core import exceptions as google_exceptions
+
+from ..config import config
+from ..services.circuit_breaker import CircuitOpenError, breakers
+from ..services.rate_limit import rate_limits
+
+GEMINI_HOST = "generativelanguage.googleapis.com"
+SECRET_PARAMS = {"api_key", "key"}
+
+@dataclass
+class LatencyProfile:
+    dist: str = "recorded"
+    ms: float = 0.0
+    low_ms: float = 0.0
+    high_ms: float = 0.0
+    median_ms: float = 0.0
+    sigma: float = 0.5
+
+    def sample(self, rng: random.Random, recorded_ms: float) -> float:
+        if self.dist == "fixed":
+            return self.ms
+        if self.dist == "uniform":
+            return rng.uniform(self.low_ms, self.high_ms)
+        if self.dist == "lognormal":
+            return rng.lognormvariate(0, self.sigma) * self.median_ms
+        return recorded_ms
+
+@dataclass
+class FaultProfile:
+    latency: LatencyProfile = field(default_factory=LatencyProfile)
+    timeout_rate: float = 0.0
+    rate_429: float = 0.0
+    rate_5xx: float = 0.0
+    retry_after: int = 1
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'FaultProfile':
+        data = dict(data)
+        latency = LatencyProfile(**data.pop("latency", {}))
+        return cls(latency=latency, **data)
+
+class FaultInjector:
+    def __init__(self, profiles: Optional[Dict[str, FaultProfile]] = None, seed: Optional[int] = None):
+        self.profiles = profiles or {}
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, spec: str, seed: Optional[int] = None) -> 'FaultInjector':
+        if not spec:
+            return cls(seed=seed)
+        if os.path.exists(spec):
+            with open(spec) as f:
+                spec = f.read()
+        raw = json.loads(spec)
+        return cls({host: FaultProfile.from_dict(p) for host, p in raw.items()}, seed)
+
+    def profile(self, host: str) -> FaultProfile:
+        return self.profiles.get(host) or self.profiles.get("*") or FaultProfile()
+
+    def plan(self, host: str, recorded_ms: float) -> Dict[str, Any]:
+        profile = self.profile(host)
+        with self._lock:
+            roll = self._rng.random()
+            latency_ms = max(profile.latency.sample(self._rng, recorded_ms), 0.0)
+
+        if roll < profile.timeout_rate:
+            outcome = "timeout"
+        elif roll < profile.timeout_rate + profile.rate_429:
+            outcome = "429"
+        elif roll < profile.timeout_rate + profile.rate_429 + profile.rate_5xx:
+            outcome = "5xx"
+        else:
+            outcome = "ok"
+        return {"outcome": outcome, "latency": latency_ms / 1000, "retry_after": profile.retry_after}
+
+class Cassette:
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._lock = threading.Lock()
+
+    def key(self, *parts: Any) -> str:
+        canonical = json.dumps(parts, sort_keys=True, default=str, separators=(",", ":"))
+        return hashlib.sha1(canonical.encode()).hexdigest()
+
+    def _path(self, host: str, key: str) -> str:
+        return os.path.join(self.directory, host, f"{key}.json")
+
+    def load(self, host: str, key: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self._path(host, key)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def save(self, host: str, key: str, entry: Dict[str, Any]):
+        path = self._path(host, key)
+        with self._lock:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(entry, f)
+            os.replace(tmp_path, path)
+
+class ReplayResponse:
+    def __init__(self, status_code: int, body: Union[str, bytes], url: str, headers: Optional[Dict[str, str]] = None):
+        self.status_code = status_code
+        self.content = body.encode("utf-8") if isinstance(body, str) else body
+        self.url = url
+        self.headers = headers or {}
+
+    @property
+    def text(self) -> str:
+        return self.content.decode("utf-8", errors="replace")
+
+    def json(self) -> Any:
+        return json.loads(self.content)
+
+    def iter_content(self, chunk_size: int = 1) -> Iterator[bytes]:
+        for offset in range(0, len(self.content), chunk_size):
+            yield self.content[offset:offset + chunk_size]
+
+    def close(self):
+        pass
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f"{self.status_code} Error for url: {self.url}", response=self)
+
+def _is_text(content_type: str) -> bool:
+    content_type = content_type.lower()
+    return content_type.startswith("text/") or "json" in content_type or "xml" in content_type
+
+def _request_key(cassette: Cassette, method: str, url: str, params: Optional[Dict[str, Any]],
+                 body: Any) -> str:
+    params = {k: v for k, v in (params or {}).items() if k not in SECRET_PARAMS}
+    return cassette.key(method.upper(), url, params, body)
+
+class HTTPTransport:
+    def __init__(self, pool_size: int = 32):
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def request(self, method: str, url: str, params: Optional[Dict[str, Any]] = None,
+                json: Any = None, timeout: float = 10, stream: bool = False) -> Any:
+        host = urlparse(url).netloc
+        rate_limits.acquire_upstream(host)
+        breaker = breakers.get(host)
+        if not breaker.allow():
+            raise CircuitOpenError(f"Circuit open for {host}")
+
+        start = time.perf_counter()
+        try:
+            response = self._send(method, url, params, json, timeout, stream)
+        except Exception:
+            breaker.record_failure(time.perf_counter() - start)
+            raise
+
+        elapsed = time.perf_counter() - start
+        if response.status_code == 429 or response.status_code >= 500:
+            breaker.record_failure(elapsed)
+        else:
+            breaker.record_success(elapsed)
+        return response
+
+    def _send(self, method: str, url: str, params: Optional[Dict[str, Any]], json: Any, timeout: float,
+              stream: bool = False) -> Any:
+        return self.session.request(method, url, params=params, json=json, timeout=timeout, stream=stream)
+
+    def get(self, url: str, params: Optional[Dict[str, Any]] = None, timeout: float = 10, stream: bool = False) -> Any:
+        return self.request("GET", url, params=params, timeout=timeout, stream=stream)
+
+    def post(self, url: str, json: Any = None, timeout: float = 10) -> Any:
+        return self.request("POST", url, json=json, timeout=timeout)
+
+class RecordingTransport(HTTPTransport):
+    def __init__(self, cassette: Cassette, pool_size: int = 32):
+        super().__init__(pool_size)
+        self.cassette = cassette
+
+    def _send(self, method: str, url: str, params: Optional[Dict[str, Any]], json: Any, timeout: float,
+              stream: bool = False) -> Any:
+        start = time.perf_counter()
+        # Recording needs the whole body, so streamed responses are read in full here; iter_content replays it
+        response = super()._send(method, url, params, json, timeout, stream)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+
+        entry = {
+            "status_code": response.status_code,
+            "headers": {k: v for k, v in response.headers.items() if k.lower() in ["content-type", "retry-after"]},
+            "elapsed_ms": round(elapsed_ms, 2)
+        }
+        # Images and other binary bodies do not survive a round trip through text
+        if _is_text(response.headers.get("Content-Type", "application/json")):
+            entry["body"] = response.text
+        else:
+            entry["body_b64"] = base64.b64encode(response.content).decode("ascii")
+        self.cassette.save(urlparse(url).netloc, _request_key(self.cassette, method, url, params, json), entry)
+        return response
+
+class ReplayTransport(HTTPTransport):
+    def __init__(self, cassette: Cassette, faults: Optional[FaultInjector] = None):
+        self.cassette = cassette
+        self.faults = faults or FaultInjector()
+
+    def _send(self, method: str, url: str, params: Optional[Dict[str, Any]], json: Any, timeout: float,
+              stream: bool = False) -> Any:
+        host = urlparse(url).netloc
+        entry = self.cassette.load(host, _request_key(self.cassette, method, url, params, json))
+        if entry is None:
+            raise requests.ConnectionError(f"No recorded response for {method} {url}")
+
+        plan = self.faults.plan(host, entry.get("elapsed_ms", 0.0))
+        if plan["outcome"] == "timeout" or plan["latency"] > timeout:
+            time.sleep(timeout)
+            raise requests.Timeout(f"Replayed timeout after {timeout}s for {url}")
+        time.sleep(plan["latency"])
+
+        if plan["outcome"] == "429":
+            return ReplayResponse(429, "{}", url, {"Retry-After": str(plan["retry_after"])})
+        if plan["outcome"] == "5xx":
+            return ReplayResponse(503, "{}", url)
+        body = base64.b64decode(entry["body_b64"]) if "body_b64" in entry else entry["body"]
+        return ReplayResponse(entry["status_code"], body, url, entry.get("headers"))
+
+class ReplayGeminiResponse:
+    def __init__(self, text: str, function_calls: Optional[List[Dict[str, Any]]] = None):
+        self.text = text
+        self.function_calls = function_calls or []
+        self.candidates = []
+
+class CassetteChat:
+    def __init__(self, owner: 'CassetteModel', chat: Any = None):
+        self.owner = owner
+        self.chat = chat
+        self.turn = 0
+
+    def send_message(self, content: Any, **kwargs) -> Any:
+        key = self.owner.cassette.key(self.owner.name, self.turn, str(content))
+        self.turn += 1
+
+        if self.owner.mode == "replay":
+            return self.owner.replay(key)
+
+        start = time.perf_counter()
+        response = self.chat.send_message(content, **kwargs)
+        self.owner.record(key, response, (time.perf_counter() - start) * 1000)
+        return response
+
+class CassetteModel:
+    def __init__(self, model: Any, name: str, mode: str, cassette: Cassette,
+                 faults: Optional[FaultInjector] = None):
+        self.model = model
+        self.name = name
+        self.mode = mode
+        self.cassette = cassette
+        self.faults = faults or FaultInjector()
+
+    def start_chat(self, **kwargs) -> CassetteChat:
+        chat = self.model.start_chat(**kwargs) if self.mode == "record" else None
+        return CassetteChat(self, chat)
+
+    def record(self, key: str, response: Any, elapsed_ms: float):
+        try:
+            text = response.text
+        except ValueError:
+            text = ""
+        self.cassette.save(GEMINI_HOST, key, {
+            "text": text,
+            "function_calls": extract_function_calls(response),
+            "elapsed_ms": round(elapsed_ms, 2)
+        })
+
+    def replay(self, key: str) -> ReplayGeminiResponse:
+        entry = self.cassette.load(GEMINI_HOST, key)
+        if entry is None:
+            raise google_exceptions.NotFound(f"No recorded Gemini response for {self.name}")
+
+        plan = self.faults.plan(GEMINI_HOST, entry.get("elapsed_ms", 0.0))
+        if plan["outcome"] == "timeout":
+            raise google_exceptions.DeadlineExceeded("Replayed Gemini timeout")
+        time.sleep(plan["latency"])
+        if plan["outcome"] == "429":
+            raise google_exceptions.TooManyRequests("Replayed Gemini rate limit")
+        if plan["outcome"] == "5xx":
+            raise google_exceptions.ServiceUnavailable("Replayed Gemini outage")
+        return ReplayGeminiResponse(entry["text"], entry.get("function_calls"))
+
+def extract_function_calls(response: Any) -> List[Dict[str, Any]]:
+    if isinstance(response, ReplayGeminiResponse):
+        return response.function_calls
+
+    calls = []
+    for candidate in getattr(response, "candidates", None) or []:
+        content = getattr(candidate, "content", None)
+        for part in getattr(content, "parts", None) or []:
+            function_call = getattr(part, "function_call", None)
+            if function_call and function_call.name:
+                calls.append({"name": function_call.name, "args": _to_plain(function_call.args)})
+    return calls
+
+def _to_plain(value: Any) -> Any:
+    if hasattr(value, "items"):
+        return {k: _to_plain(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)) or type(value).__name__ == "RepeatedComposite":
+        return [_to_plain(v) for v in value]
+    return value
+
+_transport = None
+_faults = None
+_transport_lock = threading.Lock()
+
+def get_faults() -> FaultInjector:
+    global _faults
+    if _faults is None:
+        _faults = FaultInjector.from_config(config.UPSTREAM_FAULTS)
+    return _faults
+
+def get_transport() -> HTTPTransport:
+    global _transport
+    with _transport_lock:
+        if _transport is None:
+            mode = config.UPSTREAM_MODE
+            if mode == "record":
+                _transport = RecordingTransport(Cassette(config.CASSETTE_DIR))
+            elif mode == "replay":
+                _transport = ReplayTransport(Cassette(config.CASSETTE_DIR), get_faults())
+            else:
+                _transport = HTTPTransport()
+        return _transport
+
+def wrap_model(model: Any, name: str) -> Any:
+    if config.UPSTREAM_MODE in ["record", "replay"]:
+        return CassetteModel(model, name, config.UPSTREAM_MODE, Cassette(config.CASSETTE_DIR), get_faults())
+    return model
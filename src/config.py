@@ -12,6 +12,99 @@ class Config:
     TMDB_BASE_URL: str = "https://api.themoviedb.org/3"
     ANILIST_API_URL: str = "https://graphql.anilist.co"
     MODEL_NAME: str = "gemini-2.0-flash-exp"
+    UPSTREAM_TIMEOUT: float = float(os.getenv("UPSTREAM_TIMEOUT", "10"))
+    CHAT_DEADLINE_SECONDS: float = float(os.getenv("CHAT_DEADLINE_SECONDS", "8"))
+    # Upstream timeouts are per read, so a trickling response can outlive the deadline; /chat answers by deadline + grace regardless
+    CHAT_DEADLINE_GRACE: float = float(os.getenv("CHAT_DEADLINE_GRACE", "1"))
+    CHAT_BATCH_MAX_ITEMS: int = int(os.getenv("CHAT_BATCH_MAX_ITEMS", "500"))
+    # Batch messages processed at once across all /chat/batch requests
+    CHAT_BATCH_CONCURRENCY: int = int(os.getenv("CHAT_BATCH_CONCURRENCY", "8"))
+    SESSION_RATE_PER_SECOND: float = float(os.getenv("SESSION_RATE_PER_SECOND", "2"))
+    SESSION_BURST: float = float(os.getenv("SESSION_BURST", "10"))
+    SESSION_RATE_BUCKETS: int = int(os.getenv("SESSION_RATE_BUCKETS", "10000"))
+    # Process-wide upstream quotas; 0 disables the limit for that upstream
+    GEMINI_RATE_PER_SECOND: float = float(os.getenv("GEMINI_RATE_PER_SECOND", "5"))
+    GEMINI_BURST: float = float(os.getenv("GEMINI_BURST", "10"))
+    TMDB_RATE_PER_SECOND: float = float(os.getenv("TMDB_RATE_PER_SECOND", "40"))
+    TMDB_BURST: float = float(os.getenv("TMDB_BURST", "40"))
+    ANILIST_RATE_PER_SECOND: float = float(os.getenv("ANILIST_RATE_PER_SECOND", "1.5"))
+    ANILIST_BURST: float = float(os.getenv("ANILIST_BURST", "20"))
+    ADMISSION_MAX_INFLIGHT: int = int(os.getenv("ADMISSION_MAX_INFLIGHT", "32"))
+    ADMISSION_QUEUE_SIZE: int = int(os.getenv("ADMISSION_QUEUE_SIZE", "64"))
+    ADMISSION_MAX_WAIT_SECONDS: float = float(os.getenv("ADMISSION_MAX_WAIT_SECONDS", "2"))
+    MIN_LLM_BUDGET: float = float(os.getenv("MIN_LLM_BUDGET", "0.5"))
+    BREAKER_WINDOW: int = int(os.getenv("BREAKER_WINDOW", "20"))
+    BREAKER_MIN_CALLS: int = int(os.getenv("BREAKER_MIN_CALLS", "5"))
+    BREAKER_ERROR_RATE: float = float(os.getenv("BREAKER_ERROR_RATE", "0.5"))
+    BREAKER_SLOW_CALL_SECONDS: float = float(os.getenv("BREAKER_SLOW_CALL_SECONDS", "5"))
+    BREAKER_OPEN_SECONDS: float = float(os.getenv("BREAKER_OPEN_SECONDS", "30"))
+    STALE_CACHE_ENTRIES: int = int(os.getenv("STALE_CACHE_ENTRIES", "2048"))
+    LLM_WORKERS: int = int(os.getenv("LLM_WORKERS", "16"))
+    TOOL_WORKERS: int = int(os.getenv("TOOL_WORKERS", "8"))
+    # Shared TMDB/AniList search calls run here so every waiter, leader included, stops at its own deadline
+    UPSTREAM_FETCH_WORKERS: int = int(os.getenv("UPSTREAM_FETCH_WORKERS", "16"))
+    TOOL_TIMEOUT_SECONDS: float = float(os.getenv("TOOL_TIMEOUT_SECONDS", "10"))
+    # Model/tool round trips per turn before giving up
+    TOOL_MAX_STEPS: int = int(os.getenv("TOOL_MAX_STEPS", "4"))
+    TMDB_GENRE_TTL: float = float(os.getenv("TMDB_GENRE_TTL", str(24 * 3600)))
+    TMDB_GENRE_RETRY: float = float(os.getenv("TMDB_GENRE_RETRY", "60"))
+    TMDB_DETAIL_WORKERS: int = int(os.getenv("TMDB_DETAIL_WORKERS", "8"))
+    TMDB_DETAIL_CACHE_ENTRIES: int = int(os.getenv("TMDB_DETAIL_CACHE_ENTRIES", "1024"))
+    # Episode counts change while a show airs; older entries are refetched and only served if that fails
+    TMDB_DETAIL_TTL: float = float(os.getenv("TMDB_DETAIL_TTL", str(12 * 3600)))
+    PREFETCH_TOP_RESULTS: int = int(os.getenv("PREFETCH_TOP_RESULTS", "3"))
+    SEARCH_PAGE_SIZE: int = int(os.getenv("SEARCH_PAGE_SIZE", "25"))
+    SEARCH_PREFETCH_WORKERS: int = int(os.getenv("SEARCH_PREFETCH_WORKERS", "8"))
+    SEARCH_CURSOR_CACHE: int = int(os.getenv("SEARCH_CURSOR_CACHE", "256"))
+    # Most results one search call or page may ask for, from HTTP clients and model tool calls alike
+    SEARCH_MAX_LIMIT: int = int(os.getenv("SEARCH_MAX_LIMIT", "100"))
+    IMPORT_MAX_WORKERS: int = int(os.getenv("IMPORT_MAX_WORKERS", "8"))
+    IMPORT_BATCH_SIZE: int = int(os.getenv("IMPORT_BATCH_SIZE", "50"))
+    # Per title: how long a lookup may wait for upstream quota, and how often a degraded lookup is retried
+    IMPORT_RESOLVE_TIMEOUT_SECONDS: float = float(os.getenv("IMPORT_RESOLVE_TIMEOUT_SECONDS", "30"))
+    IMPORT_MAX_ATTEMPTS: int = int(os.getenv("IMPORT_MAX_ATTEMPTS", "3"))
+    # Titles listed in an import report per outcome; the counts cover the rest
+    IMPORT_REPORT_TITLES: int = int(os.getenv("IMPORT_REPORT_TITLES", "100"))
+    # live | record | replay
+    UPSTREAM_MODE: str = os.getenv("UPSTREAM_MODE", "live")
+    CASSETTE_DIR: str = os.getenv("CASSETTE_DIR", "cassettes")
+    # Per-host fault profiles for replay, as a JSON file path or inline JSON
+    UPSTREAM_FAULTS: str = os.getenv("UPSTREAM_FAULTS", "")
+    CF_TOP_K: int = int(os.getenv("CF_TOP_K", "20"))
+    CF_MAX_USER_ITEMS: int = int(os.getenv("CF_MAX_USER_ITEMS", "500"))
+    CF_MAX_ROW_ENTRIES: int = int(os.getenv("CF_MAX_ROW_ENTRIES", "2000"))
+    # Least recently updated users beyond this are dropped from the model along with their co-occurrence counts
+    CF_MAX_USERS: int = int(os.getenv("CF_MAX_USERS", "10000"))
+    CF_REFRESH_SECONDS: float = float(os.getenv("CF_REFRESH_SECONDS", "5"))
+    SIMILARITY_INDEX_PATH: str = os.getenv("SIMILARITY_INDEX_PATH", "data/similarity_index.jsonl")
+    # Titles nobody has added for longest are dropped past this many
+    SIMILARITY_MAX_ITEMS: int = int(os.getenv("SIMILARITY_MAX_ITEMS", "200000"))
+    PRECOMPUTE_WORKERS: int = int(os.getenv("PRECOMPUTE_WORKERS", "2"))
+    PRECOMPUTE_DEBOUNCE_SECONDS: float = float(os.getenv("PRECOMPUTE_DEBOUNCE_SECONDS", "0.5"))
+    PRECOMPUTE_MAX_WAIT_SECONDS: float = float(os.getenv("PRECOMPUTE_MAX_WAIT_SECONDS", "5"))
+    PRECOMPUTE_ACTIVE_SECONDS: float = float(os.getenv("PRECOMPUTE_ACTIVE_SECONDS", "1800"))
+
+    ANALYTICS_PACE_WEEKS: int = int(os.getenv("ANALYTICS_PACE_WEEKS", "4"))
+    ANALYTICS_RISK_GAP_FACTOR: float = float(os.getenv("ANALYTICS_RISK_GAP_FACTOR", "3"))
+    CONTEXT_TOKEN_BUDGET: int = int(os.getenv("CONTEXT_TOKEN_BUDGET", "2000"))
+    CONTEXT_RECENT_TURNS: int = int(os.getenv("CONTEXT_RECENT_TURNS", "6"))
+    CONTEXT_SUMMARY_TOKENS: int = int(os.getenv("CONTEXT_SUMMARY_TOKENS", "400"))
+    POSTER_CACHE_DIR: str = os.getenv("POSTER_CACHE_DIR", "data/posters")
+    POSTER_CACHE_MAX_BYTES: int = int(os.getenv("POSTER_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+    POSTER_ALLOWED_HOSTS: str = os.getenv("POSTER_ALLOWED_HOSTS", "image.tmdb.org,s4.anilist.co")
+    POSTER_URL_PREFIX: str = os.getenv("POSTER_URL_PREFIX", "/posters")
+    # Signs poster proxy URLs; empty uses a secret generated once inside POSTER_CACHE_DIR
+    POSTER_URL_SECRET: str = os.getenv("POSTER_URL_SECRET", "")
+    # Shared secret for X-Profile requests and the /admin/profiles endpoints; empty disables both
+    PROFILE_TOKEN: str = os.getenv("PROFILE_TOKEN", "")
+    # Fraction of /chat requests profiled without asking, with the sampling profiler
+    PROFILE_SAMPLE_RATE: float = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+    PROFILE_INTERVAL_MS: float = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+    PROFILE_KEEP: int = int(os.getenv("PROFILE_KEEP", "50"))
+    SNAPSHOT_PATH: str = os.getenv("SNAPSHOT_PATH", "data/state.snapshot")
+    # 0 disables periodic snapshots; one is still written on shutdown
+    SNAPSHOT_INTERVAL_SECONDS: float = float(os.getenv("SNAPSHOT_INTERVAL_SECONDS", "300"))
+    SIMILARITY_SAVE_SECONDS: float = float(os.getenv("SIMILARITY_SAVE_SECONDS", "60"))
 
 config = Config()
 
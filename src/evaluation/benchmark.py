@@ -0,0 +1,365 @@
+import os
+
+# The benchmark never talks to real upstreams, so placeholder keys are enough
+# to satisfy config validation when no .env is present.
+os.environ.setdefault("GOOGLE_API_KEY", "offline-benchmark")
+os.environ.setdefault("TMDB_API_KEY", "offline-benchmark")
+
+import argparse
+import contextlib
+import io
+import json
+import logging
+import platform
+import random
+import sys
+import threading
+import time
+import tracemalloc
+import uuid
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from ..agents.orchestrator import OrchestratorAgent
+from ..agents.discovery_agent import DiscoveryAgent
+from ..agents.library_agent import LibraryAgent
+from ..agents.recommender_agent import RecommenderAgent
+from ..clients.tmdb_client import TMDBClient
+from ..clients.anilist_client import AniListClient
+from ..clients.transport import Cassette, FaultInjector, HTTPTransport, ReplayTransport
+from ..models import MediaItem
+from ..tools.search_tools import SearchTools
+from ..tools.library_tools import LibraryTools
+from ..tools.recommendation_tools import RecommendationTools
+from ..services.session_service import SessionService
+from ..services.memory_service import MemoryService
+from ..services.observability import observability
+from .evaluation_scenarios import AgentEvaluator
+
+GENRES = ["Action", "Adventure", "Comedy", "Drama", "Fantasy", "Mystery", "Romance", "Sci-Fi"]
+
+CONVERSATION = [
+    "hello",
+    "search for attack on titan anime",
+    "add attack on titan anime to my library",
+    "search for breaking bad tv",
+    "add breaking bad tv to my library",
+    "show my library",
+    "recommend something to watch",
+    "what do you think about slow burn mysteries?"
+]
+
+class StubLatency:
+    def __init__(self, mean: float, jitter: float = 0.25, seed: int = 7):
+        self.mean = mean
+        self.jitter = jitter
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def wait(self):
+        if self.mean <= 0:
+            return
+        with self._lock:
+            delay = self.mean * (1 + self._random.uniform(-self.jitter, self.jitter))
+        time.sleep(delay)
+
+def _stub_items(query: str, media_type: str, source: str, limit: int) -> List[MediaItem]:
+    items = []
+    for i in range(min(limit, 10)):
+        items.append(MediaItem(
+            id=f"{source}_{media_type}_{zlib.crc32(f'{query}:{i}'.encode()) % 100000}",
+            source=source,
+            type=media_type,
+            title=f"{query.title()} {i + 1}" if i else query.title(),
+            overview=f"Offline {media_type} result {i + 1} for {query}.",
+            year=2000 + i,
+            genres=[GENRES[i % len(GENRES)], GENRES[(i + 2) % len(GENRES)]],
+            score=round(9.0 - i * 0.3, 1),
+            total_episodes=12 + i if media_type in ["anime", "tv"] else None,
+            total_chapters=100 + i if media_type == "manga" else None
+        ))
+    return items
+
+class StubTMDBClient(TMDBClient):
+    def __init__(self, latency: StubLatency):
+        super().__init__()
+        self.latency = latency
+
+    def iter_movies(self, query: str, max_items: Optional[int] = None, *args, **kwargs) -> Iterator[MediaItem]:
+        self.latency.wait()
+        return iter(_stub_items(query, "movie", "tmdb", max_items or 10))
+
+    def iter_tv(self, query: str, max_items: Optional[int] = None, *args, **kwargs) -> Iterator[MediaItem]:
+        # One search call plus the per-result detail fan-out
+        for _ in range(min(max_items or 10, 10) + 1):
+            self.latency.wait()
+        return iter(_stub_items(query, "tv", "tmdb", max_items or 10))
+
+class StubAniListClient(AniListClient):
+    def __init__(self, latency: StubLatency):
+        super().__init__()
+        self.latency = latency
+
+    def iter_anime(self, query: str, max_items: Optional[int] = None, *args, **kwargs) -> Iterator[MediaItem]:
+        self.latency.wait()
+        return iter(_stub_items(query, "anime", "anilist", max_items or 10))
+
+    def iter_manga(self, query: str, max_items: Optional[int] = None, *args, **kwargs) -> Iterator[MediaItem]:
+        self.latency.wait()
+        return iter(_stub_items(query, "manga", "anilist", max_items or 10))
+
+class StubGeminiResponse:
+    def __init__(self, text: str):
+        self.text = text
+        self.candidates = []
+
+class StubGeminiChat:
+    def __init__(self, latency: StubLatency):
+        self.latency = latency
+
+    def send_message(self, content: Any, **kwargs) -> StubGeminiResponse:
+        self.latency.wait()
+        return StubGeminiResponse(f"Offline answer to: {str(content)[-80:]}")
+
+class StubGeminiModel:
+    def __init__(self, latency: StubLatency):
+        self.latency = latency
+
+    def start_chat(self, **kwargs) -> StubGeminiChat:
+        return StubGeminiChat(self.latency)
+
+def build_offline_orchestrator(upstream_latency: float = 0.02, llm_latency: float = 0.1,
+                               transport: Optional[HTTPTransport] = None) -> OrchestratorAgent:
+    session_service = SessionService()
+    memory_service = MemoryService()
+
+    search_tools = SearchTools()
+    if transport:
+        # Real clients over recorded upstream responses
+        search_tools.tmdb = TMDBClient(transport)
+        search_tools.anilist = AniListClient(transport)
+    else:
+        search_tools.tmdb = StubTMDBClient(StubLatency(upstream_latency, seed=1))
+        search_tools.anilist = StubAniListClient(StubLatency(upstream_latency, seed=2))
+    library_tools = LibraryTools(memory_service)
+    recommendation_tools = RecommendationTools(memory_service)
+
+    discovery_agent = DiscoveryAgent(search_tools)
+    library_agent = LibraryAgent(library_tools)
+    recommender_agent = RecommenderAgent(recommendation_tools)
+    orchestrator = OrchestratorAgent(
+        discovery_agent, library_agent, recommender_agent,
+        session_service, memory_service
+    )
+
+    llm = StubGeminiModel(StubLatency(llm_latency, seed=3))
+    for agent in [orchestrator, discovery_agent, library_agent, recommender_agent]:
+        agent.model = llm
+    return orchestrator
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * pct / 100
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+def summarize(latencies: List[float]) -> Dict[str, float]:
+    return {
+        "count": len(latencies),
+        "mean_ms": round(sum(latencies) / len(latencies) * 1000, 3) if latencies else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+        "max_ms": round(max(latencies) * 1000, 3) if latencies else 0.0
+    }
+
+def bench_scenarios(orchestrator: OrchestratorAgent, iterations: int) -> Dict[str, Any]:
+    evaluator = AgentEvaluator(orchestrator)
+    scenarios: Dict[str, Callable[[], dict]] = {
+        "discovery": evaluator.test_discovery,
+        "library": evaluator.test_library_management,
+        "recommendations": evaluator.test_recommendations,
+        "multi_turn": evaluator.test_multi_turn
+    }
+
+    results = {}
+    for name, scenario in scenarios.items():
+        latencies = []
+        failures = 0
+        for _ in range(iterations):
+            with contextlib.redirect_stdout(io.StringIO()):
+                start = time.perf_counter()
+                outcome = scenario()
+                latencies.append(time.perf_counter() - start)
+            failures += 0 if outcome["passed"] else 1
+        results[name] = {**summarize(latencies), "failures": failures}
+        print(f"  {name:<16} p50={results[name]['p50_ms']}ms p95={results[name]['p95_ms']}ms failures={failures}")
+    return results
+
+def bench_throughput(orchestrator: OrchestratorAgent, sessions: int, rounds: int) -> Dict[str, Any]:
+    latencies: List[float] = []
+    lock = threading.Lock()
+
+    def run_session(_: int):
+        session_id = str(uuid.uuid4())
+        local = []
+        for _ in range(rounds):
+            for message in CONVERSATION:
+                start = time.perf_counter()
+                orchestrator.process(session_id, message)
+                local.append(time.perf_counter() - start)
+        with lock:
+            latencies.extend(local)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=sessions) as pool:
+        list(pool.map(run_session, range(sessions)))
+    elapsed = time.perf_counter() - start
+
+    result = {
+        "sessions": sessions,
+        "messages": len(latencies),
+        "elapsed_seconds": round(elapsed, 3),
+        "messages_per_second": round(len(latencies) / elapsed, 2),
+        "latency": summarize(latencies)
+    }
+    print(f"  {sessions} sessions: {result['messages_per_second']} msg/s, p95={result['latency']['p95_ms']}ms")
+    return result
+
+def bench_memory(orchestrator: OrchestratorAgent, turns: int) -> Dict[str, Any]:
+    session_id = str(uuid.uuid4())
+    samples = []
+
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    for turn in range(turns):
+        orchestrator.process(session_id, CONVERSATION[turn % len(CONVERSATION)])
+        if (turn + 1) % max(turns // 10, 1) == 0:
+            samples.append(tracemalloc.get_traced_memory()[0] - baseline)
+    peak = tracemalloc.get_traced_memory()[1] - baseline
+    tracemalloc.stop()
+
+    result = {
+        "turns": turns,
+        "growth_bytes": samples[-1] if samples else 0,
+        "growth_bytes_per_turn": round(samples[-1] / turns, 1) if samples else 0.0,
+        "peak_bytes": peak,
+        "samples": samples
+    }
+    print(f"  {turns} turns: {result['growth_bytes_per_turn']} bytes/turn, peak={peak} bytes")
+    return result
+
+def find_regressions(results: Dict[str, Any], baseline: Dict[str, Any], threshold: float,
+                     min_delta_ms: float = 1.0) -> List[str]:
+    regressions = []
+
+    def check(label: str, current: float, previous: float, higher_is_worse: bool = True):
+        if not previous:
+            return
+        # Sub-millisecond jitter on in-memory paths is noise, not a regression
+        if label.endswith("_ms") and abs(current - previous) < min_delta_ms:
+            return
+        change = (current - previous) / previous
+        if not higher_is_worse:
+            change = -change
+        if change > threshold:
+            regressions.append(f"{label}: {previous} -> {current} ({change:+.0%})")
+
+    for name, stats in results.get("scenarios", {}).items():
+        previous = baseline.get("scenarios", {}).get(name)
+        if previous:
+            check(f"scenarios.{name}.p50_ms", stats["p50_ms"], previous["p50_ms"])
+            check(f"scenarios.{name}.p95_ms", stats["p95_ms"], previous["p95_ms"])
+
+    if "throughput" in results and "throughput" in baseline:
+        check("throughput.messages_per_second", results["throughput"]["messages_per_second"],
+              baseline["throughput"]["messages_per_second"], higher_is_worse=False)
+        check("throughput.latency.p95_ms", results["throughput"]["latency"]["p95_ms"],
+              baseline["throughput"]["latency"]["p95_ms"])
+
+    if "memory" in results and "memory" in baseline:
+        check("memory.growth_bytes_per_turn", results["memory"]["growth_bytes_per_turn"],
+              baseline["memory"]["growth_bytes_per_turn"])
+
+    return regressions
+
+def run_benchmark(iterations: int = 20, sessions: int = 8, rounds: int = 3, turns: int = 400,
+                  upstream_latency: float = 0.02, llm_latency: float = 0.1,
+                  transport: Optional[HTTPTransport] = None) -> Dict[str, Any]:
+    observability.logger.setLevel(logging.WARNING)
+    orchestrator = build_offline_orchestrator(upstream_latency, llm_latency, transport)
+
+    print("=" * 80)
+    print("OFFLINE BENCHMARK")
+    print("=" * 80)
+    results: Dict[str, Any] = {
+        "meta": {
+            "python": platform.python_version(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "upstream_latency_seconds": upstream_latency,
+            "llm_latency_seconds": llm_latency,
+            "replay": transport is not None
+        }
+    }
+
+    print("\n[Scenario latency]")
+    results["scenarios"] = bench_scenarios(orchestrator, iterations)
+    print("\n[Concurrent throughput]")
+    results["throughput"] = bench_throughput(orchestrator, sessions, rounds)
+    print("\n[Long session memory]")
+    results["memory"] = bench_memory(build_offline_orchestrator(0, 0), turns)
+    return results
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Offline latency, throughput and memory benchmark")
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--sessions", type=int, default=8)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--turns", type=int, default=400)
+    parser.add_argument("--upstream-latency", type=float, default=0.02)
+    parser.add_argument("--llm-latency", type=float, default=0.1)
+    parser.add_argument("--cassette-dir", help="Replay recorded TMDB/AniList responses instead of stubs")
+    parser.add_argument("--faults", default="", help="Fault profiles for replay (JSON file or inline JSON)")
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--baseline", help="Compare against a stored results file")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Allowed regression ratio")
+    parser.add_argument("--min-delta-ms", type=float, default=1.0,
+                        help="Ignore latency changes smaller than this")
+    parser.add_argument("--save-baseline", help="Write these results as the new baseline")
+    args = parser.parse_args(argv)
+
+    transport = None
+    if args.cassette_dir:
+        transport = ReplayTransport(Cassette(args.cassette_dir), FaultInjector.from_config(args.faults, seed=0))
+
+    results = run_benchmark(args.iterations, args.sessions, args.rounds, args.turns,
+                            args.upstream_latency, args.llm_latency, transport)
+
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults written to {args.output}")
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Baseline saved to {args.save_baseline}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = find_regressions(results, baseline, args.threshold, args.min_delta_ms)
+        if regressions:
+            print(f"\nREGRESSIONS (threshold {args.threshold:.0%}):")
+            for line in regressions:
+                print(f"  - {line}")
+            return 1
+        print(f"\nNo regressions beyond {args.threshold:.0%} of {args.baseline}")
+
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
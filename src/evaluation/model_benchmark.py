@@ -0,0 +1,70 @@
+import gc
+import sys
+import time
+import tracemalloc
+from typing import Callable, Dict, List
+
+from ..models import MediaItem
+
+GENRES = ["Action", "Adventure", "Comedy", "Drama", "Fantasy", "Romance", "Sci-Fi", "Thriller"]
+TYPES = ["anime", "movie", "tv", "manga"]
+
+def _raw_item(i: int) -> Dict:
+    media_type = TYPES[i % 4]
+    return {
+        "id": f"bench_{media_type}_{i}",
+        "source": "anilist" if media_type in ["anime", "manga"] else "tmdb",
+        "type": media_type,
+        "title": f"Benchmark Title {i}",
+        "overview": "A short overview used for serialization benchmarks. " * 3,
+        "year": 1990 + i % 35,
+        "genres": [GENRES[i % 8], GENRES[(i + 3) % 8]],
+        "score": round(5 + (i % 50) / 10, 1),
+        "total_episodes": 12 + i % 24 if media_type != "manga" else None,
+        "total_chapters": 100 + i % 300 if media_type == "manga" else None,
+        "status": "planned",
+        "added_date": "2024-01-01T12:00:00",
+        "poster_url": f"https://image.tmdb.org/t/p/w500/poster_{i}.jpg"
+    }
+
+def _time(label: str, fn: Callable[[], None], count: int, repeat: int) -> Dict:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    result = {"op": label, "count": count, "best_seconds": round(best, 4),
+              "us_per_item": round(best / count * 1e6, 2)}
+    print(f"  {label:<12} {result['us_per_item']:>8} us/item  ({result['best_seconds']}s for {count})")
+    return result
+
+def _resident_bytes(raw: List[Dict]) -> float:
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    items = [MediaItem.from_dict(data) for data in raw]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del items
+    return (after - before) / len(raw)
+
+def run_benchmark(count: int = 20000, repeat: int = 5) -> List[Dict]:
+    print(f"MediaItem micro-benchmark ({count} items, best of {repeat})")
+    raw = [_raw_item(i) for i in range(count)]
+    items = [MediaItem.from_dict(data) for data in raw]
+    dicts = [item.to_dict() for item in items]
+
+    results = [
+        _time("construct", lambda: [MediaItem(**d) for d in raw], count, repeat),
+        _time("from_dict", lambda: [MediaItem.from_dict(d) for d in dicts], count, repeat),
+        _time("to_dict", lambda: [item.to_dict() for item in items], count, repeat),
+        _time("to_json", lambda: [item.to_json() for item in items], count, repeat)
+    ]
+
+    per_item = _resident_bytes(raw)
+    print(f"  resident     {per_item:>8.0f} bytes/item")
+    results.append({"op": "resident", "count": count, "bytes_per_item": round(per_item)})
+    return results
+
+if __name__ == "__main__":
+    run_benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 20000)
@@ -1,11 +1,24 @@
-from dataclasses import dataclass, field, asdict
-from typing import Literal, Optional, List, Dict, Any
+from dataclasses import dataclass, field, fields
+from typing import Literal, Optional, List, Dict, Any, Tuple
 from datetime import datetime
+import json
+import sys
+import time
 
 MediaType = Literal["anime", "movie", "tv", "manga"]
 MediaStatus = Literal["watching", "reading", "completed", "dropped", "planned", "on_hold"]
 
-@dataclass
+_json_encoder = json.JSONEncoder(ensure_ascii=False, check_circular=False, separators=(",", ":"))
+
+def encode_json(obj: Any) -> str:
+    return _json_encoder.encode(obj)
+
+def _to_timestamp(value: Any) -> float:
+    if isinstance(value, str):
+        return datetime.fromisoformat(value).timestamp()
+    return float(value)
+
+@dataclass(slots=True)
 class MediaItem:
     id: str
     source: Literal["tmdb", "anilist"]
@@ -13,34 +26,80 @@ class MediaItem:
     title: str
     overview: str
     year: Optional[int] = None
-    genres: List[str] = field(default_factory=list)
+    genres: Tuple[str, ...] = ()
     score: Optional[float] = None
     total_episodes: Optional[int] = None
     total_chapters: Optional[int] = None
     progress_episodes: int = 0
     progress_chapters: int = 0
     status: MediaStatus = "planned"
-    added_date: str = field(default_factory=lambda: datetime.now().isoformat())
+    added_date: float = field(default_factory=time.time)
     poster_url: Optional[str] = None
-    
+
+    def __post_init__(self):
+        # Model-supplied payloads and older exports may carry explicit nulls; those mean "use the default"
+        if self.status is None:
+            self.status = "planned"
+        if self.genres is None:
+            self.genres = ()
+        if self.progress_episodes is None:
+            self.progress_episodes = 0
+        if self.progress_chapters is None:
+            self.progress_chapters = 0
+        if self.added_date is None:
+            self.added_date = time.time()
+
+        # Interned enums and genres are shared across every resident item
+        self.source = sys.intern(self.source)
+        self.type = sys.intern(self.type)
+        self.status = sys.intern(self.status)
+        self.genres = tuple(sys.intern(g) for g in self.genres)
+        if not isinstance(self.added_date, float):
+            self.added_date = _to_timestamp(self.added_date)
+
     def to_dict(self) -> Dict[str, Any]:
-        return asdict(self)
-    
+        return {
+            "id": self.id,
+            "source": self.source,
+            "type": self.type,
+            "title": self.title,
+            "overview": self.overview,
+            "year": self.year,
+            "genres": list(self.genres),
+            "score": self.score,
+            "total_episodes": self.total_episodes,
+            "total_chapters": self.total_chapters,
+            "progress_episodes": self.progress_episodes,
+            "progress_chapters": self.progress_chapters,
+            "status": self.status,
+            "added_date": datetime.fromtimestamp(self.added_date).isoformat(),
+            "poster_url": self.poster_url
+        }
+
+    def to_json(self) -> str:
+        return _json_encoder.encode(self.to_dict())
+
     @classmethod
     def from_dict(cls, data: Dict[str, Any]) -> 'MediaItem':
-        return cls(**data)
+        return cls(**{name: data[name] for name in MEDIA_ITEM_FIELDS if name in data})
+
+MEDIA_ITEM_FIELDS = tuple(f.name for f in fields(MediaItem))
 
 @dataclass
 class UserPreferences:
     favorite_genres: List[str] = field(default_factory=list)
     liked_items: List[str] = field(default_factory=list)
     disliked_items: List[str] = field(default_factory=list)
-    
+
     def to_dict(self) -> Dict[str, Any]:
-        return asdict(self)
+        return {
+            "favorite_genres": list(self.favorite_genres),
+            "liked_items": list(self.liked_items),
+            "disliked_items": list(self.disliked_items)
+        }
 
 @dataclass
 class ConversationMessage:
     role: Literal["user", "assistant", "system"]
     content: str
-    timestamp: str = field(default_factory=lambda: datetime.now().isoformat())
\ No newline at end of file
+    timestamp: str = field(default_factory=lambda: datetime.now().isoformat())
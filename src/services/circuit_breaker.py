@@ -0,0 +1,122 @@
+import threading
+import time
+from collections import deque
+from typing import Any, Dict
+
+from ..config import config
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+class CircuitOpenError(Exception):
+    pass
+
+class CircuitBreaker:
+    def __init__(self, name: str, window: int = 20, min_calls: int = 5, error_rate: float = 0.5,
+                 slow_call_seconds: float = 5.0, open_seconds: float = 30.0, half_open_probes: int = 1):
+        self.name = name
+        self.window = window
+        self.min_calls = min_calls
+        self.error_rate = error_rate
+        self.slow_call_seconds = slow_call_seconds
+        self.open_seconds = open_seconds
+        self.half_open_probes = half_open_probes
+
+        self.state = CLOSED
+        self.opened_at = 0.0
+        self.probes_in_flight = 0
+        self.times_opened = 0
+        self.rejected = 0
+        self._outcomes: deque = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def current_state(self) -> str:
+        with self._lock:
+            self._maybe_half_open()
+            return self.state
+
+    def _maybe_half_open(self):
+        if self.state == OPEN and time.monotonic() - self.opened_at >= self.open_seconds:
+            self.state = HALF_OPEN
+            self.probes_in_flight = 0
+
+    def allow(self) -> bool:
+        with self._lock:
+            self._maybe_half_open()
+
+            if self.state == CLOSED:
+                return True
+            if self.state == HALF_OPEN and self.probes_in_flight < self.half_open_probes:
+                self.probes_in_flight += 1
+                return True
+
+            self.rejected += 1
+            return False
+
+    def record_success(self, elapsed: float):
+        # Slow successes count against the host like errors do
+        if elapsed >= self.slow_call_seconds:
+            self.record_failure(elapsed)
+            return
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self.state = CLOSED
+                self._outcomes.clear()
+            self._outcomes.append(True)
+
+    def record_failure(self, elapsed: float):
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self._trip()
+                return
+            self._outcomes.append(False)
+            failures = self._outcomes.count(False)
+            if len(self._outcomes) >= self.min_calls and failures / len(self._outcomes) >= self.error_rate:
+                self._trip()
+
+    def _trip(self):
+        self.state = OPEN
+        self.opened_at = time.monotonic()
+        self.times_opened += 1
+        self._outcomes.clear()
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            self._maybe_half_open()
+            calls = len(self._outcomes)
+            failures = self._outcomes.count(False)
+            return {
+                "state": self.state,
+                "recent_calls": calls,
+                "recent_error_rate": round(failures / calls, 3) if calls else 0.0,
+                "times_opened": self.times_opened,
+                "rejected": self.rejected,
+                "retry_in_seconds": round(max(self.open_seconds - (time.monotonic() - self.opened_at), 0), 1)
+                if self.state == OPEN else 0
+            }
+
+class BreakerRegistry:
+    def __init__(self):
+        self.breakers: Dict[str, CircuitBreaker] = {}
+        self._lock = threading.Lock()
+
+    def get(self, host: str) -> CircuitBreaker:
+        with self._lock:
+            if host not in self.breakers:
+                self.breakers[host] = CircuitBreaker(
+                    host,
+                    window=config.BREAKER_WINDOW,
+                    min_calls=config.BREAKER_MIN_CALLS,
+                    error_rate=config.BREAKER_ERROR_RATE,
+                    slow_call_seconds=config.BREAKER_SLOW_CALL_SECONDS,
+                    open_seconds=config.BREAKER_OPEN_SECONDS
+                )
+            return self.breakers[host]
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            breakers = list(self.breakers.items())
+        return {host: breaker.snapshot() for host, breaker in breakers}
+
+breakers = BreakerRegistry()
@@ -0,0 +1,200 @@
+import heapq
+import math
+import threading
+from array import array
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from ..models import MediaItem
+
+# How strongly each library status says "this user cares about this item"
+STATUS_WEIGHTS = {
+    "completed": 1.0,
+    "watching": 0.8,
+    "reading": 0.8,
+    "on_hold": 0.5,
+    "planned": 0.4,
+    "dropped": 0.1
+}
+
+class ItemSimilarityModel:
+    def __init__(self, top_k: int = 20, max_user_items: int = 500, max_row_entries: int = 2000,
+                 max_users: int = 10000):
+        self.top_k = top_k
+        self.max_user_items = max_user_items
+        self.max_row_entries = max_row_entries
+        self.max_users = max_users
+
+        self.item_index: Dict[str, int] = {}
+        self.catalog: List[MediaItem] = []
+        # Sparse user x item weights and the symmetric item x item co-occurrence matrix
+        self.user_rows: "OrderedDict[str, Dict[int, float]]" = OrderedDict()
+        self.cooccurrence: List[Dict[int, float]] = []
+        self.norms = array("d")
+        self.neighbors: List[Optional[List[Tuple[int, float]]]] = []
+        self.dirty = set()
+        self._lock = threading.RLock()
+        self._refresher: Optional[threading.Thread] = None
+
+    def on_library_event(self, event: str, session_id: str, item: MediaItem):
+        # Progress alone does not change how much a user cares about an item
+        if event != "progress":
+            self.update(session_id, item)
+
+    def rebuild(self, libraries: Dict[str, List[MediaItem]]):
+        for session_id, items in list(libraries.items()):
+            for item in list(items):
+                self.update(session_id, item)
+
+    def update(self, session_id: str, item: MediaItem):
+        with self._lock:
+            row = self.user_rows.get(session_id)
+            if row is None:
+                row = self.user_rows[session_id] = {}
+                while len(self.user_rows) > self.max_users:
+                    self._retire(*self.user_rows.popitem(last=False))
+            self.user_rows.move_to_end(session_id)
+
+            # Capped before indexing, so a full library cannot grow the catalog either
+            index = self.item_index.get(item.id)
+            if (index is None or index not in row) and len(row) >= self.max_user_items:
+                return
+            index = self._index(item)
+
+            old = row.get(index, 0.0)
+            new = STATUS_WEIGHTS.get(item.status, 0.4)
+            if new == old:
+                return
+
+            delta = new - old
+            own_row = self.cooccurrence[index]
+            for other, weight in row.items():
+                if other == index:
+                    continue
+                own_row[other] = own_row.get(other, 0.0) + delta * weight
+                other_row = self.cooccurrence[other]
+                other_row[index] = other_row.get(index, 0.0) + delta * weight
+                self.dirty.add(other)
+                self._prune(other)
+            self._prune(index)
+
+            self.norms[index] += new * new - old * old
+            row[index] = new
+            self.dirty.add(index)
+
+    def similar_items(self, item_id: str, count: int = 10) -> List[Tuple[MediaItem, float]]:
+        with self._lock:
+            index = self.item_index.get(item_id)
+            if index is None:
+                return []
+            return [(self.catalog[j], sim) for j, sim in self._neighbors(index)[:count]]
+
+    def recommend(self, session_id: str, count: int = 5,
+                  media_type: Optional[str] = None) -> List[Tuple[MediaItem, float, MediaItem]]:
+        with self._lock:
+            row = self.user_rows.get(session_id, {})
+            scores: Dict[int, float] = {}
+            because: Dict[int, Tuple[float, int]] = {}
+
+            for index, weight in row.items():
+                for other, sim in self._neighbors(index):
+                    if other in row:
+                        continue
+                    if media_type and self.catalog[other].type != media_type:
+                        continue
+                    contribution = weight * sim
+                    scores[other] = scores.get(other, 0.0) + contribution
+                    if contribution > because.get(other, (0.0, -1))[0]:
+                        because[other] = (contribution, index)
+
+            best = heapq.nlargest(count, scores.items(), key=lambda entry: entry[1])
+            return [(self.catalog[j], score, self.catalog[because[j][1]]) for j, score in best]
+
+    def refresh_dirty(self, limit: Optional[int] = None) -> int:
+        with self._lock:
+            pending = list(self.dirty)[:limit] if limit else list(self.dirty)
+        for index in pending:
+            with self._lock:
+                self.neighbors[index] = self._compute_neighbors(index)
+                self.dirty.discard(index)
+        return len(pending)
+
+    def start_background_refresh(self, interval: float = 5.0):
+        if self._refresher:
+            return
+        stop = threading.Event()
+
+        def loop():
+            while not stop.wait(interval):
+                self.refresh_dirty()
+
+        self._refresher = threading.Thread(target=loop, name="item-similarity-refresh", daemon=True)
+        self._refresher.start()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "items": len(self.catalog),
+                "users": len(self.user_rows),
+                "nonzero_pairs": sum(len(row) for row in self.cooccurrence),
+                "dirty": len(self.dirty)
+            }
+
+    def _index(self, item: MediaItem) -> int:
+        index = self.item_index.get(item.id)
+        if index is None:
+            index = len(self.catalog)
+            self.item_index[item.id] = index
+            # Catalog copy without the adding user's status and progress
+            catalog_item = MediaItem.from_dict(item.to_dict())
+            catalog_item.status = "planned"
+            catalog_item.progress_episodes = 0
+            catalog_item.progress_chapters = 0
+            self.catalog.append(catalog_item)
+            self.cooccurrence.append({})
+            self.norms.append(0.0)
+            self.neighbors.append(None)
+        return index
+
+    def _neighbors(self, index: int) -> List[Tuple[int, float]]:
+        # Precomputed lists are served as-is; only never-computed items are built inline
+        neighbors = self.neighbors[index]
+        if neighbors is None:
+            neighbors = self._compute_neighbors(index)
+            self.neighbors[index] = neighbors
+            self.dirty.discard(index)
+        return neighbors
+
+    def _compute_neighbors(self, index: int) -> List[Tuple[int, float]]:
+        norm = self.norms[index]
+        if norm <= 0:
+            return []
+        candidates = (
+            (other, value / math.sqrt(norm * self.norms[other]))
+            for other, value in self.cooccurrence[index].items()
+            if value > 0 and self.norms[other] > 0
+        )
+        return heapq.nlargest(self.top_k, candidates, key=lambda entry: entry[1])
+
+    def _retire(self, session_id: str, row: Dict[int, float]):
+        # Take the evicted user's pairs back out; if the session returns its row starts empty and is counted afresh
+        entries = list(row.items())
+        for position, (index, weight) in enumerate(entries):
+            self.norms[index] = max(0.0, self.norms[index] - weight * weight)
+            self.dirty.add(index)
+            for other, other_weight in entries[position + 1:]:
+                for a, b in ((index, other), (other, index)):
+                    pairs = self.cooccurrence[a]
+                    if b in pairs:
+                        value = pairs[b] - weight * other_weight
+                        if value > 1e-9:
+                            pairs[b] = value
+                        else:
+                            del pairs[b]
+
+    def _prune(self, index: int):
+        row = self.cooccurrence[index]
+        if len(row) <= self.max_row_entries:
+            return
+        keep = heapq.nlargest(self.max_row_entries // 2, row.items(), key=lambda entry: entry[1])
+        self.cooccurrence[index] = dict(keep)
@@ -0,0 +1,92 @@
+import re
+import threading
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Deque, Dict, List
+
+from .session_service import SessionService
+
+TITLE_RE = re.compile(r"\*\*(.+?)\*\*")
+
+def estimate_tokens(text: str) -> int:
+    # Roughly 4 characters per token for English; never less than one per word
+    return max(len(text) // 4, len(text.split()))
+
+@dataclass
+class RollingSummary:
+    upto: int = 0
+    tokens: int = 0
+    lines: Deque[str] = field(default_factory=deque)
+
+class ContextBuilder:
+    def __init__(self, session_service: SessionService, token_budget: int = 2000,
+                 recent_turns: int = 6, summary_tokens: int = 400):
+        self.session_service = session_service
+        self.token_budget = token_budget
+        self.recent_turns = recent_turns
+        self.summary_tokens = summary_tokens
+        self.summaries: Dict[str, RollingSummary] = {}
+        self._lock = threading.Lock()
+
+    def build(self, session_id: str, library_summary: str = "") -> str:
+        session = self.session_service.get_session(session_id)
+        history = list(session.conversation_history) if session else []
+
+        summary = self.summaries.get(session_id)
+        start = max(len(history) - self.recent_turns, summary.upto if summary else 0)
+        recent_budget = self.token_budget - estimate_tokens(library_summary) - self.summary_tokens
+
+        # Newest turns first until the budget runs out; whatever does not fit gets summarized
+        recent: List[str] = []
+        used = 0
+        for index in range(len(history) - 1, start - 1, -1):
+            line = self._format(history[index])
+            tokens = estimate_tokens(line)
+            if used + tokens > recent_budget:
+                if not recent and recent_budget > 0:
+                    recent.append(line[:recent_budget * 4] + "…")
+                    index -= 1
+                start = index + 1
+                break
+            recent.append(line)
+            used += tokens
+        recent.reverse()
+
+        summary_lines = self._fold(session_id, history, start)
+
+        sections = [library_summary.strip()] if library_summary.strip() else []
+        if summary_lines:
+            sections.append("Earlier in this conversation:\n" + "\n".join(f"- {line}" for line in summary_lines))
+        if recent:
+            sections.append("Recent conversation:\n" + "\n".join(recent))
+        return "\n\n".join(sections)
+
+    def _fold(self, session_id: str, history: List[Dict[str, Any]], upto: int) -> List[str]:
+        with self._lock:
+            summary = self.summaries.setdefault(session_id, RollingSummary())
+            # Only turns that newly fell out of the verbatim window are summarized
+            for message in history[summary.upto:upto]:
+                line = self._summarize(message)
+                summary.lines.append(line)
+                summary.tokens += estimate_tokens(line)
+            summary.upto = max(summary.upto, upto)
+
+            while summary.tokens > self.summary_tokens and summary.lines:
+                summary.tokens -= estimate_tokens(summary.lines.popleft())
+            return list(summary.lines)
+
+    def _format(self, message: Dict[str, Any]) -> str:
+        return f"{message.get('role', 'user').title()}: {message.get('content', '')}"
+
+    def _summarize(self, message: Dict[str, Any]) -> str:
+        content = str(message.get("content", "")).strip()
+        first_line = content.splitlines()[0] if content else ""
+        if len(first_line) > 100:
+            first_line = first_line[:100] + "…"
+
+        if message.get("role") == "assistant":
+            titles = TITLE_RE.findall(content)[:5]
+            if titles:
+                return f"Assistant: {first_line} ({', '.join(titles)})"
+            return f"Assistant: {first_line}"
+        return f"User: {first_line}"
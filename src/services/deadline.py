@@ -0,0 +1,29 @@
+import threading
+import time
+from typing import List, Optional
+
+class Deadline:
+    def __init__(self, seconds: float):
+        self.expires_at = time.monotonic() + seconds
+        self.partial = False
+        self.reasons: List[str] = []
+        self._lock = threading.Lock()
+
+    def remaining(self) -> float:
+        return max(self.expires_at - time.monotonic(), 0.0)
+
+    @property
+    def expired(self) -> bool:
+        return time.monotonic() >= self.expires_at
+
+    def timeout(self, cap: float) -> float:
+        return min(cap, self.remaining())
+
+    def mark_partial(self, reason: str):
+        with self._lock:
+            self.partial = True
+            if reason not in self.reasons:
+                self.reasons.append(reason)
+
+def budget(deadline: Optional[Deadline], cap: float) -> float:
+    return deadline.timeout(cap) if deadline else cap
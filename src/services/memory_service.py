@@ -1,10 +1,26 @@
-from typing import Dict, List, Optional
+from typing import Any, Callable, Dict, List, Optional
+import sys
+from ..config import config
 from ..models import MediaItem, UserPreferences
+from .progress_journal import ProgressJournal
 
 class MemoryService:
     def __init__(self):
         self.libraries: Dict[str, List[MediaItem]] = {}
         self.preferences: Dict[str, UserPreferences] = {}
+        self.listeners: List[Callable[[str, str, MediaItem], None]] = []
+        self.journal = ProgressJournal(config.ANALYTICS_PACE_WEEKS, config.ANALYTICS_RISK_GAP_FACTOR)
+        self.subscribe(self.journal.on_library_event)
+    
+    def subscribe(self, listener: Callable[[str, str, MediaItem], None]):
+        self.listeners.append(listener)
+    
+    def _notify(self, event: str, session_id: str, item: MediaItem):
+        for listener in self.listeners:
+            try:
+                listener(event, session_id, item)
+            except Exception as e:
+                print(f"Library listener error: {e}")
     
     def add_media_item(self, session_id: str, item: MediaItem):
         if session_id not in self.libraries:
@@ -14,6 +30,22 @@ class MemoryService:
         if item.id not in existing_ids:
             self.libraries[session_id].append(item)
             self._update_preferences(session_id, item)
+            self._notify("added", session_id, item)
+    
+    def add_media_items(self, session_id: str, items: List[MediaItem]) -> int:
+        library = self.libraries.setdefault(session_id, [])
+        existing_ids = {i.id for i in library}
+        
+        added = 0
+        for item in items:
+            if item.id in existing_ids:
+                continue
+            existing_ids.add(item.id)
+            library.append(item)
+            self._update_preferences(session_id, item)
+            self._notify("added", session_id, item)
+            added += 1
+        return added
     
     def get_library(self, session_id: str, media_type: Optional[str] = None, 
                    status: Optional[str] = None) -> List[MediaItem]:
@@ -32,15 +64,39 @@ class MemoryService:
         items = self.libraries.get(session_id, [])
         for item in items:
             if item.id == item_id:
+                episodes_delta = episodes - item.progress_episodes if episodes is not None else 0
+                chapters_delta = chapters - item.progress_chapters if chapters is not None else 0
                 if episodes is not None:
                     item.progress_episodes = episodes
                 if chapters is not None:
                     item.progress_chapters = chapters
-                if status:
-                    item.status = status
+                status_changed = bool(status) and status != item.status
+                if status_changed:
+                    item.status = sys.intern(status)
+                if episodes_delta or chapters_delta or status_changed:
+                    self.journal.record(session_id, item, episodes_delta, chapters_delta,
+                                        status if status_changed else None)
+                if status_changed:
+                    self._notify("status", session_id, item)
+                elif episodes_delta or chapters_delta:
+                    self._notify("progress", session_id, item)
                 return True
         return False
     
+    def export_state(self) -> Dict[str, Any]:
+        return {
+            "libraries": {session_id: [item.to_dict() for item in list(items)]
+                          for session_id, items in list(self.libraries.items())},
+            "preferences": {session_id: prefs.to_dict() for session_id, prefs in list(self.preferences.items())}
+        }
+    
+    def import_state(self, state: Dict[str, Any]):
+        # Restores without notifying listeners; run it before anything subscribes or indexes libraries
+        for session_id, items in state.get("libraries", {}).items():
+            self.libraries[session_id] = [MediaItem.from_dict(item) for item in items]
+        for session_id, prefs in state.get("preferences", {}).items():
+            self.preferences[session_id] = UserPreferences(**prefs)
+    
     def get_preferences(self, session_id: str) -> UserPreferences:
         if session_id not in self.preferences:
             self.preferences[session_id] = UserPreferences()
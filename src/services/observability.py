@@ -1,6 +1,6 @@
 import logging
 from datetime import datetime
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 from functools import wraps
 
 logging.basicConfig(
@@ -16,8 +16,13 @@ class ObservabilityService:
             "tool_calls": 0,
             "recommendations_generated": 0,
             "items_added": 0,
-            "searches_performed": 0
+            "searches_performed": 0,
+            "prompt_calls": 0,
+            "prompt_tokens_total": 0,
+            "prompt_tokens_max": 0
         }
+        # tool name -> {"calls", "total_ms", "max_ms"}
+        self.tool_timings: Dict[str, Dict[str, float]] = {}
     
     def log_agent_call(self, agent_name: str, input_data: Any, trace_id: str):
         self.logger.info(f"[{trace_id}] Agent: {agent_name} | Input: {str(input_data)[:100]}")
@@ -26,6 +31,12 @@ class ObservabilityService:
     def log_agent_response(self, agent_name: str, response: Any, trace_id: str):
         self.logger.info(f"[{trace_id}] Agent: {agent_name} | Response: {str(response)[:100]}")
     
+    def log_prompt_size(self, agent_name: str, tokens: int, chars: int, trace_id: str):
+        self.logger.info(f"[{trace_id}] Agent: {agent_name} | Prompt: ~{tokens} tokens, {chars} chars")
+        self.metrics["prompt_calls"] += 1
+        self.metrics["prompt_tokens_total"] += tokens
+        self.metrics["prompt_tokens_max"] = max(self.metrics["prompt_tokens_max"], tokens)
+    
     def log_tool_call(self, tool_name: str, params: Dict[str, Any], trace_id: str):
         self.logger.info(f"[{trace_id}] Tool: {tool_name} | Params: {params}")
         self.metrics["tool_calls"] += 1
@@ -37,10 +48,18 @@ class ObservabilityService:
         elif tool_name == "get_recommendations":
             self.metrics["recommendations_generated"] += 1
     
-    def log_tool_result(self, tool_name: str, result: Any, trace_id: str):
+    def log_tool_result(self, tool_name: str, result: Any, trace_id: str, elapsed_ms: Optional[float] = None):
         self.logger.info(f"[{trace_id}] Tool: {tool_name} | Result: {str(result)[:100]}")
+        if elapsed_ms is not None:
+            timing = self.tool_timings.setdefault(tool_name, {"calls": 0, "total_ms": 0.0, "max_ms": 0.0})
+            timing["calls"] += 1
+            timing["total_ms"] = round(timing["total_ms"] + elapsed_ms, 2)
+            timing["max_ms"] = max(timing["max_ms"], elapsed_ms)
     
     def get_metrics(self) -> Dict[str, int]:
         return self.metrics.copy()
+    
+    def get_tool_timings(self) -> Dict[str, Dict[str, float]]:
+        return {name: dict(timing) for name, timing in self.tool_timings.items()}
 
 observability = ObservabilityService()
\ No newline at end of file
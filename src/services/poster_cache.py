@@ -0,0 +1,283 @@
+import base64
+import hashlib
+import hmac
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, Optional
+from urllib.parse import quote, urlparse
+
+from ..clients.transport import get_transport
+from ..config import config
+from .single_flight import flights
+
+@dataclass
+class PosterFile:
+    path: str
+    etag: str
+    content_type: str
+    size: int
+
+class PosterFetchError(Exception):
+    pass
+
+class PosterCache:
+    def __init__(self, directory: str, max_bytes: int, allowed_hosts: Iterable[str], transport: Any = None,
+                 max_image_bytes: int = 5 * 1024 * 1024, url_prefix: str = "/posters", secret: str = ""):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.allowed_hosts = {host.strip() for host in allowed_hosts if host.strip()}
+        self.transport = transport
+        self.max_image_bytes = max_image_bytes
+        self.url_prefix = url_prefix.rstrip("/")
+
+        # key -> metadata for cached posters, least recently used first
+        self.entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self.blob_refs: Dict[str, int] = {}
+        self.total_bytes = 0
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, "fetch_errors": 0}
+        self.flights = flights.get("posters")
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.join(directory, "meta"), exist_ok=True)
+        os.makedirs(os.path.join(directory, "blobs"), exist_ok=True)
+        self.secret = secret.encode() if secret else self._shared_secret()
+        self._load()
+
+    def key_for(self, url: str) -> str:
+        # Doubles as the signature: only a URL we handed out maps to its key
+        return hmac.new(self.secret, url.encode(), hashlib.sha256).hexdigest()[:32]
+
+    def proxy_url(self, url: Optional[str]) -> Optional[str]:
+        if not url or urlparse(url).hostname not in self.allowed_hosts:
+            return None
+        # The upstream URL travels with the proxy URL, so any worker can serve it after a restart or eviction
+        source = base64.urlsafe_b64encode(url.encode()).decode().rstrip("=")
+        return f"{self.url_prefix}/{self.key_for(url)}?src={quote(source)}"
+
+    def upstream_url(self, key: str, source: Optional[str]) -> Optional[str]:
+        if not source:
+            return None
+        try:
+            url = base64.urlsafe_b64decode(source + "=" * (-len(source) % 4)).decode()
+        except (ValueError, UnicodeDecodeError):
+            return None
+        if urlparse(url).hostname not in self.allowed_hosts or not hmac.compare_digest(self.key_for(url), key):
+            return None
+        return url
+
+    def lookup(self, key: str) -> Optional[PosterFile]:
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            self.entries.move_to_end(key)
+            self.stats["hits"] += 1
+            return self._file(entry)
+
+    def get(self, key: str, source: Optional[str] = None) -> Optional[PosterFile]:
+        poster = self.lookup(key)
+        if poster is not None:
+            return poster
+        url = self.upstream_url(key, source)
+        if url is None:
+            return None
+        return self.flights.do(key, lambda: self._fetch(key, url), timeout=config.UPSTREAM_TIMEOUT)
+
+    async def get_async(self, key: str, source: Optional[str] = None) -> Optional[PosterFile]:
+        poster = self.lookup(key)
+        if poster is not None:
+            return poster
+        url = self.upstream_url(key, source)
+        if url is None:
+            return None
+        return await self.flights.do_async(key, lambda: self._fetch(key, url), timeout=config.UPSTREAM_TIMEOUT)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self.stats, entries=len(self.entries), bytes=self.total_bytes, max_bytes=self.max_bytes)
+
+    def _fetch(self, key: str, url: str) -> PosterFile:
+        # A concurrent flight may have finished while this one was queued
+        poster = self.lookup(key)
+        if poster is not None:
+            return poster
+
+        with self._lock:
+            self.stats["misses"] += 1
+        response = None
+        try:
+            response = self.transport.get(url, timeout=config.UPSTREAM_TIMEOUT, stream=True)
+            response.raise_for_status()
+            content_type = response.headers.get("Content-Type", "image/jpeg").split(";")[0]
+            declared = response.headers.get("Content-Length")
+            # Refuse oversized posters before reading the body when the upstream says how big it is
+            if not content_type.startswith("image/") or (declared and declared.isdigit() and int(declared) > self.max_image_bytes):
+                raise PosterFetchError(f"Refusing poster from {url}: {content_type}, {declared or 'unknown'} bytes")
+            content = self._read_capped(response, url)
+        except PosterFetchError:
+            raise
+        except Exception as e:
+            with self._lock:
+                self.stats["fetch_errors"] += 1
+            raise PosterFetchError(f"Poster fetch failed for {url}: {e}")
+        finally:
+            if response is not None:
+                response.close()
+
+        digest = hashlib.sha256(content).hexdigest()
+        blob_path = self._blob_path(digest)
+        entry = {"key": key, "url": url, "sha256": digest, "content_type": content_type, "size": len(content)}
+        with self._lock:
+            # The reference is taken before the existence check, so eviction cannot remove the blob in between
+            missing = self._retain(entry) or not os.path.exists(blob_path)
+        try:
+            if missing:
+                os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+                self._atomic_write(blob_path, content)
+            self._atomic_write(self._meta_path(key), json.dumps(entry).encode())
+        except Exception:
+            with self._lock:
+                self._release(entry)
+            raise
+
+        with self._lock:
+            if key in self.entries:
+                self._release(entry)
+                entry = self.entries[key]
+            else:
+                self.entries[key] = entry
+            self._evict()
+            return self._file(entry)
+
+    def _read_capped(self, response: Any, url: str) -> bytes:
+        # Content-Length can be missing or wrong, so the cap is enforced on the bytes actually read
+        chunks = []
+        size = 0
+        for chunk in response.iter_content(64 * 1024):
+            size += len(chunk)
+            if size > self.max_image_bytes:
+                raise PosterFetchError(f"Refusing poster from {url}: more than {self.max_image_bytes} bytes")
+            chunks.append(chunk)
+        return b"".join(chunks)
+
+    def _evict(self):
+        while self.total_bytes > self.max_bytes and len(self.entries) > 1:
+            key, entry = self.entries.popitem(last=False)
+            self.stats["evictions"] += 1
+            # Proxy URLs already handed out still work; the poster is fetched again on demand
+            self._remove(self._meta_path(key))
+            self._release(entry)
+
+    def _retain(self, entry: Dict[str, Any]) -> bool:
+        # Returns True for the first reference, when the blob may not be on disk yet
+        digest = entry["sha256"]
+        self.blob_refs[digest] = self.blob_refs.get(digest, 0) + 1
+        if self.blob_refs[digest] == 1:
+            self.total_bytes += entry["size"]
+            return True
+        return False
+
+    def _release(self, entry: Dict[str, Any]):
+        digest = entry["sha256"]
+        self.blob_refs[digest] -= 1
+        if self.blob_refs[digest] == 0:
+            del self.blob_refs[digest]
+            self.total_bytes -= entry["size"]
+            self._remove(self._blob_path(digest))
+
+    def _load(self):
+        meta_dir = os.path.join(self.directory, "meta")
+        loaded = []
+        for name in os.listdir(meta_dir):
+            path = os.path.join(meta_dir, name)
+            try:
+                with open(path, encoding="utf-8") as f:
+                    entry = json.load(f)
+                blob = self._blob_path(entry["sha256"])
+                # Oldest access first, so the LRU order survives restarts
+                loaded.append((os.stat(blob).st_atime, entry))
+            except (OSError, ValueError, KeyError):
+                self._remove(path)
+
+        for _, entry in sorted(loaded, key=lambda pair: pair[0]):
+            key = self.key_for(entry["url"])
+            if key != entry["key"]:
+                # Written under another secret; keep the blob but file it under the key new URLs will carry
+                self._remove(self._meta_path(entry["key"]))
+                entry["key"] = key
+                self._atomic_write(self._meta_path(key), json.dumps(entry).encode())
+            if key not in self.entries:
+                self.entries[key] = entry
+                self._retain(entry)
+        self._evict()
+
+    def _shared_secret(self) -> bytes:
+        # Generated once per cache directory, so every worker sharing it and every restart signs alike
+        path = os.path.join(self.directory, "secret")
+        try:
+            with open(path, "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            pass
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(os.urandom(32).hex().encode())
+        try:
+            # Linking fails if another worker got there first, and then its secret wins
+            os.link(tmp_path, path)
+        except FileExistsError:
+            pass
+        finally:
+            self._remove(tmp_path)
+        with open(path, "rb") as f:
+            return f.read()
+
+    def _file(self, entry: Dict[str, Any]) -> PosterFile:
+        return PosterFile(self._blob_path(entry["sha256"]), f'"{entry["sha256"]}"', entry["content_type"], entry["size"])
+
+    def _blob_path(self, digest: str) -> str:
+        return os.path.join(self.directory, "blobs", digest[:2], digest)
+
+    def _meta_path(self, key: str) -> str:
+        return os.path.join(self.directory, "meta", f"{key}.json")
+
+    def _atomic_write(self, path: str, data: bytes):
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except Exception:
+            self._remove(tmp_path)
+            raise
+
+    def _remove(self, path: str):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+_poster_cache = None
+_poster_cache_lock = threading.Lock()
+
+def get_poster_cache() -> PosterCache:
+    global _poster_cache
+    with _poster_cache_lock:
+        if _poster_cache is None:
+            _poster_cache = PosterCache(
+                config.POSTER_CACHE_DIR,
+                config.POSTER_CACHE_MAX_BYTES,
+                config.POSTER_ALLOWED_HOSTS.split(","),
+                transport=get_transport(),
+                url_prefix=config.POSTER_URL_PREFIX,
+                secret=config.POSTER_URL_SECRET
+            )
+        return _poster_cache
+
+def with_poster_proxy_url(result: Dict[str, Any]) -> Dict[str, Any]:
+    result["poster_proxy_url"] = get_poster_cache().proxy_url(result.get("poster_url"))
+    return result
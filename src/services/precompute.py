@@ -0,0 +1,189 @@
+import heapq
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+from ..models import MediaItem
+from .memory_service import MemoryService
+
+# How many ranked entries to keep per media type; the chat only ever shows the top few
+KEEP_PER_TYPE = 20
+
+@dataclass
+class Precomputed:
+    version: int
+    computed_at: float
+    context: str
+    recommendations: Dict[str, List[Dict[str, Any]]] = field(default_factory=dict)
+    also_tracked: Dict[str, List[Dict[str, Any]]] = field(default_factory=dict)
+
+class PrecomputeScheduler:
+    def __init__(self, memory_service: MemoryService, recommendation_tools, workers: int = 2,
+                 debounce: float = 0.5, max_wait: float = 5.0, active_window: float = 1800.0):
+        self.memory = memory_service
+        self.recommendation_tools = recommendation_tools
+        self.workers = workers
+        self.debounce = debounce
+        self.max_wait = max_wait
+        self.active_window = active_window
+
+        self.results: Dict[str, Precomputed] = {}
+        self.versions: Dict[str, int] = {}
+        self.last_active: Dict[str, float] = {}
+        self.stats = {"scheduled": 0, "background": 0, "sync": 0, "hits": 0, "invalidated": 0}
+
+        self._due: List[tuple] = []
+        self._pending: Dict[str, float] = {}
+        self._first_event: Dict[str, float] = {}
+        self._running = set()
+        self._cond = threading.Condition()
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._thread: Optional[threading.Thread] = None
+        self._last_sweep = time.monotonic()
+
+        memory_service.subscribe(self.on_library_event)
+
+    def touch(self, session_id: str):
+        with self._cond:
+            self.last_active[session_id] = time.monotonic()
+            entry = self.results.get(session_id)
+            if entry is None or entry.version != self.versions.get(session_id, 0):
+                self._schedule(session_id, 0.0)
+
+    def on_library_event(self, event: str, session_id: str, item: MediaItem):
+        with self._cond:
+            self.versions[session_id] = self.versions.get(session_id, 0) + 1
+            # The writer reads its own results next, so an outdated entry is never worth serving
+            if self.results.pop(session_id, None) is not None:
+                self.stats["invalidated"] += 1
+            last_active = self.last_active.get(session_id)
+            if last_active is not None and time.monotonic() - last_active <= self.active_window:
+                self._schedule(session_id, self.debounce)
+
+    def context_summary(self, session_id: str) -> str:
+        return self._read(session_id).context
+
+    def recommendations(self, session_id: str, media_type: Optional[str] = None, count: int = 5) -> List[Dict[str, Any]]:
+        if count > KEEP_PER_TYPE:
+            return self.recommendation_tools.get_recommendations(session_id, media_type, count)
+        return self._read(session_id).recommendations.get(media_type or "", [])[:count]
+
+    def also_tracked(self, session_id: str, media_type: Optional[str] = None, count: int = 5) -> List[Dict[str, Any]]:
+        if count > KEEP_PER_TYPE:
+            return self.recommendation_tools.get_collaborative_recommendations(session_id, media_type, count)
+        return self._read(session_id).also_tracked.get(media_type or "", [])[:count]
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._cond:
+            return dict(self.stats, sessions=len(self.results), pending=len(self._pending))
+
+    def _read(self, session_id: str) -> Precomputed:
+        with self._cond:
+            entry = self.results.get(session_id)
+            version = self.versions.get(session_id, 0)
+            if entry is not None and entry.version == version:
+                self.stats["hits"] += 1
+                return entry
+            self.stats["sync"] += 1
+
+        # Nothing usable precomputed: pay for it on the request path this once
+        return self._compute(session_id)
+
+    def _compute(self, session_id: str) -> Precomputed:
+        with self._cond:
+            version = self.versions.get(session_id, 0)
+
+        recommendations = self.recommendation_tools.get_recommendations(
+            session_id, None, len(self.memory.get_library(session_id))
+        )
+        also_tracked = self.recommendation_tools.get_collaborative_recommendations(session_id, None, KEEP_PER_TYPE * 4)
+        entry = Precomputed(
+            version=version,
+            computed_at=time.time(),
+            context=self.memory.get_context_summary(session_id),
+            recommendations=self._by_type(recommendations),
+            also_tracked=self._by_type(also_tracked)
+        )
+
+        with self._cond:
+            current = self.results.get(session_id)
+            # Versions restart after a sweep, so only an entry that is already current is kept over this one
+            if current is None or current.version != self.versions.get(session_id, 0):
+                self.results[session_id] = entry
+        return entry
+
+    def _by_type(self, recs: List[Dict[str, Any]]) -> Dict[str, List[Dict[str, Any]]]:
+        grouped: Dict[str, List[Dict[str, Any]]] = {"": recs[:KEEP_PER_TYPE]}
+        for rec in recs:
+            bucket = grouped.setdefault(rec["item"]["type"], [])
+            if len(bucket) < KEEP_PER_TYPE:
+                bucket.append(rec)
+        return grouped
+
+    def _schedule(self, session_id: str, delay: float):
+        # Trailing debounce, but never hold a session back longer than max_wait
+        now = time.monotonic()
+        first = self._first_event.setdefault(session_id, now)
+        due = min(now + delay, first + self.max_wait)
+        if self._pending.get(session_id) == due:
+            return
+        self._pending[session_id] = due
+        heapq.heappush(self._due, (due, session_id))
+        self.stats["scheduled"] += 1
+        self._ensure_started()
+        self._cond.notify()
+
+    def _ensure_started(self):
+        if self._thread is None:
+            self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="precompute")
+            self._thread = threading.Thread(target=self._loop, name="precompute-scheduler", daemon=True)
+            self._thread.start()
+
+    def _loop(self):
+        while True:
+            with self._cond:
+                while True:
+                    now = time.monotonic()
+                    if self._due and self._due[0][0] <= now:
+                        due, session_id = heapq.heappop(self._due)
+                        # Skip superseded heap entries and sessions already being computed
+                        if self._pending.get(session_id) != due:
+                            continue
+                        if session_id in self._running:
+                            self._pending[session_id] = now + self.debounce
+                            heapq.heappush(self._due, (now + self.debounce, session_id))
+                            continue
+                        del self._pending[session_id]
+                        self._first_event.pop(session_id, None)
+                        self._running.add(session_id)
+                        break
+                    self._sweep(now)
+                    self._cond.wait(self._due[0][0] - now if self._due else 60.0)
+
+            self._pool.submit(self._background, session_id)
+
+    def _background(self, session_id: str):
+        try:
+            self._compute(session_id)
+            with self._cond:
+                self.stats["background"] += 1
+        except Exception as e:
+            print(f"Precompute error for {session_id}: {e}")
+        finally:
+            with self._cond:
+                self._running.discard(session_id)
+
+    def _sweep(self, now: float):
+        # Drop results and versions for sessions that went quiet so memory tracks active users only
+        if now - self._last_sweep < 60.0:
+            return
+        self._last_sweep = now
+        for session_id, last_active in list(self.last_active.items()):
+            if now - last_active > self.active_window:
+                del self.last_active[session_id]
+        for state in (self.results, self.versions):
+            for session_id in list(state):
+                if session_id not in self.last_active and session_id not in self._running:
+                    del state[session_id]
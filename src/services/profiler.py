@@ -0,0 +1,214 @@
+import cProfile
+import contextvars
+import io
+import marshal
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+from ..config import config
+
+SAMPLE = "sample"
+DETERMINISTIC = "deterministic"
+
+active_profile: "contextvars.ContextVar[Optional[Profile]]" = contextvars.ContextVar("active_profile", default=None)
+
+@dataclass
+class Profile:
+    trace_id: str
+    label: str
+    mode: str
+    started_at: float
+    duration_ms: float = 0.0
+    samples: int = 0
+    # "outer;inner;leaf" -> samples, the collapsed format flamegraph.pl and speedscope read
+    folded: Dict[str, int] = field(default_factory=dict)
+    stats: Optional[pstats.Stats] = None
+    running: bool = True
+    # Deterministic profilers from pool threads that worked for this request, merged when it ends
+    worker_profilers: List[cProfile.Profile] = field(default_factory=list, repr=False)
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace_id,
+            "label": self.label,
+            "mode": self.mode,
+            "started_at": self.started_at,
+            "duration_ms": self.duration_ms,
+            "samples": self.samples,
+            "formats": ["folded", "pstats", "text"] if self.stats else ["folded"]
+        }
+
+    def folded_text(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in sorted(self.folded.items()))
+
+    def pstats_bytes(self) -> bytes:
+        # The same marshal layout cProfile.dump_stats writes, so snakeviz and pstats can open it
+        return marshal.dumps(self.stats.stats) if self.stats else b""
+
+    def text(self, limit: int = 40) -> str:
+        if not self.stats:
+            return self.folded_text()
+        out = io.StringIO()
+        self.stats.stream = out
+        self.stats.sort_stats("cumulative").print_stats(limit)
+        return out.getvalue()
+
+class ProfileStore:
+    def __init__(self, keep: int = 50, interval: float = 0.005):
+        self.keep = keep
+        self.interval = interval
+        self.profiles: "OrderedDict[str, Profile]" = OrderedDict()
+        # thread ident -> profile being sampled on that thread
+        self.targets: Dict[int, Profile] = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._sampler: Optional[threading.Thread] = None
+
+    @contextmanager
+    def record(self, trace_id: str, label: str, mode: str = SAMPLE):
+        profile = Profile(trace_id, label, mode, time.time())
+        start = time.perf_counter()
+        token = active_profile.set(profile)
+        try:
+            with self._on_this_thread(profile):
+                yield profile
+        finally:
+            active_profile.reset(token)
+            with self._lock:
+                profile.running = False
+                workers = list(profile.worker_profilers)
+            if profile.stats:
+                for worker in workers:
+                    profile.stats.add(worker)
+                profile.folded = self._folded_from_stats(profile.stats)
+            profile.duration_ms = round((time.perf_counter() - start) * 1000, 2)
+            self._store(profile)
+
+    @contextmanager
+    def follow(self):
+        # Pool work submitted on behalf of a profiled request is profiled too
+        profile = active_profile.get()
+        if profile is None or not profile.running:
+            yield
+            return
+        with self._on_this_thread(profile):
+            yield
+
+    @contextmanager
+    def _on_this_thread(self, profile: Profile):
+        ident = threading.get_ident()
+        if profile.mode == DETERMINISTIC:
+            profiler = cProfile.Profile()
+            profiler.enable()
+            try:
+                yield
+            finally:
+                profiler.disable()
+                with self._lock:
+                    if profile.stats is None:
+                        profile.stats = pstats.Stats(profiler)
+                    elif profile.running:
+                        profile.worker_profilers.append(profiler)
+            return
+
+        with self._lock:
+            previous = self.targets.get(ident)
+        self._watch(ident, profile)
+        try:
+            yield
+        finally:
+            with self._lock:
+                if previous is not None:
+                    self.targets[ident] = previous
+                else:
+                    self.targets.pop(ident, None)
+
+    def run(self, trace_id: str, label: str, mode: str, fn: Callable[..., Any], *args) -> Any:
+        with self.record(trace_id, label, mode):
+            return fn(*args)
+
+    def get(self, trace_id: str) -> Optional[Profile]:
+        with self._lock:
+            return self.profiles.get(trace_id)
+
+    def list(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            profiles = list(self.profiles.values())
+        return [profile.summary() for profile in reversed(profiles)]
+
+    def _store(self, profile: Profile):
+        with self._lock:
+            self.profiles[profile.trace_id] = profile
+            self.profiles.move_to_end(profile.trace_id)
+            while len(self.profiles) > self.keep:
+                self.profiles.popitem(last=False)
+
+    def _watch(self, ident: int, profile: Profile):
+        with self._lock:
+            self.targets[ident] = profile
+            if self._sampler is None:
+                self._sampler = threading.Thread(target=self._sample_loop, name="request-profiler", daemon=True)
+                self._sampler.start()
+        self._wake.set()
+
+    def _sample_loop(self):
+        own = threading.get_ident()
+        while True:
+            with self._lock:
+                idle = not self.targets
+                if idle:
+                    self._wake.clear()
+            if idle:
+                # Costs nothing between profiled requests
+                self._wake.wait()
+                continue
+
+            frames = sys._current_frames()
+            with self._lock:
+                for ident, profile in self.targets.items():
+                    frame = frames.get(ident)
+                    if frame is None or ident == own or not profile.running:
+                        continue
+                    stack = self._stack(frame)
+                    profile.folded[stack] = profile.folded.get(stack, 0) + 1
+                    profile.samples += 1
+            time.sleep(self.interval)
+
+    def _stack(self, frame: Any) -> str:
+        names = []
+        while frame is not None:
+            code = frame.f_code
+            names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+            frame = frame.f_back
+        return ";".join(reversed(names))
+
+    def _folded_from_stats(self, stats: pstats.Stats) -> Dict[str, int]:
+        # Deterministic profiles have no full stacks; caller;callee edges weighted by microseconds still render as a flamegraph
+        folded = {}
+        for (filename, line, name), (_, _, _, _, callers) in stats.stats.items():
+            callee = f"{name} ({os.path.basename(filename)}:{line})"
+            for (caller_file, caller_line, caller_name), caller_stats in callers.items():
+                caller = f"{caller_name} ({os.path.basename(caller_file)}:{caller_line})"
+                micros = int(caller_stats[3] * 1_000_000)
+                if micros:
+                    folded[f"{caller};{callee}"] = folded.get(f"{caller};{callee}", 0) + micros
+        return folded
+
+profiles = ProfileStore(keep=config.PROFILE_KEEP, interval=config.PROFILE_INTERVAL_MS / 1000)
+
+def _follow(fn: Callable[..., Any], *args, **kwargs) -> Any:
+    with profiles.follow():
+        return fn(*args, **kwargs)
+
+class TracedExecutor(ThreadPoolExecutor):
+    # Tasks run in the submitter's context, so a profiled request's pool work shows up in its profile
+    def submit(self, fn: Callable[..., Any], /, *args, **kwargs) -> Future:
+        return super().submit(contextvars.copy_context().run, _follow, fn, *args, **kwargs)
@@ -0,0 +1,255 @@
+import base64
+import threading
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from ..models import MediaItem
+
+DAY = 86400.0
+WEEK = 7 * DAY
+
+STATUSES = ["planned", "watching", "reading", "on_hold", "completed", "dropped"]
+STATUS_CODES = {status: code for code, status in enumerate(STATUSES)}
+NO_STATUS = -1
+ACTIVE_CODES = {STATUS_CODES["watching"], STATUS_CODES["reading"]}
+
+class SessionSeries:
+    # Integer columns are "q" rather than "l" so their width does not depend on the platform
+    def __init__(self):
+        # One row per event, in time order
+        self.timestamps = array("d")
+        self.items = array("q")
+        self.episodes = array("q")
+        self.chapters = array("q")
+        self.statuses = array("b")
+        # Prefix sums of units consumed, one longer than the event columns, so any window is two bisects
+        self.cum_episodes = array("q", [0])
+        self.cum_chapters = array("q", [0])
+
+        # One row per item
+        self.item_ids: List[str] = []
+        self.item_index: Dict[str, int] = {}
+        self.item_status = array("b")
+        self.item_total = array("q")
+        self.item_progress = array("q")
+        self.item_units = array("q")
+        self.item_progress_events = array("q")
+        self.item_first_progress = array("d")
+        self.item_last_progress = array("d")
+        self.item_last_event = array("d")
+        self.status_counts = array("q", [0] * len(STATUSES))
+
+    def item(self, item: MediaItem, at: float) -> int:
+        index = self.item_index.get(item.id)
+        if index is None:
+            index = len(self.item_ids)
+            self.item_index[item.id] = index
+            self.item_ids.append(item.id)
+            self.item_status.append(NO_STATUS)
+            self.item_total.append(0)
+            self.item_progress.append(0)
+            self.item_units.append(0)
+            self.item_progress_events.append(0)
+            self.item_first_progress.append(0.0)
+            self.item_last_progress.append(0.0)
+            self.item_last_event.append(at)
+        return index
+
+    def units_between(self, start: float, end: float) -> Dict[str, int]:
+        lo = bisect_left(self.timestamps, start)
+        hi = bisect_right(self.timestamps, end)
+        return {
+            "episodes": self.cum_episodes[hi] - self.cum_episodes[lo],
+            "chapters": self.cum_chapters[hi] - self.cum_chapters[lo]
+        }
+
+SERIES_COLUMNS = [
+    "timestamps", "items", "episodes", "chapters", "statuses", "cum_episodes", "cum_chapters",
+    "item_status", "item_total", "item_progress", "item_units", "item_progress_events",
+    "item_first_progress", "item_last_progress", "item_last_event", "status_counts"
+]
+
+class ProgressJournal:
+    def __init__(self, pace_weeks: int = 4, risk_gap_factor: float = 3.0):
+        self.pace_weeks = pace_weeks
+        self.risk_gap_factor = risk_gap_factor
+        self.sessions: Dict[str, SessionSeries] = {}
+        self._lock = threading.Lock()
+
+    def record(self, session_id: str, item: MediaItem, episodes: int = 0, chapters: int = 0,
+               status: Optional[str] = None, at: Optional[float] = None):
+        now = time.time() if at is None else at
+        with self._lock:
+            series = self.sessions.setdefault(session_id, SessionSeries())
+            # Keep the series sorted even if the wall clock steps back
+            if series.timestamps and now < series.timestamps[-1]:
+                now = series.timestamps[-1]
+            index = series.item(item, now)
+            code = STATUS_CODES.get(status, NO_STATUS) if status else NO_STATUS
+
+            series.timestamps.append(now)
+            series.items.append(index)
+            series.episodes.append(episodes)
+            series.chapters.append(chapters)
+            series.statuses.append(code)
+            series.cum_episodes.append(series.cum_episodes[-1] + max(episodes, 0))
+            series.cum_chapters.append(series.cum_chapters[-1] + max(chapters, 0))
+
+            consumed = max(episodes, 0) + max(chapters, 0)
+            if consumed:
+                if not series.item_progress_events[index]:
+                    series.item_first_progress[index] = now
+                series.item_progress_events[index] += 1
+                series.item_last_progress[index] = now
+                series.item_units[index] += consumed
+            if code != NO_STATUS and code != series.item_status[index]:
+                if series.item_status[index] != NO_STATUS:
+                    series.status_counts[series.item_status[index]] -= 1
+                series.status_counts[code] += 1
+                series.item_status[index] = code
+            series.item_total[index] = item.total_episodes or item.total_chapters or 0
+            series.item_progress[index] = item.progress_episodes if item.type in ["anime", "tv"] else item.progress_chapters
+            series.item_last_event[index] = now
+
+    def export_state(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                session_id: {
+                    "item_ids": list(series.item_ids),
+                    "columns": {name: [getattr(series, name).typecode, getattr(series, name).itemsize,
+                                       base64.b64encode(getattr(series, name).tobytes()).decode("ascii")]
+                                for name in SERIES_COLUMNS}
+                }
+                for session_id, series in self.sessions.items()
+            }
+
+    def import_state(self, state: Dict[str, Any]):
+        with self._lock:
+            for session_id, data in state.items():
+                try:
+                    self.sessions[session_id] = self._import_series(data)
+                except ValueError as e:
+                    print(f"Skipping journal for {session_id}: {e}")
+
+    def _import_series(self, data: Dict[str, Any]) -> SessionSeries:
+        series = SessionSeries()
+        series.item_ids = list(data["item_ids"])
+        series.item_index = {item_id: index for index, item_id in enumerate(series.item_ids)}
+        for name, stored in data["columns"].items():
+            if name not in SERIES_COLUMNS:
+                continue
+            # Older exports did not record the item size; they were written with this machine's native widths
+            typecode, encoded = stored[0], stored[-1]
+            column = array(typecode)
+            if len(stored) > 2 and stored[1] != column.itemsize:
+                raise ValueError(f"{name} was written with {stored[1]}-byte items, not {column.itemsize}")
+            column.frombytes(base64.b64decode(encoded))
+            expected = getattr(series, name).typecode
+            setattr(series, name, column if typecode == expected else array(expected, column))
+        return series
+
+    def on_library_event(self, event: str, session_id: str, item: MediaItem):
+        if event == "added":
+            self.record(session_id, item, status=item.status)
+
+    def event_count(self, session_id: str) -> int:
+        series = self.sessions.get(session_id)
+        return len(series.timestamps) if series else 0
+
+    def weekly_units(self, session_id: str, weeks: int = 12, now: Optional[float] = None) -> List[Dict[str, Any]]:
+        now = time.time() if now is None else now
+        series = self.sessions.get(session_id)
+        rows = []
+        with self._lock:
+            for week in range(weeks - 1, -1, -1):
+                start, end = now - (week + 1) * WEEK, now - week * WEEK
+                units = series.units_between(start, end) if series else {"episodes": 0, "chapters": 0}
+                rows.append(dict(units, week_start=self._date(start)))
+        return rows
+
+    def pace(self, session_id: str, now: Optional[float] = None) -> Dict[str, float]:
+        now = time.time() if now is None else now
+        series = self.sessions.get(session_id)
+        if not series:
+            return {"episodes_per_week": 0.0, "chapters_per_week": 0.0}
+        with self._lock:
+            units = series.units_between(now - self.pace_weeks * WEEK, now)
+        return {
+            "episodes_per_week": round(units["episodes"] / self.pace_weeks, 2),
+            "chapters_per_week": round(units["chapters"] / self.pace_weeks, 2)
+        }
+
+    def completion_rates(self, session_id: str) -> Dict[str, float]:
+        series = self.sessions.get(session_id)
+        if not series:
+            return {"completion_rate": 0.0, "drop_rate": 0.0}
+        counts = series.status_counts
+        completed, dropped = counts[STATUS_CODES["completed"]], counts[STATUS_CODES["dropped"]]
+        started = sum(counts) - counts[STATUS_CODES["planned"]]
+        return {
+            "completion_rate": round(completed / started, 3) if started else 0.0,
+            "drop_rate": round(dropped / started, 3) if started else 0.0
+        }
+
+    def item_signals(self, session_id: str, now: Optional[float] = None) -> Dict[str, Dict[str, Any]]:
+        now = time.time() if now is None else now
+        series = self.sessions.get(session_id)
+        if not series:
+            return {}
+
+        signals = {}
+        with self._lock:
+            active = [i for i, code in enumerate(series.item_status) if code in ACTIVE_CODES]
+            units = series.units_between(now - self.pace_weeks * WEEK, now)
+            session_pace = (units["episodes"] + units["chapters"]) / (self.pace_weeks * 7 * max(len(active), 1))
+
+            for index in active:
+                events = series.item_progress_events[index]
+                first, last = series.item_first_progress[index], series.item_last_progress[index]
+                span_days = max((last - first) / DAY, 1.0) if events else 0.0
+                # The item's own pace once it has one, else its share of the session's recent pace
+                per_day = series.item_units[index] / span_days if events > 1 else session_pace
+
+                since = last if events else series.item_last_event[index]
+                idle_days = max(now - since, 0.0) / DAY
+                typical_gap = max(span_days / (events - 1), 1.0) if events > 1 else 7.0
+                risk = idle_days / (idle_days + self.risk_gap_factor * typical_gap)
+
+                remaining = series.item_total[index] - series.item_progress[index]
+                finish = None
+                if series.item_total[index] and remaining > 0 and per_day > 0:
+                    finish = now + remaining / per_day * DAY
+
+                signals[series.item_ids[index]] = {
+                    "pace_per_week": round(per_day * 7, 2),
+                    "idle_days": round(idle_days, 1),
+                    "drop_risk": round(risk, 3),
+                    "days_to_finish": round((finish - now) / DAY, 1) if finish else None,
+                    "predicted_finish": self._date(finish) if finish else None
+                }
+        return signals
+
+    def features(self, session_id: str, now: Optional[float] = None) -> Dict[str, Any]:
+        features = dict(self.pace(session_id, now), **self.completion_rates(session_id))
+        features["items"] = self.item_signals(session_id, now)
+        return features
+
+    def analytics(self, session_id: str, weeks: int = 12, now: Optional[float] = None) -> Dict[str, Any]:
+        features = self.features(session_id, now)
+        items = [{"item_id": item_id, **signals} for item_id, signals in features.pop("items").items()]
+        return dict(
+            features,
+            session_id=session_id,
+            events=self.event_count(session_id),
+            weekly=self.weekly_units(session_id, weeks, now),
+            predicted_finishes=sorted((row for row in items if row["predicted_finish"]),
+                                      key=lambda row: row["days_to_finish"]),
+            drop_risk=sorted((row for row in items if row["drop_risk"] >= 0.5),
+                             key=lambda row: row["drop_risk"], reverse=True)
+        )
+
+    def _date(self, timestamp: float) -> str:
+        return datetime.fromtimestamp(timestamp, tz=timezone.utc).date().isoformat()
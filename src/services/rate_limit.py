@@ -0,0 +1,231 @@
+import asyncio
+import heapq
+import itertools
+import math
+import threading
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import urlparse
+
+from ..config import config
+
+class RateLimitedError(Exception):
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+    @property
+    def retry_after_header(self) -> str:
+        return str(max(math.ceil(self.retry_after), 1))
+
+# Upstream tokens a bulk caller already waited for on its own thread, spent by the requests made on its behalf.
+# Pool work is submitted with the caller's context, so fetches on other threads see the same dict
+prepaid: "ContextVar[Optional[Dict[str, int]]]" = ContextVar("prepaid_upstream_tokens", default=None)
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.rejected = 0
+        self._lock = threading.Lock()
+
+    def try_acquire(self, tokens: float = 1.0) -> float:
+        # 0 when granted, otherwise how long until enough tokens will have refilled
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= tokens:
+                self.tokens -= tokens
+                return 0.0
+            self.rejected += 1
+            return (tokens - self.tokens) / self.rate if self.rate > 0 else float("inf")
+
+    def refund(self, tokens: float = 1.0):
+        with self._lock:
+            self.tokens = min(self.burst, self.tokens + tokens)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            tokens = min(self.burst, self.tokens + (time.monotonic() - self.updated) * self.rate)
+            return {"rate": self.rate, "burst": self.burst, "tokens": round(tokens, 2), "rejected": self.rejected}
+
+class RateLimiterRegistry:
+    def __init__(self, session_rate: float, session_burst: float, max_sessions: int,
+                 upstream_limits: Dict[str, Tuple[float, float]]):
+        self.session_rate = session_rate
+        self.session_burst = session_burst
+        self.max_sessions = max_sessions
+        self.sessions: "OrderedDict[str, TokenBucket]" = OrderedDict()
+        # Hosts without a configured limit are not throttled here
+        self.upstreams = {host: TokenBucket(rate, burst) for host, (rate, burst) in upstream_limits.items() if rate > 0}
+        self.sessions_rejected = 0
+        self._lock = threading.Lock()
+
+    def session_wait(self, session_id: str) -> float:
+        with self._lock:
+            bucket = self.sessions.get(session_id)
+            if bucket is None:
+                bucket = TokenBucket(self.session_rate, self.session_burst)
+                self.sessions[session_id] = bucket
+                # An evicted session starts again with a full bucket, which is the lenient side to err on
+                while len(self.sessions) > self.max_sessions:
+                    self.sessions.popitem(last=False)
+            self.sessions.move_to_end(session_id)
+        wait = bucket.try_acquire()
+        if wait:
+            with self._lock:
+                self.sessions_rejected += 1
+        return wait
+
+    def acquire_upstream(self, host: str):
+        bucket = self.upstreams.get(host)
+        if bucket is None:
+            return
+        credits = prepaid.get()
+        if credits:
+            with self._lock:
+                if credits.get(host):
+                    credits[host] -= 1
+                    return
+        wait = bucket.try_acquire()
+        if wait:
+            raise RateLimitedError(f"Rate limit reached for {host}", wait)
+
+    @contextmanager
+    def reserve_upstream(self, host: str, max_wait: float) -> Iterator[bool]:
+        # Bulk jobs block here, on their own thread, for a token instead of being refused by acquire_upstream.
+        # The token pays for the first request made inside the block; later ones are charged as usual
+        bucket = self.upstreams.get(host)
+        if bucket is None:
+            yield True
+            return
+        give_up = time.monotonic() + max_wait
+        wait = bucket.try_acquire()
+        while wait and time.monotonic() + wait <= give_up:
+            time.sleep(wait)
+            wait = bucket.try_acquire()
+        if wait:
+            yield False
+            return
+
+        credits = {host: 1}
+        token = prepaid.set(credits)
+        try:
+            yield True
+        finally:
+            prepaid.reset(token)
+            with self._lock:
+                unused = credits[host]
+                credits[host] = 0
+            # Answered from a cache or another caller's flight: hand the token back
+            if unused:
+                bucket.refund(unused)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            sessions = {"tracked": len(self.sessions), "rejected": self.sessions_rejected,
+                        "rate": self.session_rate, "burst": self.session_burst}
+        return {"sessions": sessions, "upstreams": {host: bucket.snapshot() for host, bucket in self.upstreams.items()}}
+
+rate_limits = RateLimiterRegistry(
+    config.SESSION_RATE_PER_SECOND,
+    config.SESSION_BURST,
+    config.SESSION_RATE_BUCKETS,
+    {
+        "generativelanguage.googleapis.com": (config.GEMINI_RATE_PER_SECOND, config.GEMINI_BURST),
+        urlparse(config.TMDB_BASE_URL).netloc: (config.TMDB_RATE_PER_SECOND, config.TMDB_BURST),
+        urlparse(config.ANILIST_API_URL).netloc: (config.ANILIST_RATE_PER_SECOND, config.ANILIST_BURST)
+    }
+)
+
+class AdmissionController:
+    def __init__(self, max_inflight: int, max_queue: int, max_wait: float):
+        self.max_inflight = max_inflight
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.inflight = 0
+        # (priority, arrival, future); lower priority numbers are admitted first
+        self.waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self.service_time = 0.5
+        self.stats = {"admitted": 0, "queued": 0, "rejected": 0, "shed": 0, "expired": 0}
+        self._arrivals = itertools.count()
+
+    @asynccontextmanager
+    async def slot(self, priority: int):
+        await self.acquire(priority)
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            # Smoothed slot hold time, used to size Retry-After
+            self.service_time = 0.8 * self.service_time + 0.2 * (time.monotonic() - start)
+            self.release()
+
+    async def acquire(self, priority: int):
+        if self.inflight < self.max_inflight and not self.waiters:
+            self.inflight += 1
+            self.stats["admitted"] += 1
+            return
+
+        if len(self.waiters) >= self.max_queue:
+            worst = max(self.waiters)
+            if worst[0] <= priority:
+                self.stats["rejected"] += 1
+                raise self._overloaded()
+            # A full queue makes room for cheaper work by shedding the most expensive, newest waiter
+            self.waiters.remove(worst)
+            heapq.heapify(self.waiters)
+            self.stats["shed"] += 1
+            worst[2].set_exception(self._overloaded())
+
+        future = asyncio.get_running_loop().create_future()
+        entry = (priority, next(self._arrivals), future)
+        heapq.heappush(self.waiters, entry)
+        self.stats["queued"] += 1
+        timer = asyncio.get_running_loop().call_later(self.max_wait, self._expire, entry)
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled() and future.exception() is None:
+                # The slot was handed over just as the caller gave up
+                self.release()
+            else:
+                self._discard(entry)
+            raise
+        finally:
+            timer.cancel()
+        self.stats["admitted"] += 1
+
+    def release(self):
+        while self.waiters:
+            _, _, future = heapq.heappop(self.waiters)
+            if not future.done():
+                # Hand the slot straight to the next waiter; inflight stays the same
+                future.set_result(None)
+                return
+        self.inflight -= 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        return dict(self.stats, inflight=self.inflight, queued_now=len(self.waiters),
+                    max_inflight=self.max_inflight, max_queue=self.max_queue)
+
+    def _expire(self, entry: Tuple[int, int, asyncio.Future]):
+        if not entry[2].done():
+            self._discard(entry)
+            self.stats["expired"] += 1
+            entry[2].set_exception(self._overloaded())
+
+    def _discard(self, entry: Tuple[int, int, asyncio.Future]):
+        if entry in self.waiters:
+            self.waiters.remove(entry)
+            heapq.heapify(self.waiters)
+
+    def _overloaded(self) -> RateLimitedError:
+        retry_after = self.service_time * (len(self.waiters) + 1) / self.max_inflight
+        return RateLimitedError("Server is busy, retry shortly", retry_after)
@@ -1,4 +1,4 @@
-from typing import Dict, Any, Optional
+from typing import Callable, Dict, Any, Optional
 from dataclasses import dataclass, field
 from datetime import datetime
 import json
@@ -15,6 +15,8 @@ class Session:
 class SessionService:
     def __init__(self):
         self.sessions: Dict[str, Session] = {}
+        # Sessions that are not resident yet (e.g. still in a snapshot) are restored through this on first access
+        self.loader: Optional[Callable[[str], Optional[Session]]] = None
     
     def create_session(self, session_id: str, user_id: str = "default_user") -> Session:
         session = Session(session_id=session_id, user_id=user_id)
@@ -22,17 +24,24 @@ class SessionService:
         return session
     
     def get_session(self, session_id: str) -> Optional[Session]:
-        return self.sessions.get(session_id)
+        session = self.sessions.get(session_id)
+        if session is None and self.loader:
+            restored = self.loader(session_id)
+            if restored is not None:
+                session = self.sessions.setdefault(session_id, restored)
+        return session
     
     def update_session(self, session_id: str, message: Dict[str, Any]):
-        if session_id in self.sessions:
-            self.sessions[session_id].conversation_history.append(message)
-            self.sessions[session_id].last_active = datetime.now().isoformat()
+        session = self.get_session(session_id)
+        if session:
+            session.conversation_history.append(message)
+            session.last_active = datetime.now().isoformat()
     
     def save_workflow_state(self, session_id: str, state: Dict[str, Any]):
-        if session_id in self.sessions:
-            self.sessions[session_id].workflow_state = state
+        session = self.get_session(session_id)
+        if session:
+            session.workflow_state = state
     
     def get_workflow_state(self, session_id: str) -> Dict[str, Any]:
-        session = self.sessions.get(session_id)
+        session = self.get_session(session_id)
         return session.workflow_state if session else {}
\ No newline at end of file
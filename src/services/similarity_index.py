@@ -0,0 +1,358 @@
+import hashlib
+import json
+import math
+import os
+import re
+import tempfile
+import threading
+import zlib
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from ..models import MediaItem
+
+INDEX_VERSION = 2
+LANE_BITS = 32
+LANE_MASK = (1 << LANE_BITS) - 1
+
+STOPWORDS = frozenset("""
+a an and are as at be but by for from has have he her his in into is it its of on or she that the
+their them they this to was were will with who whom after before when where while which what about
+over under than then there these those been being also only more most such some very can one
+""".split())
+
+TOKEN_RE = re.compile(r"[a-z0-9']+")
+
+def normalize_title(title: str) -> str:
+    return " ".join(title.lower().split())
+
+def tokenize(text: str) -> List[str]:
+    return [token for token in TOKEN_RE.findall(text.lower()) if len(token) > 2 and token not in STOPWORDS]
+
+class HashingVectorizer:
+    def __init__(self, dim: int = 1 << 18):
+        self.dim = dim
+
+    def transform(self, item: MediaItem) -> Dict[int, float]:
+        counts: Dict[int, float] = {}
+        tokens = tokenize(item.overview or "")
+        features = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+        features += ["title:" + token for token in tokenize(item.title)]
+        features += ["genre:" + genre.lower() for genre in item.genres]
+        for feature in features:
+            bucket = zlib.crc32(feature.encode()) % self.dim
+            counts[bucket] = counts.get(bucket, 0.0) + 1.0
+        # Genres say more about "like this" than any single overview word
+        for genre in item.genres:
+            bucket = zlib.crc32(("genre:" + genre.lower()).encode()) % self.dim
+            counts[bucket] += 2.0
+        return {bucket: 1.0 + math.log(count) for bucket, count in counts.items()}
+
+class SimilarityIndex:
+    def __init__(self, path: Optional[str] = None, tables: int = 4, bits: int = 16, dim: int = 1 << 18,
+                 exact_below: int = 2000, max_items: int = 200000):
+        self.path = path
+        self.exact_below = exact_below
+        self.max_items = max_items
+        self.tables = tables
+        self.bits = bits
+        self.vectorizer = HashingVectorizer(dim)
+
+        # Oldest-seen first, so the cap evicts titles nobody has added in a long time
+        self.items: "OrderedDict[str, MediaItem]" = OrderedDict()
+        self.vectors: Dict[str, Dict[int, float]] = {}
+        self.signatures: Dict[str, Tuple[int, ...]] = {}
+        self.buckets: List[Dict[int, List[str]]] = [{} for _ in range(tables)]
+        self.doc_freq: Dict[int, int] = {}
+        self.titles: Dict[str, str] = {}
+        self.title_words: Dict[str, set] = {}
+        # Changes since the last save, appended to the log rather than rewriting the whole file
+        self.pending: List[Tuple[str, str]] = []
+        self.log_records = 0
+        # Only a file this index wrote or loaded cleanly is safe to append to
+        self._appendable = False
+        self.dirty = False
+        self._plane_lanes: Dict[int, int] = {}
+        self._lock = threading.RLock()
+        self._save_lock = threading.Lock()
+        self._autosaver: Optional[threading.Thread] = None
+
+        if path and os.path.exists(path):
+            self.load()
+
+    def on_library_event(self, event: str, session_id: str, item: MediaItem):
+        if event == "added":
+            self.add(item)
+
+    def add_many(self, items: List[MediaItem]) -> int:
+        return sum(1 for item in items if self.add(item))
+
+    def add(self, item: MediaItem) -> bool:
+        with self._lock:
+            if item.id in self.items:
+                self.items.move_to_end(item.id)
+                return False
+            # Index a detached copy so one user's status never leaks into another's results
+            catalog_item = MediaItem.from_dict(item.to_dict())
+            catalog_item.status = "planned"
+            catalog_item.progress_episodes = 0
+            catalog_item.progress_chapters = 0
+            self._insert(catalog_item, self.vectorizer.transform(catalog_item))
+            self.pending.append(("add", catalog_item.id))
+            while len(self.items) > self.max_items:
+                evicted = next(iter(self.items))
+                self._remove(evicted)
+                self.pending.append(("remove", evicted))
+            self.dirty = True
+            return True
+
+    def get(self, item_id: str) -> Optional[MediaItem]:
+        return self.items.get(item_id)
+
+    def find_by_title(self, title: str) -> Optional[MediaItem]:
+        wanted = normalize_title(title)
+        if not wanted:
+            return None
+        with self._lock:
+            exact = self.titles.get(wanted)
+            if exact is not None:
+                return self.items[exact]
+            # Partial matches only need checking among titles that share every word, starting from the rarest
+            words = sorted((self.title_words.get(word, set()) for word in set(TOKEN_RE.findall(wanted))), key=len)
+            if not words or not words[0]:
+                return None
+            matches = [self.items[item_id] for item_id in words[0].intersection(*words[1:])
+                       if wanted in normalize_title(self.items[item_id].title)]
+            # The shortest containing title is the closest to what was asked for
+            return min(matches, key=lambda item: (len(item.title), item.id), default=None)
+
+    def similar(self, item_id: str, limit: int = 5, media_type: Optional[str] = None) -> List[Tuple[MediaItem, float]]:
+        with self._lock:
+            vector = self.vectors.get(item_id)
+            if vector is None:
+                return []
+
+            if len(self.items) <= self.exact_below:
+                # Small catalogs are cheaper to scan exactly than to miss neighbours
+                candidates = set(self.items)
+            else:
+                candidates = self._candidates(self.signatures[item_id])
+            if len(candidates) <= limit:
+                candidates |= self._candidates(self.signatures[item_id], probe=True)
+            candidates.discard(item_id)
+
+            query = self._weighted(vector)
+            scored = []
+            for candidate in candidates:
+                if media_type and self.items[candidate].type != media_type:
+                    continue
+                score = self._cosine(query, self._weighted(self.vectors[candidate]))
+                if score > 0:
+                    scored.append((self.items[candidate], score))
+
+            scored.sort(key=lambda entry: entry[1], reverse=True)
+            return scored[:limit]
+
+    def save(self):
+        if not self.path:
+            return
+        with self._save_lock:
+            self._save()
+
+    def _save(self):
+        with self._lock:
+            if not self.dirty:
+                return
+            # Compact once evictions and re-adds have left the log mostly dead records
+            if not self._appendable or self.log_records + len(self.pending) > 2 * len(self.items) + 1000:
+                records = [self._record(item_id) for item_id in self.items]
+                rewrite = True
+            else:
+                records = [self._record(item_id) if op == "add" else {"remove": item_id}
+                           for op, item_id in self.pending if op == "remove" or item_id in self.items]
+                rewrite = False
+            pending, self.pending = self.pending, []
+            self.dirty = False
+
+        try:
+            if rewrite:
+                directory = os.path.dirname(os.path.abspath(self.path))
+                os.makedirs(directory, exist_ok=True)
+                fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+                try:
+                    with os.fdopen(fd, "w", encoding="utf-8") as f:
+                        f.write(json.dumps({"version": INDEX_VERSION, "dim": self.vectorizer.dim}) + "\n")
+                        self._write_records(f, records)
+                    os.replace(tmp_path, self.path)
+                finally:
+                    if os.path.exists(tmp_path):
+                        os.remove(tmp_path)
+            else:
+                with open(self.path, "a", encoding="utf-8") as f:
+                    self._write_records(f, records)
+            with self._lock:
+                self.log_records = len(records) if rewrite else self.log_records + len(records)
+                self._appendable = True
+        except Exception as e:
+            print(f"Similarity index save error: {e}")
+            with self._lock:
+                self.pending = pending + self.pending
+                self.dirty = True
+
+    def load(self):
+        entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        records = 0
+        torn = False
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                header = json.loads(f.readline() or "{}")
+                if header.get("version") != INDEX_VERSION or header.get("dim") != self.vectorizer.dim:
+                    print(f"Ignoring similarity index at {self.path}: incompatible format")
+                    return
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # A save cut short by a crash leaves a partial line; rewrite rather than append after it
+                        torn = True
+                        continue
+                    records += 1
+                    if "remove" in record:
+                        entries.pop(record["remove"], None)
+                    else:
+                        item_id = record["item"]["id"]
+                        entries.pop(item_id, None)
+                        entries[item_id] = record
+        except Exception as e:
+            print(f"Similarity index load error: {e}")
+            return
+
+        with self._lock:
+            for entry in list(entries.values())[-self.max_items:]:
+                item = MediaItem.from_dict(entry["item"])
+                if item.id not in self.items:
+                    self._insert(item, {int(bucket): weight for bucket, weight in entry["vector"]})
+            self.log_records = records
+            self._appendable = not torn
+
+    def start_autosave(self, interval: float = 60.0):
+        if self._autosaver or not self.path:
+            return
+        stop = threading.Event()
+
+        def loop():
+            while not stop.wait(interval):
+                self.save()
+
+        self._autosaver = threading.Thread(target=loop, name="similarity-index-autosave", daemon=True)
+        self._autosaver.start()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "items": len(self.items),
+                "log_records": self.log_records,
+                "vocabulary_buckets": len(self.doc_freq),
+                "lsh_buckets": sum(len(table) for table in self.buckets)
+            }
+
+    def _insert(self, item: MediaItem, vector: Dict[int, float]):
+        self.items[item.id] = item
+        self.vectors[item.id] = vector
+        for bucket in vector:
+            self.doc_freq[bucket] = self.doc_freq.get(bucket, 0) + 1
+
+        signature = self._signature(vector)
+        self.signatures[item.id] = signature
+        for table, key in zip(self.buckets, signature):
+            table.setdefault(key, []).append(item.id)
+
+        title = normalize_title(item.title)
+        self.titles.setdefault(title, item.id)
+        for word in set(TOKEN_RE.findall(title)):
+            self.title_words.setdefault(word, set()).add(item.id)
+
+    def _remove(self, item_id: str):
+        item = self.items.pop(item_id)
+        for bucket in self.vectors.pop(item_id):
+            count = self.doc_freq[bucket] - 1
+            if count:
+                self.doc_freq[bucket] = count
+            else:
+                del self.doc_freq[bucket]
+
+        for table, key in zip(self.buckets, self.signatures.pop(item_id)):
+            members = table[key]
+            members.remove(item_id)
+            if not members:
+                del table[key]
+
+        title = normalize_title(item.title)
+        if self.titles.get(title) == item_id:
+            del self.titles[title]
+        for word in set(TOKEN_RE.findall(title)):
+            ids = self.title_words[word]
+            ids.discard(item_id)
+            if not ids:
+                del self.title_words[word]
+
+    def _record(self, item_id: str) -> Dict[str, Any]:
+        return {"item": self.items[item_id].to_dict(), "vector": list(self.vectors[item_id].items())}
+
+    def _write_records(self, f, records: List[Dict[str, Any]]):
+        for record in records:
+            f.write(json.dumps(record, separators=(",", ":")) + "\n")
+
+    def _signature(self, vector: Dict[int, float]) -> Tuple[int, ...]:
+        # Random hyperplanes derived from a hash of each bucket. Every plane gets a LANE_BITS-wide
+        # counter inside one big int, so a bucket updates all planes with a single addition.
+        planes = self.tables * self.bits
+        acc = 0
+        total = 0
+        for bucket, weight in vector.items():
+            lanes = self._plane_lanes.get(bucket)
+            if lanes is None:
+                digest = hashlib.blake2b(bucket.to_bytes(4, "little"), digest_size=(planes + 7) // 8).digest()
+                plane_bits = int.from_bytes(digest, "little")
+                lanes = sum(1 << (LANE_BITS * plane) for plane in range(planes) if plane_bits >> plane & 1)
+                self._plane_lanes[bucket] = lanes
+            quantized = max(1, round(weight * 16))
+            acc += quantized * lanes
+            total += quantized
+
+        signature = []
+        for table in range(self.tables):
+            key = 0
+            for bit in range(self.bits):
+                positive = acc >> (LANE_BITS * (table * self.bits + bit)) & LANE_MASK
+                if 2 * positive > total:
+                    key |= 1 << bit
+            signature.append(key)
+        return tuple(signature)
+
+    def _candidates(self, signature: Tuple[int, ...], probe: bool = False) -> set:
+        candidates = set()
+        for table, key in zip(self.buckets, signature):
+            if probe:
+                # Multi-probe: neighbouring buckets one bit flip away
+                for bit in range(self.bits):
+                    candidates.update(table.get(key ^ (1 << bit), ()))
+            else:
+                candidates.update(table.get(key, ()))
+        return candidates
+
+    def _weighted(self, vector: Dict[int, float]) -> Dict[int, float]:
+        total = len(self.items) + 1
+        return {
+            bucket: weight * (math.log(total / (1 + self.doc_freq.get(bucket, 0))) + 1.0)
+            for bucket, weight in vector.items()
+        }
+
+    def _cosine(self, a: Dict[int, float], b: Dict[int, float]) -> float:
+        if len(a) > len(b):
+            a, b = b, a
+        dot = sum(weight * b[bucket] for bucket, weight in a.items() if bucket in b)
+        if not dot:
+            return 0.0
+        norm = math.sqrt(sum(w * w for w in a.values())) * math.sqrt(sum(w * w for w in b.values()))
+        return dot / norm if norm else 0.0
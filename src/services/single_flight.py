@@ -0,0 +1,101 @@
+import asyncio
+import threading
+from concurrent.futures import Executor, Future
+from typing import Any, Callable, Dict, Hashable, Optional
+
+class SingleFlight:
+    def __init__(self, name: str):
+        self.name = name
+        self.calls = 0
+        self.executions = 0
+        self.coalesced = 0
+        self._in_flight: Dict[Hashable, Future] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: Hashable, fn: Callable[[], Any], timeout: Optional[float] = None,
+           executor: Optional[Executor] = None) -> Any:
+        future, leader = self._join(key)
+        if leader:
+            if executor:
+                # The leader then waits on its own timeout like everyone else
+                executor.submit(self._run, key, future, fn)
+            else:
+                self._run(key, future, fn)
+        # Followers stop waiting at their own timeout; the shared call keeps going for the others
+        return future.result(timeout=timeout)
+
+    async def do_async(self, key: Hashable, fn: Callable[[], Any], timeout: Optional[float] = None) -> Any:
+        future, leader = self._join(key)
+        if leader:
+            loop = asyncio.get_running_loop()
+            if asyncio.iscoroutinefunction(fn):
+                loop.create_task(self._run_async(key, future, fn))
+            else:
+                loop.run_in_executor(None, self._run, key, future, fn)
+        # Shield so one caller's cancellation does not cancel the result everyone shares
+        return await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)), timeout)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "executions": self.executions,
+                "coalesced": self.coalesced,
+                "coalescing_ratio": round(self.coalesced / self.calls, 3) if self.calls else 0.0,
+                "in_flight": len(self._in_flight)
+            }
+
+    def _join(self, key: Hashable):
+        with self._lock:
+            self.calls += 1
+            future = self._in_flight.get(key)
+            if future is not None:
+                self.coalesced += 1
+                return future, False
+            future = Future()
+            self._in_flight[key] = future
+            self.executions += 1
+            return future, True
+
+    def _run(self, key: Hashable, future: Future, fn: Callable[[], Any]):
+        try:
+            result = fn()
+        except BaseException as e:
+            self._finish(key)
+            future.set_exception(e)
+        else:
+            self._finish(key)
+            future.set_result(result)
+
+    async def _run_async(self, key: Hashable, future: Future, fn: Callable[[], Any]):
+        try:
+            result = await fn()
+        except BaseException as e:
+            self._finish(key)
+            future.set_exception(e)
+        else:
+            self._finish(key)
+            future.set_result(result)
+
+    def _finish(self, key: Hashable):
+        # Leave before publishing, so callers arriving after the result start a fresh call
+        with self._lock:
+            self._in_flight.pop(key, None)
+
+class FlightRegistry:
+    def __init__(self):
+        self.groups: Dict[str, SingleFlight] = {}
+        self._lock = threading.Lock()
+
+    def get(self, name: str) -> SingleFlight:
+        with self._lock:
+            if name not in self.groups:
+                self.groups[name] = SingleFlight(name)
+            return self.groups[name]
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            groups = list(self.groups.items())
+        return {name: group.snapshot() for name, group in groups}
+
+flights = FlightRegistry()
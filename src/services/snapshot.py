@@ -0,0 +1,243 @@
+import json
+import mmap
+from array import array
+import os
+import struct
+import sys
+import tempfile
+import threading
+import time
+import zlib
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from ..models import MediaItem, encode_json
+from .session_service import Session, SessionService
+
+MAGIC = b"MRASNAP\x00"
+FORMAT_VERSION = 2
+# magic, format version, byte order (0 little, 1 big), array item size, section count, TOC offset
+HEADER = struct.Struct("<8sHBBIQ")
+# Width of the "q" array columns sections store; version 1 files left the byte zero
+ITEM_SIZE = array("q").itemsize
+# schema version, codec, offset, length, crc32; preceded by a length-prefixed UTF-8 name
+TOC_ENTRY = struct.Struct("<HBQQI")
+NAME_LENGTH = struct.Struct("<H")
+CODEC_ZLIB_JSON = 1
+
+SESSION_PREFIX = "session:"
+SESSION_SCHEMA = 1
+CACHE_SCHEMA = 1
+
+class SnapshotReader:
+    def __init__(self, path: str):
+        self.path = path
+        self.toc: Dict[str, Tuple[int, int, int, int, int]] = {}
+        self._file = open(path, "rb")
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            self._read_toc()
+        except Exception:
+            self.close()
+            raise
+
+    @classmethod
+    def open(cls, path: str) -> Optional["SnapshotReader"]:
+        if not os.path.exists(path):
+            return None
+        try:
+            return cls(path)
+        except Exception as e:
+            print(f"Ignoring snapshot at {path}: {e}")
+            return None
+
+    def _read_toc(self):
+        magic, version, byte_order, item_size, count, offset = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            raise ValueError("not a snapshot file")
+        if version not in (1, FORMAT_VERSION):
+            raise ValueError(f"unsupported snapshot format {version}")
+        # Array columns are stored in native byte order and width
+        if byte_order != (sys.byteorder == "big"):
+            raise ValueError("snapshot written on a machine with a different byte order")
+        if version >= 2 and item_size != ITEM_SIZE:
+            raise ValueError(f"snapshot written with {item_size}-byte array items, expected {ITEM_SIZE}")
+
+        for _ in range(count):
+            (name_length,) = NAME_LENGTH.unpack_from(self._map, offset)
+            offset += NAME_LENGTH.size
+            name = bytes(self._map[offset:offset + name_length]).decode("utf-8")
+            offset += name_length
+            self.toc[name] = TOC_ENTRY.unpack_from(self._map, offset)
+            offset += TOC_ENTRY.size
+
+    def names(self, prefix: str = "") -> List[str]:
+        return [name for name in self.toc if name.startswith(prefix)]
+
+    def raw(self, name: str) -> Optional[Tuple[int, int, bytes, int]]:
+        entry = self.toc.get(name)
+        if entry is None:
+            return None
+        schema, codec, offset, length, crc = entry
+        return schema, codec, self._map[offset:offset + length], crc
+
+    def load(self, name: str, schema: int) -> Optional[Any]:
+        entry = self.raw(name)
+        if entry is None:
+            return None
+        found_schema, codec, payload, crc = entry
+        if found_schema != schema or codec != CODEC_ZLIB_JSON:
+            print(f"Skipping snapshot section {name}: schema {found_schema}, expected {schema}")
+            return None
+        if zlib.crc32(payload) != crc:
+            print(f"Skipping snapshot section {name}: checksum mismatch")
+            return None
+        try:
+            return json.loads(zlib.decompress(payload))
+        except (zlib.error, ValueError) as e:
+            print(f"Skipping snapshot section {name}: {e}")
+            return None
+
+    def close(self):
+        if getattr(self, "_map", None) is not None:
+            self._map.close()
+        self._file.close()
+
+def write_snapshot(path: str, sections: List[Tuple[str, int, int, bytes]]):
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(b"\x00" * HEADER.size)
+            toc = []
+            for name, schema, codec, payload in sections:
+                toc.append((name, schema, codec, f.tell(), len(payload), zlib.crc32(payload)))
+                f.write(payload)
+
+            toc_offset = f.tell()
+            for name, schema, codec, offset, length, crc in toc:
+                encoded = name.encode("utf-8")
+                f.write(NAME_LENGTH.pack(len(encoded)) + encoded)
+                f.write(TOC_ENTRY.pack(schema, codec, offset, length, crc))
+
+            f.seek(0)
+            f.write(HEADER.pack(MAGIC, FORMAT_VERSION, sys.byteorder == "big", ITEM_SIZE, len(toc), toc_offset))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except Exception:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+def encode_section(data: Any) -> bytes:
+    return zlib.compress(encode_json(data).encode("utf-8"), 6)
+
+def encode_page(value: Tuple[List[MediaItem], bool]) -> Any:
+    items, has_next = value
+    return [[item.to_dict() for item in items], has_next]
+
+def decode_page(value: Any) -> Tuple[List[MediaItem], bool]:
+    items, has_next = value
+    return [MediaItem.from_dict(item) for item in items], has_next
+
+class SnapshotManager:
+    def __init__(self, path: str, session_service: SessionService):
+        self.path = path
+        self.session_service = session_service
+        # name -> (schema version, export)
+        self.sections: Dict[str, Tuple[int, Callable[[], Any]]] = {}
+        self.reader = SnapshotReader.open(path)
+        self.stats = {"saves": 0, "save_errors": 0, "last_save_seconds": 0.0, "last_save_bytes": 0,
+                      "sessions_restored": 0, "sections_restored": 0}
+        self._lock = threading.Lock()
+        self._saver: Optional[threading.Thread] = None
+
+        if self.reader:
+            # Sessions stay in the mapped file until someone asks for them
+            session_service.loader = self._load_session
+
+    def register(self, name: str, schema: int, export: Callable[[], Any],
+                 restore: Callable[[Any], None], lazy: bool = False):
+        self.sections[name] = (schema, export)
+        if not self.reader or name not in self.reader.toc:
+            return
+        if lazy:
+            restore(lambda: self.reader.load(name, schema))
+            return
+        data = self.reader.load(name, schema)
+        if data is not None:
+            restore(data)
+            self.stats["sections_restored"] += 1
+
+    def register_cache(self, name: str, cache: Any, encode: Callable[[Any], Any] = None,
+                       decode: Callable[[Any], Any] = None):
+        self.register(
+            f"cache:{name}", CACHE_SCHEMA,
+            lambda: cache.export_entries(encode),
+            lambda load: cache.restore_later(load, decode),
+            lazy=True
+        )
+
+    def save(self):
+        with self._lock:
+            start = time.perf_counter()
+            try:
+                sections = []
+                for name, (schema, export) in list(self.sections.items()):
+                    sections.append((name, schema, CODEC_ZLIB_JSON, encode_section(export())))
+
+                live = dict(self.session_service.sessions)
+                for session_id, session in live.items():
+                    sections.append((SESSION_PREFIX + session_id, SESSION_SCHEMA, CODEC_ZLIB_JSON,
+                                     encode_section(self._export_session(session))))
+                if self.reader:
+                    # Sessions nobody touched since the last restart are copied over without decoding
+                    for name in self.reader.names(SESSION_PREFIX):
+                        schema, codec, payload, _ = self.reader.raw(name)
+                        if name[len(SESSION_PREFIX):] not in live and schema == SESSION_SCHEMA:
+                            sections.append((name, schema, codec, bytes(payload)))
+
+                write_snapshot(self.path, sections)
+            except Exception as e:
+                self.stats["save_errors"] += 1
+                print(f"Snapshot save error: {e}")
+                return
+            self.stats["saves"] += 1
+            self.stats["last_save_seconds"] = round(time.perf_counter() - start, 3)
+            self.stats["last_save_bytes"] = sum(len(section[3]) for section in sections)
+
+    def start_periodic(self, interval: float):
+        if self._saver or interval <= 0:
+            return
+        stop = threading.Event()
+
+        def loop():
+            while not stop.wait(interval):
+                self.save()
+
+        self._saver = threading.Thread(target=loop, name="state-snapshots", daemon=True)
+        self._saver.start()
+
+    def snapshot(self) -> Dict[str, Any]:
+        return dict(self.stats, path=self.path,
+                    sessions_in_file=len(self.reader.names(SESSION_PREFIX)) if self.reader else 0)
+
+    def _export_session(self, session: Session) -> Dict[str, Any]:
+        return {
+            "session_id": session.session_id,
+            "user_id": session.user_id,
+            "created_at": session.created_at,
+            "last_active": session.last_active,
+            "conversation_history": list(session.conversation_history),
+            "workflow_state": dict(session.workflow_state)
+        }
+
+    def _load_session(self, session_id: str) -> Optional[Session]:
+        data = self.reader.load(SESSION_PREFIX + session_id, SESSION_SCHEMA)
+        if data is None:
+            return None
+        self.stats["sessions_restored"] += 1
+        return Session(**data)
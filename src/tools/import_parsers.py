@@ -0,0 +1,240 @@
+import csv
+import io
+import json
+import xml.etree.ElementTree as ET
+from dataclasses import dataclass
+from typing import Any, BinaryIO, Dict, Iterator, Optional
+
+ANILIST_STATUSES = {
+    "CURRENT": "watching",
+    "REPEATING": "watching",
+    "COMPLETED": "completed",
+    "PLANNING": "planned",
+    "DROPPED": "dropped",
+    "PAUSED": "on_hold",
+}
+
+MAL_STATUSES = {
+    "watching": "watching",
+    "reading": "reading",
+    "completed": "completed",
+    "on-hold": "on_hold",
+    "on hold": "on_hold",
+    "dropped": "dropped",
+    "plan to watch": "planned",
+    "plan to read": "planned",
+    "1": "watching",
+    "2": "completed",
+    "3": "on_hold",
+    "4": "dropped",
+    "6": "planned",
+}
+
+VALID_STATUSES = {"watching", "reading", "completed", "dropped", "planned", "on_hold"}
+VALID_TYPES = {"anime", "movie", "tv", "manga"}
+
+@dataclass
+class ImportEntry:
+    title: str
+    media_type: str
+    status: Optional[str] = None
+    progress: Optional[int] = None
+
+def detect_format(stream: BinaryIO) -> str:
+    head = stream.peek(512).lstrip(b"\xef\xbb\xbf \t\r\n")
+    if head.startswith(b"<"):
+        return "xml"
+    if head.startswith(b"{"):
+        first_line = head.split(b"\n", 1)[0]
+        try:
+            json.loads(first_line)
+            return "jsonl"
+        except ValueError:
+            return "json"
+    if head.startswith(b"["):
+        return "json"
+    return "csv"
+
+def parse_export(stream: BinaryIO, fmt: Optional[str] = None,
+                 default_type: str = "anime") -> Iterator[ImportEntry]:
+    if not hasattr(stream, "peek"):
+        stream = io.BufferedReader(stream)
+    fmt = (fmt or detect_format(stream)).lower()
+
+    if fmt == "xml":
+        yield from _parse_mal_xml(stream, default_type)
+        return
+
+    text = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+    if fmt in ["jsonl", "ndjson"]:
+        for line in text:
+            if line.strip():
+                yield from _entries_from_json(json.loads(line), default_type)
+    elif fmt == "json":
+        for obj in iter_json_array(text):
+            yield from _entries_from_json(obj, default_type)
+    elif fmt == "csv":
+        yield from _parse_csv(text, default_type)
+    else:
+        raise ValueError(f"Unsupported import format: {fmt}")
+
+def iter_json_array(stream, chunk_size: int = 65536) -> Iterator[Any]:
+    # Yields the elements of the first JSON array in the stream one by one,
+    # so only a single element is ever held in memory.
+    decoder = json.JSONDecoder()
+    buffer = ""
+    pos = 0
+    eof = False
+
+    def fill():
+        nonlocal buffer, pos, eof
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            eof = True
+        buffer = buffer[pos:] + chunk
+        pos = 0
+
+    while True:
+        idx = buffer.find("[", pos)
+        if idx >= 0:
+            pos = idx + 1
+            break
+        if eof:
+            return
+        pos = len(buffer)
+        fill()
+
+    while True:
+        while pos < len(buffer) and buffer[pos] in " \t\r\n,":
+            pos += 1
+        if pos >= len(buffer):
+            if eof:
+                return
+            fill()
+            continue
+        if buffer[pos] == "]":
+            return
+        try:
+            value, end = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            fill()
+            continue
+        if end == len(buffer) and not eof:
+            fill()
+            continue
+        pos = end
+        yield value
+
+def _entries_from_json(obj: Any, default_type: str) -> Iterator[ImportEntry]:
+    if not isinstance(obj, dict):
+        return
+
+    # AniList collections nest entries inside list groups
+    for key in ["data", "MediaListCollection"]:
+        if isinstance(obj.get(key), dict):
+            yield from _entries_from_json(obj[key], default_type)
+            return
+    for key in ["lists", "entries"]:
+        if isinstance(obj.get(key), list):
+            for entry in obj[key]:
+                yield from _entries_from_json(entry, default_type)
+            return
+
+    media = obj.get("media") if isinstance(obj.get("media"), dict) else {}
+    title = media.get("title") or obj.get("title") or obj.get("name")
+    if isinstance(title, dict):
+        title = title.get("english") or title.get("romaji") or title.get("userPreferred")
+    if not title:
+        return
+
+    media_type = _normalize_type(media.get("type") or obj.get("type") or obj.get("media_type"), default_type)
+    raw_status = obj.get("status")
+    status = ANILIST_STATUSES.get(raw_status) if raw_status in ANILIST_STATUSES else _normalize_status(raw_status)
+    progress = obj.get("progress")
+    if progress is None:
+        progress = obj.get("progress_chapters") if media_type == "manga" else obj.get("progress_episodes")
+
+    yield ImportEntry(
+        title=str(title),
+        media_type=media_type,
+        status=_status_for_type(status, media_type),
+        progress=_to_int(progress)
+    )
+
+def _parse_mal_xml(stream: BinaryIO, default_type: str) -> Iterator[ImportEntry]:
+    root = None
+    for event, elem in ET.iterparse(stream, events=("start", "end")):
+        if event == "start":
+            if root is None:
+                root = elem
+            continue
+
+        if elem.tag not in ["anime", "manga"]:
+            continue
+
+        media_type = elem.tag
+        title = elem.findtext("series_title") or elem.findtext("manga_title")
+        status = _normalize_status(elem.findtext("my_status"))
+        progress = elem.findtext("my_read_chapters") if media_type == "manga" else elem.findtext("my_watched_episodes")
+
+        if title:
+            yield ImportEntry(
+                title=title.strip(),
+                media_type=media_type,
+                status=_status_for_type(status, media_type),
+                progress=_to_int(progress)
+            )
+
+        # Drop parsed entries so the tree never grows with the file
+        elem.clear()
+        if root is not None:
+            root.clear()
+
+def _parse_csv(stream, default_type: str) -> Iterator[ImportEntry]:
+    reader = csv.DictReader(stream)
+    for row in reader:
+        row = {(k or "").strip().lower(): (v or "").strip() for k, v in row.items()}
+        title = row.get("title") or row.get("name") or row.get("series_title")
+        if not title:
+            continue
+
+        media_type = _normalize_type(row.get("type") or row.get("media_type"), default_type)
+        status = _normalize_status(row.get("status") or row.get("my_status"))
+        progress = row.get("progress") or row.get("episodes") or row.get("chapters")
+
+        yield ImportEntry(
+            title=title,
+            media_type=media_type,
+            status=_status_for_type(status, media_type),
+            progress=_to_int(progress)
+        )
+
+def _normalize_type(value: Any, default_type: str) -> str:
+    value = str(value or "").strip().lower()
+    if value in ["tv show", "series", "tv_show"]:
+        value = "tv"
+    return value if value in VALID_TYPES else default_type
+
+def _normalize_status(value: Any) -> Optional[str]:
+    if not value:
+        return None
+    value = str(value).strip().lower()
+    if value in MAL_STATUSES:
+        return MAL_STATUSES[value]
+    value = value.replace(" ", "_").replace("-", "_")
+    return value if value in VALID_STATUSES else None
+
+def _status_for_type(status: Optional[str], media_type: str) -> Optional[str]:
+    if status == "watching" and media_type == "manga":
+        return "reading"
+    if status == "reading" and media_type != "manga":
+        return "watching"
+    return status
+
+def _to_int(value: Any) -> Optional[int]:
+    try:
+        return int(value) if value not in [None, ""] else None
+    except (TypeError, ValueError):
+        return None
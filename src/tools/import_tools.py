@@ -0,0 +1,148 @@
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, BinaryIO, Callable, Dict, List, Optional, Tuple
+
+from ..models import MediaItem
+from ..services.deadline import Deadline
+from ..services.memory_service import MemoryService
+from ..services.observability import observability
+from .import_parsers import ImportEntry, parse_export
+from .search_tools import SearchTools
+
+# A lookup that never got a complete answer (rate limited, timed out, upstream down), as opposed to no match
+UNAVAILABLE = object()
+
+class ImportTools:
+    def __init__(self, search_tools: SearchTools, memory_service: MemoryService,
+                 max_workers: int = 8, batch_size: int = 50, cache_size: int = 10000,
+                 resolve_timeout: float = 30.0, max_attempts: int = 3, report_titles: int = 100):
+        self.search_tools = search_tools
+        self.memory = memory_service
+        self.max_workers = max_workers
+        self.batch_size = batch_size
+        self.cache_size = cache_size
+        self.resolve_timeout = resolve_timeout
+        self.max_attempts = max_attempts
+        self.report_titles = report_titles
+        self._resolved: "OrderedDict[Tuple[str, str], Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def import_library(self, session_id: str, stream: BinaryIO, fmt: Optional[str] = None,
+                       default_type: str = "anime",
+                       progress_callback: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+        report = {
+            "session_id": session_id,
+            "processed": 0,
+            "resolved": 0,
+            "added": 0,
+            "duplicates": 0,
+            "cache_hits": 0,
+            "unresolved": [],
+            "unresolved_count": 0,
+            # Titles that could not be looked up; importing the file again retries them
+            "failed": [],
+            "failed_count": 0,
+            "elapsed_seconds": 0.0
+        }
+        start = time.perf_counter()
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            batch: List[ImportEntry] = []
+            for entry in parse_export(stream, fmt, default_type):
+                batch.append(entry)
+                if len(batch) >= self.batch_size:
+                    self._import_batch(session_id, batch, executor, report)
+                    report["elapsed_seconds"] = round(time.perf_counter() - start, 3)
+                    if progress_callback:
+                        progress_callback(report)
+                    batch = []
+
+            if batch:
+                self._import_batch(session_id, batch, executor, report)
+
+        report["elapsed_seconds"] = round(time.perf_counter() - start, 3)
+        if progress_callback:
+            progress_callback(report)
+        return report
+
+    def _import_batch(self, session_id: str, entries: List[ImportEntry],
+                      executor: ThreadPoolExecutor, report: Dict[str, Any]):
+        resolved = {}
+        pending = {}
+        with self._lock:
+            for entry in entries:
+                key = self._cache_key(entry)
+                if key in self._resolved:
+                    report["cache_hits"] += 1
+                    resolved[key] = self._resolved[key]
+                    self._resolved.move_to_end(key)
+                elif key not in pending:
+                    pending[key] = entry
+
+        futures = {executor.submit(self._resolve, entry): key for key, entry in pending.items()}
+        for future in as_completed(futures):
+            key = futures[future]
+            resolved[key] = future.result()
+            if resolved[key] and resolved[key] is not UNAVAILABLE:
+                self._remember(key, resolved[key])
+
+        items = []
+        for entry in entries:
+            report["processed"] += 1
+            data = resolved.get(self._cache_key(entry))
+            if data is UNAVAILABLE:
+                self._note(report, "failed", entry.title)
+                continue
+            if not data:
+                self._note(report, "unresolved", entry.title)
+                continue
+
+            report["resolved"] += 1
+            item = MediaItem.from_dict(dict(data))
+            if entry.status:
+                item.status = entry.status
+            if entry.progress is not None:
+                if item.type == "manga":
+                    item.progress_chapters = entry.progress
+                else:
+                    item.progress_episodes = entry.progress
+            items.append(item)
+
+        added = self.memory.add_media_items(session_id, items)
+        report["added"] += added
+        report["duplicates"] += len(items) - added
+
+    def _resolve(self, entry: ImportEntry) -> Any:
+        for _ in range(self.max_attempts):
+            # Waits for upstream quota rather than being refused, so a large import paces itself
+            deadline = Deadline(self.resolve_timeout)
+            try:
+                results = self.search_tools.search_media(entry.title, entry.media_type, 1, deadline,
+                                                         max_wait=self.resolve_timeout)
+            except Exception as e:
+                observability.logger.warning(f"Import resolution error for '{entry.title}': {e}")
+                continue
+            if results:
+                return results[0]
+            if not deadline.partial:
+                return None
+            observability.logger.info(f"Import lookup for '{entry.title}' degraded: {', '.join(deadline.reasons)}")
+        return UNAVAILABLE
+
+    def _note(self, report: Dict[str, Any], outcome: str, title: str):
+        report[f"{outcome}_count"] += 1
+        if len(report[outcome]) < self.report_titles:
+            report[outcome].append(title)
+
+    def _remember(self, key: Tuple[str, str], data: Dict[str, Any]):
+        with self._lock:
+            self._resolved[key] = data
+            self._resolved.move_to_end(key)
+            while len(self._resolved) > self.cache_size:
+                self._resolved.popitem(last=False)
+
+    def _cache_key(self, entry: ImportEntry) -> Tuple[str, str]:
+        return (entry.media_type, re.sub(r"\s+", " ", entry.title.lower()).strip())
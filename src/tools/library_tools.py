@@ -1,6 +1,14 @@
-from typing import List, Dict, Any, Optional
-from ..models import MediaItem
+from typing import List, Dict, Any, Callable, Optional, Iterator, Tuple
+from datetime import datetime
+import base64
+import heapq
+import json
+from ..models import MediaItem, MEDIA_ITEM_FIELDS
 from ..services.memory_service import MemoryService
+from ..services.poster_cache import get_poster_cache, with_poster_proxy_url
+
+DERIVED_FIELDS = ["poster_proxy_url"]
+SORT_DEFAULTS = {"added": 0, "added_date": 0.0, "title": "", "score": 0.0, "year": 0}
 
 class LibraryTools:
     def __init__(self, memory_service: MemoryService):
@@ -21,7 +29,157 @@ class LibraryTools:
     def list_library(self, session_id: str, media_type: Optional[str] = None, 
                     status: Optional[str] = None) -> List[Dict[str, Any]]:
         items = self.memory.get_library(session_id, media_type, status)
-        return [item.to_dict() for item in items]
+        return [with_poster_proxy_url(item.to_dict()) for item in items]
+    
+    def query_library(self, session_id: str, media_type: Optional[str] = None,
+                      status: Optional[str] = None, genre: Optional[str] = None,
+                      min_score: Optional[float] = None, max_score: Optional[float] = None,
+                      sort: str = "added", order: str = "asc", cursor: Optional[str] = None,
+                      limit: int = 50, fields: Optional[List[str]] = None) -> Dict[str, Any]:
+        self._validate_query(sort, order, fields)
+        after = self._decode_cursor(cursor, sort, order) if cursor else None
+        
+        if sort == "added":
+            # Library order is insertion order, so a page resumes the scan at the cursor position
+            start = after[1] + (1 if order == "asc" else -1) if after is not None else None
+            matches = self._iter_matches(session_id, media_type, status, genre, min_score, max_score,
+                                         sort, order, start)
+            page = []
+            for match in matches:
+                page.append(match)
+                if len(page) > limit:
+                    break
+        else:
+            matches = self._iter_matches(session_id, media_type, status, genre, min_score, max_score,
+                                         sort, order)
+            if after is not None:
+                matches = (m for m in matches if self._is_after(m[0], after, order))
+            select = heapq.nsmallest if order == "asc" else heapq.nlargest
+            page = select(limit + 1, matches, key=lambda m: m[0])
+        
+        has_more = len(page) > limit
+        page = page[:limit]
+        next_cursor = self._encode_cursor(sort, order, page[-1][0]) if has_more else None
+        
+        return {
+            "items": [self._project(item, fields) for _, item in page],
+            "next_cursor": next_cursor
+        }
+    
+    def iter_library(self, session_id: str, media_type: Optional[str] = None,
+                     status: Optional[str] = None, genre: Optional[str] = None,
+                     min_score: Optional[float] = None, max_score: Optional[float] = None,
+                     sort: str = "added", order: str = "asc",
+                     fields: Optional[List[str]] = None) -> Iterator[Dict[str, Any]]:
+        self._validate_query(sort, order, fields)
+        matches = self._iter_matches(session_id, media_type, status, genre, min_score, max_score, sort, order)
+        if sort != "added":
+            matches = sorted(matches, key=lambda m: m[0], reverse=(order == "desc"))
+        for _, item in matches:
+            yield self._project(item, fields)
+    
+    def _iter_matches(self, session_id: str, media_type: Optional[str], status: Optional[str],
+                      genre: Optional[str], min_score: Optional[float], max_score: Optional[float],
+                      sort: str, order: str, start: Optional[int] = None) -> Iterator[Tuple[Tuple, MediaItem]]:
+        items = self.memory.get_library(session_id)
+        if sort == "added" and order == "desc":
+            # A cursor from before items were removed can point past the end
+            positions = range(len(items) - 1 if start is None else min(start, len(items) - 1), -1, -1)
+        else:
+            positions = range(start or 0, len(items))
+        genre = genre.lower() if genre else None
+        
+        for position in positions:
+            item = items[position]
+            if media_type and item.type != media_type:
+                continue
+            if status and item.status != status:
+                continue
+            if genre and not any(g.lower() == genre for g in item.genres):
+                continue
+            if min_score is not None and (item.score is None or item.score < min_score):
+                continue
+            if max_score is not None and (item.score is None or item.score > max_score):
+                continue
+            yield self._sort_key(item, position, sort, order), item
+    
+    def _sort_key(self, item: MediaItem, position: int, sort: str, order: str) -> Tuple:
+        if sort == "added":
+            return (False, position, item.id)
+        value = getattr(item, sort)
+        if isinstance(value, str) and sort == "title":
+            value = value.lower()
+        # Missing values sort last in both directions
+        missing = value is None if order == "asc" else value is not None
+        return (missing, SORT_DEFAULTS[sort] if value is None else value, item.id)
+    
+    def _is_after(self, key: Tuple, after: Tuple, order: str) -> bool:
+        return key > after if order == "asc" else key < after
+    
+    def _project(self, item: MediaItem, fields: Optional[List[str]]) -> Dict[str, Any]:
+        if not fields:
+            return with_poster_proxy_url(item.to_dict())
+        row = {name: getattr(item, name) for name in fields if name not in DERIVED_FIELDS}
+        if "added_date" in row:
+            row["added_date"] = datetime.fromtimestamp(item.added_date).isoformat()
+        if "poster_proxy_url" in fields:
+            row["poster_proxy_url"] = get_poster_cache().proxy_url(item.poster_url)
+        return row
+    
+    def _validate_query(self, sort: str, order: str, fields: Optional[List[str]]):
+        if sort not in SORT_DEFAULTS:
+            raise ValueError(f"Unsupported sort field: {sort}")
+        if order not in ["asc", "desc"]:
+            raise ValueError(f"Unsupported sort order: {order}")
+        unknown = [name for name in fields or [] if name not in MEDIA_ITEM_FIELDS and name not in DERIVED_FIELDS]
+        if unknown:
+            raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    
+    def _encode_cursor(self, sort: str, order: str, key: Tuple) -> str:
+        payload = json.dumps([sort, order, list(key)], separators=(",", ":"))
+        return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+    
+    def _decode_cursor(self, cursor: str, sort: str, order: str) -> Tuple:
+        try:
+            padded = cursor + "=" * (-len(cursor) % 4)
+            cursor_sort, cursor_order, key = json.loads(base64.urlsafe_b64decode(padded))
+        except (ValueError, TypeError):
+            raise ValueError("Invalid cursor")
+        if cursor_sort != sort or cursor_order != order:
+            raise ValueError("Cursor does not match the requested sort")
+        if not self._valid_cursor_key(key, sort):
+            raise ValueError("Invalid cursor")
+        return tuple(key)
+    
+    def _valid_cursor_key(self, key: Any, sort: str) -> bool:
+        # Same shape as _sort_key: (missing, value, item id)
+        if not isinstance(key, list) or len(key) != 3:
+            return False
+        missing, value, item_id = key
+        if not isinstance(missing, bool) or not isinstance(item_id, str):
+            return False
+        if sort == "added":
+            return not missing and type(value) is int and value >= 0
+        if sort == "title":
+            return isinstance(value, str)
+        return isinstance(value, (int, float)) and not isinstance(value, bool)
+    
+    def get_tool_handlers(self) -> Dict[str, Callable[..., Any]]:
+        # Function-call arguments arrive as JSON numbers, so counts may be floats
+        def count(args: Dict[str, Any], key: str) -> Optional[int]:
+            return int(args[key]) if args.get(key) is not None else None
+        
+        return {
+            "add_to_library": lambda session_id, args, deadline=None: self.add_to_library(
+                session_id, args["media_item"]
+            ),
+            "update_progress": lambda session_id, args, deadline=None: self.update_progress(
+                session_id, args["item_id"], count(args, "episodes"), count(args, "chapters"), args.get("status")
+            ),
+            "list_library": lambda session_id, args, deadline=None: self.list_library(
+                session_id, args.get("media_type"), args.get("status")
+            )
+        }
     
     def get_tool_definitions(self) -> List[Dict[str, Any]]:
         return [
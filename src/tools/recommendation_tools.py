@@ -1,15 +1,26 @@
-from typing import List, Dict, Any, Optional
+from typing import Any, Callable, Dict, List, Optional
+from ..config import config
+from ..services.collaborative_filtering import ItemSimilarityModel
 from ..services.memory_service import MemoryService
 from ..models import MediaItem
 
 class RecommendationTools:
     def __init__(self, memory_service: MemoryService):
         self.memory = memory_service
+        self.similarity = ItemSimilarityModel(
+            top_k=config.CF_TOP_K,
+            max_user_items=config.CF_MAX_USER_ITEMS,
+            max_row_entries=config.CF_MAX_ROW_ENTRIES,
+            max_users=config.CF_MAX_USERS
+        )
+        self.similarity.rebuild(memory_service.libraries)
+        memory_service.subscribe(self.similarity.on_library_event)
     
     def get_recommendations(self, session_id: str, media_type: Optional[str] = None, 
                           count: int = 5) -> List[Dict[str, Any]]:
         library = self.memory.get_library(session_id, media_type)
         prefs = self.memory.get_preferences(session_id)
+        signals = self.memory.journal.item_signals(session_id)
         
         recommendations = []
         for item in library:
@@ -33,16 +44,24 @@ class RecommendationTools:
                 if progress_ratio > 0.3:
                     score += 20 * progress_ratio
             
+            item_signals = signals.get(item.id)
+            if item_signals:
+                # Reward momentum, and stop pushing what the user has quietly stopped watching
+                if item_signals["days_to_finish"] is not None and item_signals["days_to_finish"] <= 14:
+                    score += 10
+                score -= 20 * item_signals["drop_risk"]
+            
             recommendations.append({
                 "item": item.to_dict(),
                 "recommendation_score": round(score, 2),
-                "reason": self._generate_reason(item, prefs, score)
+                "reason": self._generate_reason(item, prefs, score, item_signals)
             })
         
         recommendations.sort(key=lambda x: x["recommendation_score"], reverse=True)
         return recommendations[:count]
     
-    def _generate_reason(self, item: MediaItem, prefs, score: float) -> str:
+    def _generate_reason(self, item: MediaItem, prefs, score: float,
+                         signals: Optional[Dict[str, Any]] = None) -> str:
         reasons = []
         if item.score and item.score >= 8:
             reasons.append(f"highly rated ({item.score}/10)")
@@ -50,8 +69,31 @@ class RecommendationTools:
             reasons.append("matches your favorite genres")
         if item.status == "planned":
             reasons.append("in your plan to watch/read")
+        if signals and signals["days_to_finish"] is not None and signals["days_to_finish"] <= 14:
+            reasons.append(f"you could finish it in about {max(round(signals['days_to_finish']), 1)} days at your pace")
         return ", ".join(reasons) if reasons else "good match for you"
     
+    def get_collaborative_recommendations(self, session_id: str, media_type: Optional[str] = None,
+                                          count: int = 5) -> List[Dict[str, Any]]:
+        recommendations = []
+        for item, score, because in self.similarity.recommend(session_id, count, media_type):
+            recommendations.append({
+                "item": item.to_dict(),
+                "recommendation_score": round(score, 2),
+                "reason": f"users who tracked {because.title} also tracked this"
+            })
+        return recommendations
+    
+    def get_tool_handlers(self) -> Dict[str, Callable[..., Any]]:
+        return {
+            "get_recommendations": lambda session_id, args, deadline=None: self.get_recommendations(
+                session_id, args.get("media_type"), int(args.get("count", 5))
+            ),
+            "get_collaborative_recommendations": lambda session_id, args, deadline=None: self.get_collaborative_recommendations(
+                session_id, args.get("media_type"), int(args.get("count", 5))
+            )
+        }
+    
     def get_tool_definitions(self) -> List[Dict[str, Any]]:
         return [{
             "name": "get_recommendations",
@@ -71,4 +113,22 @@ class RecommendationTools:
                     }
                 }
             }
+        }, {
+            "name": "get_collaborative_recommendations",
+            "description": "Recommend titles outside the user's library that other users who tracked the same titles also tracked",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "media_type": {
+                        "type": "string",
+                        "enum": ["anime", "movie", "tv", "manga"],
+                        "description": "Filter recommendations by type (optional)"
+                    },
+                    "count": {
+                        "type": "integer",
+                        "description": "Number of recommendations (default: 5)",
+                        "default": 5
+                    }
+                }
+            }
         }]
@@ -1,26 +1,171 @@
-from typing import List, Dict, Any
+from collections import OrderedDict
+from concurrent.futures import Future
+from itertools import chain, islice
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+import base64
+import json
+import secrets
+import threading
 from ..clients.tmdb_client import TMDBClient
 from ..clients.anilist_client import AniListClient
 from ..models import MediaItem
+from ..config import config
+from ..services.deadline import Deadline
+from ..services.similarity_index import SimilarityIndex
+from ..services.poster_cache import with_poster_proxy_url
+from ..services.rate_limit import rate_limits
+
+def clamp_limit(limit: Any, default: int) -> int:
+    # Model tool calls reach here without the HTTP layer's validation
+    try:
+        limit = int(limit) if limit is not None else default
+    except (TypeError, ValueError):
+        limit = default
+    return min(max(limit, 1), config.SEARCH_MAX_LIMIT)
 
 class SearchTools:
-    def __init__(self):
+    def __init__(self, similarity_index: Optional[SimilarityIndex] = None):
         self.tmdb = TMDBClient()
         self.anilist = AniListClient()
+        self.similarity_index = similarity_index or SimilarityIndex()
+        # cursor -> (iterator positioned at the cursor, underlying generator) for recently paged searches
+        self.live_searches: "OrderedDict[str, Tuple[Iterator[MediaItem], Iterator[MediaItem]]]" = OrderedDict()
+        self._live_lock = threading.Lock()
     
-    def search_media(self, query: str, media_type: str, limit: int = 10) -> List[Dict[str, Any]]:
-        results = []
+    def search_media(self, query: str, media_type: str, limit: int = 10,
+                     deadline: Optional[Deadline] = None, max_wait: float = 0.0) -> List[Dict[str, Any]]:
+        # Interactive searches never wait for upstream quota; bulk callers can ask to, up to max_wait
+        host = self.upstream_host(media_type)
+        if max_wait and host:
+            with rate_limits.reserve_upstream(host, max_wait) as reserved:
+                if not reserved:
+                    if deadline:
+                        deadline.mark_partial(f"{media_type} search rate limited")
+                    return []
+                results = list(self.iter_media(query, media_type, limit, deadline))
+        else:
+            results = list(self.iter_media(query, media_type, limit, deadline))
         
+        self.similarity_index.add_many(results)
+        return [with_poster_proxy_url(item.to_dict()) for item in results]
+    
+    def upstream_host(self, media_type: str) -> Optional[str]:
+        client = {"movie": self.tmdb, "tv": self.tmdb, "anime": self.anilist, "manga": self.anilist}.get(media_type)
+        return client.guard.host if client else None
+
+    def iter_media(self, query: str, media_type: str, max_items: Optional[int] = None,
+                   deadline: Optional[Deadline] = None) -> Iterator[MediaItem]:
         if media_type == "movie":
-            results = self.tmdb.search_movies(query, limit)
+            return self.tmdb.iter_movies(query, max_items, deadline)
         elif media_type == "tv":
-            results = self.tmdb.search_tv(query, limit)
+            return self.tmdb.iter_tv(query, max_items, deadline)
         elif media_type == "anime":
-            results = self.anilist.search_anime(query, limit)
+            return self.anilist.iter_anime(query, max_items, deadline)
         elif media_type == "manga":
-            results = self.anilist.search_manga(query, limit)
+            return self.anilist.iter_manga(query, max_items, deadline)
+        return iter(())
+    
+    def search_page(self, query: str, media_type: str, cursor: Optional[str] = None,
+                    limit: int = 20) -> Dict[str, Any]:
+        offset = 0
+        limit = clamp_limit(limit, 20)
+        if cursor:
+            query, media_type, offset = self._decode_cursor(cursor)
+        if not query.strip() or media_type not in ["anime", "movie", "tv", "manga"]:
+            raise ValueError("A query and a media type of anime, movie, tv or manga are required")
         
-        return [item.to_dict() for item in results]
+        with self._live_lock:
+            live = self.live_searches.pop(cursor, None) if cursor else None
+        if live:
+            iterator, generator = live
+            # The walk was bounded at this page's first item; let it reach one past this page
+            extend = getattr(generator, "extend", None)
+            if extend:
+                extend(limit)
+        else:
+            # Cursor fell out of the live set (or another worker issued it): page up to it again.
+            # Bounded so page fetches, TV detail lookups and prefetch stop at what this page needs
+            generator = self.iter_media(query, media_type, offset + limit + 1)
+            iterator = generator
+            next(islice(iterator, offset, offset), None)
+        
+        items = list(islice(iterator, limit + 1))
+        next_cursor = None
+        if len(items) > limit:
+            next_cursor = self._encode_cursor(query, media_type, offset + limit)
+            self._keep_live(next_cursor, chain([items[limit]], iterator), generator)
+            items = items[:limit]
+        else:
+            self._close(generator)
+        if media_type == "tv":
+            # Items from a page fetched for an earlier, smaller request may not have their details yet
+            self.tmdb.attach_tv_details(items)
+        
+        self.similarity_index.add_many(items)
+        return {
+            "items": [with_poster_proxy_url(item.to_dict()) for item in items],
+            "next_cursor": next_cursor
+        }
+    
+    def _keep_live(self, cursor: str, iterator: Iterator[MediaItem], generator: Iterator[MediaItem]):
+        evicted = []
+        with self._live_lock:
+            self.live_searches[cursor] = (iterator, generator)
+            while len(self.live_searches) > config.SEARCH_CURSOR_CACHE:
+                evicted.append(self.live_searches.popitem(last=False)[1][1])
+        for old in evicted:
+            self._close(old)
+    
+    def _close(self, iterator: Iterator[MediaItem]):
+        # Closing a paging generator cancels its queued next-page prefetch
+        close = getattr(iterator, "close", None)
+        if close:
+            close()
+    
+    def _encode_cursor(self, query: str, media_type: str, offset: int) -> str:
+        # The nonce keeps two clients paging the same search from resuming each other's live walk
+        payload = json.dumps([query, media_type, offset, secrets.token_urlsafe(6)], separators=(",", ":"))
+        return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+    
+    def _decode_cursor(self, cursor: str) -> Tuple[str, str, int]:
+        try:
+            padded = cursor + "=" * (-len(cursor) % 4)
+            query, media_type, offset = json.loads(base64.urlsafe_b64decode(padded))[:3]
+            return str(query), str(media_type), max(int(offset), 0)
+        except (ValueError, TypeError):
+            raise ValueError("Invalid cursor")
+    
+    def prefetch_details(self, results: List[Dict[str, Any]], top: int = 3):
+        # Fill in what the search skipped (e.g. TV episode counts cut off by the deadline)
+        # while the user is still reading, patching the result dicts in place
+        for result in results[:top]:
+            if result.get("type") == "tv" and result.get("total_episodes") is None:
+                tv_id = int(result["id"].rsplit("_", 1)[1])
+                future = self.tmdb.prefetch_tv_details(tv_id)
+                future.add_done_callback(lambda f, result=result: self._apply_tv_details(result, f))
+    
+    def _apply_tv_details(self, result: Dict[str, Any], future: Future):
+        if future.cancelled() or future.exception():
+            return
+        episodes = future.result().get("number_of_episodes")
+        if episodes:
+            result["total_episodes"] = episodes
+    
+    def find_similar(self, item_id: str, limit: int = 5, media_type: Optional[str] = None) -> List[Dict[str, Any]]:
+        return [
+            {"item": item.to_dict(), "similarity": round(score, 3)}
+            for item, score in self.similarity_index.similar(item_id, limit, media_type)
+        ]
+    
+    def get_tool_handlers(self) -> Dict[str, Callable[..., Any]]:
+        return {
+            "search_media": lambda session_id, args, deadline=None: self.search_media(
+                args["query"], args["media_type"], clamp_limit(args.get("limit"), 10), deadline
+            ),
+            "find_similar": lambda session_id, args, deadline=None: self.find_similar(
+                args["item_id"], clamp_limit(args.get("limit"), 5), args.get("media_type")
+            )
+        }
     
     def get_tool_definitions(self) -> List[Dict[str, Any]]:
         return [{
@@ -46,4 +191,27 @@ class SearchTools:
                 },
                 "required": ["query", "media_type"]
             }
+        }, {
+            "name": "find_similar",
+            "description": "Find titles whose overview, title and genres are most similar to a previously seen item, without calling external APIs",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "item_id": {
+                        "type": "string",
+                        "description": "ID of an item returned by an earlier search or in the library"
+                    },
+                    "limit": {
+                        "type": "integer",
+                        "description": "Maximum number of results (default: 5)",
+                        "default": 5
+                    },
+                    "media_type": {
+                        "type": "string",
+                        "enum": ["anime", "movie", "tv", "manga"],
+                        "description": "Only return this type (optional)"
+                    }
+                },
+                "required": ["item_id"]
+            }
         }]
@@ -0,0 +1,12 @@
+import os
+import tempfile
+
+# config refuses to load without API keys; tests never reach the real upstreams
+os.environ.setdefault("GOOGLE_API_KEY", "test")
+os.environ.setdefault("TMDB_API_KEY", "test")
+
+# Keep anything a test touches on disk out of the working tree
+_scratch = tempfile.mkdtemp(prefix="media-agent-tests-")
+os.environ.setdefault("POSTER_CACHE_DIR", os.path.join(_scratch, "posters"))
+os.environ.setdefault("SIMILARITY_INDEX_PATH", os.path.join(_scratch, "similarity_index.jsonl"))
+os.environ.setdefault("SNAPSHOT_PATH", os.path.join(_scratch, "state.snapshot"))
@@ -0,0 +1,149 @@
+import asyncio
+
+import pytest
+
+from src.services.rate_limit import AdmissionController, RateLimitedError
+
+async def settle():
+    # Let queued tasks run up to their first await
+    for _ in range(3):
+        await asyncio.sleep(0)
+
+def test_admits_immediately_below_capacity():
+    async def scenario():
+        admission = AdmissionController(max_inflight=2, max_queue=2, max_wait=1.0)
+        await admission.acquire(5)
+        await admission.acquire(5)
+        assert admission.inflight == 2
+        assert admission.stats["admitted"] == 2
+        assert not admission.waiters
+
+    asyncio.run(scenario())
+
+def test_full_queue_sheds_most_expensive_newest_waiter():
+    async def scenario():
+        admission = AdmissionController(max_inflight=1, max_queue=2, max_wait=10.0)
+        await admission.acquire(0)
+        older = asyncio.create_task(admission.acquire(5))
+        newer = asyncio.create_task(admission.acquire(5))
+        await settle()
+
+        cheap = asyncio.create_task(admission.acquire(1))
+        await settle()
+
+        with pytest.raises(RateLimitedError):
+            await newer
+        assert admission.stats["shed"] == 1
+        assert len(admission.waiters) == 2
+
+        # The cheaper arrival goes ahead of the older, more expensive waiter
+        admission.release()
+        await cheap
+        assert not older.done()
+        assert admission.inflight == 1
+
+        admission.release()
+        await older
+        admission.release()
+        assert admission.inflight == 0
+
+    asyncio.run(scenario())
+
+def test_full_queue_rejects_when_nothing_is_more_expensive():
+    async def scenario():
+        admission = AdmissionController(max_inflight=1, max_queue=1, max_wait=10.0)
+        await admission.acquire(0)
+        queued = asyncio.create_task(admission.acquire(1))
+        await settle()
+
+        with pytest.raises(RateLimitedError) as error:
+            await admission.acquire(1)
+        assert error.value.retry_after > 0
+        assert admission.stats["rejected"] == 1
+        assert not queued.done()
+
+        queued.cancel()
+        await asyncio.gather(queued, return_exceptions=True)
+
+    asyncio.run(scenario())
+
+def test_waiter_expires_after_max_wait():
+    async def scenario():
+        admission = AdmissionController(max_inflight=1, max_queue=4, max_wait=0.05)
+        await admission.acquire(0)
+
+        with pytest.raises(RateLimitedError):
+            await admission.acquire(1)
+        assert admission.stats["expired"] == 1
+        assert not admission.waiters
+
+        # The expired waiter must not be handed the slot later
+        admission.release()
+        assert admission.inflight == 0
+
+    asyncio.run(scenario())
+
+def test_cancel_while_queued_leaves_the_queue():
+    async def scenario():
+        admission = AdmissionController(max_inflight=1, max_queue=4, max_wait=10.0)
+        await admission.acquire(0)
+        waiter = asyncio.create_task(admission.acquire(1))
+        await settle()
+
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        assert not admission.waiters
+        assert admission.inflight == 1
+
+        admission.release()
+        assert admission.inflight == 0
+
+    asyncio.run(scenario())
+
+def test_cancel_after_hand_off_passes_the_slot_on():
+    async def scenario():
+        admission = AdmissionController(max_inflight=1, max_queue=4, max_wait=10.0)
+        await admission.acquire(0)
+        first = asyncio.create_task(admission.acquire(1))
+        second = asyncio.create_task(admission.acquire(2))
+        await settle()
+
+        # The slot is handed to `first`, which is cancelled before it gets to run
+        admission.release()
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+
+        await second
+        assert admission.inflight == 1
+        admission.release()
+        assert admission.inflight == 0
+
+    asyncio.run(scenario())
+
+def test_cancel_after_hand_off_frees_the_slot():
+    async def scenario():
+        admission = AdmissionController(max_inflight=1, max_queue=4, max_wait=10.0)
+        await admission.acquire(0)
+        waiter = asyncio.create_task(admission.acquire(1))
+        await settle()
+
+        admission.release()
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        assert admission.inflight == 0
+        assert not admission.waiters
+
+    asyncio.run(scenario())
+
+def test_slot_releases_on_error():
+    async def scenario():
+        admission = AdmissionController(max_inflight=1, max_queue=4, max_wait=10.0)
+        with pytest.raises(ValueError):
+            async with admission.slot(1):
+                raise ValueError("boom")
+        assert admission.inflight == 0
+
+    asyncio.run(scenario())
@@ -0,0 +1,59 @@
+from types import SimpleNamespace
+
+import pytest
+
+from src.agents.base_agent import BaseAgent
+from src.services.circuit_breaker import CircuitOpenError
+from src.services.rate_limit import RateLimitedError
+
+def calling(*names):
+    parts = [SimpleNamespace(function_call=SimpleNamespace(name=name, args={})) for name in names]
+    return SimpleNamespace(candidates=[SimpleNamespace(content=SimpleNamespace(parts=parts))])
+
+def answer(text):
+    return SimpleNamespace(text=text, candidates=[])
+
+def make_agent(replies):
+    writes = []
+    agent = BaseAgent("Test", "test", tools=[{"name": "add", "description": "add"}, {"name": "boom", "description": "boom"}],
+                      tool_handlers={"add": lambda session_id, args, deadline=None: writes.append(session_id) or "ok",
+                                     "boom": lambda session_id, args, deadline=None: 1 / 0})
+    agent.model = SimpleNamespace(start_chat=lambda: object())
+    sent = []
+
+    def send(chat, content, request_options, **kwargs):
+        sent.append(content)
+        reply = replies[len(sent) - 1]
+        if isinstance(reply, Exception):
+            raise reply
+        return reply
+
+    agent._send_message = send
+    return agent, writes, sent
+
+def test_follow_up_refused_after_tools_ran_returns_partial_answer():
+    agent, writes, sent = make_agent([calling("add", "boom"), RateLimitedError("over quota", 2.0)])
+    result = agent.run("add it", session_id="s")
+
+    assert writes == ["s"]
+    assert result["partial"] is True
+    assert "add" in result["response"] and "boom" in result["response"]
+    assert [record["name"] for record in result["tool_calls"]] == ["add", "boom"]
+
+def test_open_circuit_after_tools_ran_is_also_partial():
+    agent, writes, _ = make_agent([calling("add"), CircuitOpenError("open")])
+    assert agent.run("add it", session_id="s")["partial"] is True
+    assert writes == ["s"]
+
+def test_refusal_before_any_tool_ran_is_still_raised():
+    agent, writes, _ = make_agent([RateLimitedError("over quota", 2.0)])
+    with pytest.raises(RateLimitedError):
+        agent.run("add it", session_id="s")
+    assert writes == []
+
+def test_normal_tool_loop_is_not_partial():
+    agent, writes, sent = make_agent([calling("add"), answer("Added.")])
+    result = agent.run("add it", session_id="s")
+    assert result["response"] == "Added."
+    assert "partial" not in result
+    assert len(sent) == 2
@@ -0,0 +1,75 @@
+import pytest
+
+from src.models import MediaItem
+from src.services.collaborative_filtering import ItemSimilarityModel
+
+def make_item(name: str, status: str = "completed", media_type: str = "anime") -> MediaItem:
+    return MediaItem(id=name, source="anilist", type=media_type, title=name.title(), overview="", status=status)
+
+def add(model, session_id, *names, status="completed"):
+    for name in names:
+        model.update(session_id, make_item(name, status))
+
+def test_update_builds_symmetric_cooccurrence_and_norms():
+    model = ItemSimilarityModel()
+    add(model, "u1", "a", "b")
+    add(model, "u2", "a", "b", "c")
+
+    a, b, c = (model.item_index[name] for name in "abc")
+    assert model.cooccurrence[a][b] == model.cooccurrence[b][a] == pytest.approx(2.0)
+    assert model.cooccurrence[a][c] == pytest.approx(1.0)
+    assert model.norms[a] == pytest.approx(2.0)
+    assert [item.id for item, _ in model.similar_items("a", 2)] == ["b", "c"]
+
+def test_status_change_applies_only_the_delta():
+    model = ItemSimilarityModel()
+    add(model, "u1", "a", "b")
+    model.update("u1", make_item("a", "dropped"))
+
+    a, b = model.item_index["a"], model.item_index["b"]
+    assert model.cooccurrence[a][b] == pytest.approx(0.1)
+    assert model.norms[a] == pytest.approx(0.01)
+
+def test_recommend_skips_owned_items_and_explains():
+    model = ItemSimilarityModel()
+    add(model, "u1", "a", "b")
+    add(model, "u2", "a")
+
+    [(item, score, because)] = model.recommend("u2", 5)
+    assert (item.id, because.id) == ("b", "a")
+    assert score > 0
+    # Catalog copies do not carry the adding user's status
+    assert item.status == "planned"
+
+def test_full_library_does_not_grow_the_catalog():
+    model = ItemSimilarityModel(max_user_items=2)
+    add(model, "u1", "a", "b", "c")
+
+    assert "c" not in model.item_index
+    assert len(model.catalog) == 2
+    # Items already in the row still take status changes
+    model.update("u1", make_item("a", "dropped"))
+    assert model.user_rows["u1"][model.item_index["a"]] == pytest.approx(0.1)
+
+def test_prune_keeps_the_strongest_half():
+    model = ItemSimilarityModel(max_row_entries=4)
+    add(model, "heavy1", "a", "b")
+    add(model, "heavy2", "a", "b")
+    add(model, "other", "a", "c", "d", "e", "f")
+
+    a = model.item_index["a"]
+    assert len(model.cooccurrence[a]) <= 4
+    assert model.cooccurrence[a][model.item_index["b"]] == pytest.approx(2.0)
+
+def test_least_recent_user_is_evicted_with_its_counts():
+    model = ItemSimilarityModel(max_users=2)
+    add(model, "u1", "a", "b")
+    add(model, "u2", "a", "c")
+    add(model, "u1", "d")
+    add(model, "u3", "b", "c")
+
+    assert list(model.user_rows) == ["u1", "u3"]
+    a, c = model.item_index["a"], model.item_index["c"]
+    assert c not in model.cooccurrence[a]
+    assert model.norms[a] == pytest.approx(1.0)
+    assert model.stats()["users"] == 2
@@ -0,0 +1,76 @@
+from src.services.context_builder import ContextBuilder, estimate_tokens
+from src.services.session_service import SessionService
+
+def make_builder(turns, **kwargs):
+    sessions = SessionService()
+    sessions.create_session("s")
+    for role, content in turns:
+        sessions.update_session("s", {"role": role, "content": content})
+    return sessions, ContextBuilder(sessions, **kwargs)
+
+def section(context: str, heading: str) -> list:
+    for block in context.split("\n\n"):
+        if block.startswith(heading):
+            return block.splitlines()[1:]
+    return []
+
+def test_short_history_is_kept_verbatim():
+    _, builder = make_builder([("user", "hi"), ("assistant", "Hello!")])
+    context = builder.build("s", "Library: 3 items")
+
+    assert context == "Library: 3 items\n\nRecent conversation:\nUser: hi\nAssistant: Hello!"
+
+def test_turns_outside_the_window_are_summarized():
+    turns = [("user", f"question {i}") if i % 2 == 0 else
+             ("assistant", f"Found these:\n1. **Title {i}**\n2. **Other {i}**") for i in range(6)]
+    _, builder = make_builder(turns, recent_turns=2)
+    context = builder.build("s")
+
+    assert section(context, "Earlier") == [
+        "- User: question 0",
+        "- Assistant: Found these: (Title 1, Other 1)",
+        "- User: question 2",
+        "- Assistant: Found these: (Title 3, Other 3)",
+    ]
+    assert section(context, "Recent") == ["User: question 4", "Assistant: Found these:", "1. **Title 5**", "2. **Other 5**"]
+
+def test_summary_is_folded_once_and_extended_incrementally():
+    sessions, builder = make_builder([("user", f"q{i}") for i in range(4)], recent_turns=2)
+    builder.build("s")
+    assert builder.summaries["s"].upto == 2
+
+    sessions.update_session("s", {"role": "user", "content": "q4"})
+    context = builder.build("s")
+    assert builder.summaries["s"].upto == 3
+    assert section(context, "Earlier") == ["- User: q0", "- User: q1", "- User: q2"]
+
+def test_summary_drops_oldest_lines_past_its_budget():
+    _, builder = make_builder([("user", "word " * 10) for _ in range(10)], recent_turns=1, summary_tokens=26)
+    builder.build("s")
+
+    summary = builder.summaries["s"]
+    assert summary.upto == 9
+    assert summary.tokens <= 26
+    assert summary.tokens == sum(estimate_tokens(line) for line in summary.lines)
+    assert len(summary.lines) == 2
+
+def test_recent_turns_that_overflow_the_budget_move_to_the_summary():
+    long_reply = "x" * 400
+    _, builder = make_builder([("user", "first"), ("assistant", long_reply), ("user", "last")],
+                              token_budget=60, summary_tokens=10)
+    context = builder.build("s")
+
+    assert section(context, "Recent") == ["User: last"]
+    assert builder.summaries["s"].upto == 2
+
+def test_a_single_oversized_turn_is_truncated():
+    _, builder = make_builder([("user", "y" * 1000)], token_budget=30, summary_tokens=10)
+    [line] = section(builder.build("s"), "Recent")
+
+    assert line.endswith("…")
+    assert len(line) == 20 * 4 + 1
+
+def test_long_first_lines_are_clipped_in_the_summary():
+    _, builder = make_builder([("user", "z" * 150), ("user", "ok")], recent_turns=1)
+    [line] = section(builder.build("s"), "Earlier")
+    assert line == "- User: " + "z" * 100 + "…"
@@ -0,0 +1,80 @@
+import io
+import json
+
+import pytest
+
+from src.tools.import_parsers import ImportEntry, detect_format, iter_json_array, parse_export
+
+def parse(data: str, fmt=None, default_type: str = "anime"):
+    return list(parse_export(io.BytesIO(data.encode("utf-8")), fmt, default_type))
+
+def test_detects_each_format():
+    assert detect_format(io.BufferedReader(io.BytesIO(b"\xef\xbb\xbf<?xml version='1.0'?><myanimelist/>"))) == "xml"
+    assert detect_format(io.BufferedReader(io.BytesIO(b'{"title": "a"}\n{"title": "b"}\n'))) == "jsonl"
+    assert detect_format(io.BufferedReader(io.BytesIO(b'{\n  "data": {}\n}'))) == "json"
+    assert detect_format(io.BufferedReader(io.BytesIO(b'  [{"title": "a"}]'))) == "json"
+    assert detect_format(io.BufferedReader(io.BytesIO(b"title,status\nNaruto,completed\n"))) == "csv"
+
+def test_csv_normalizes_headers_types_statuses_and_progress():
+    entries = parse(
+        "﻿Title, Type ,Status,Progress\n"
+        "Naruto,anime,Watching,12\n"
+        "Berserk,manga,watching,\n"
+        "Breaking Bad,TV Show,plan to watch,x\n"
+        ",anime,completed,3\n"
+    )
+    assert entries == [
+        ImportEntry("Naruto", "anime", "watching", 12),
+        ImportEntry("Berserk", "manga", "reading", None),
+        ImportEntry("Breaking Bad", "tv", "planned", None),
+    ]
+
+def test_csv_falls_back_to_default_type():
+    assert parse("name,my_status\nDune,2\n", default_type="movie") == [ImportEntry("Dune", "movie", "completed", None)]
+
+def test_mal_xml_entries():
+    xml = """<?xml version="1.0" encoding="UTF-8"?>
+    <myanimelist>
+      <myinfo><user_name>someone</user_name></myinfo>
+      <anime><series_title> Cowboy Bebop </series_title><my_watched_episodes>26</my_watched_episodes><my_status>Completed</my_status></anime>
+      <manga><manga_title>Vagabond</manga_title><my_read_chapters>100</my_read_chapters><my_status>Watching</my_status></manga>
+      <anime><my_status>Dropped</my_status></anime>
+    </myanimelist>"""
+    assert parse(xml) == [
+        ImportEntry("Cowboy Bebop", "anime", "completed", 26),
+        ImportEntry("Vagabond", "manga", "reading", 100),
+    ]
+
+def test_anilist_collection_json():
+    export = {"data": {"MediaListCollection": {"lists": [{"entries": [
+        {"status": "CURRENT", "progress": 5, "media": {"type": "MANGA", "title": {"romaji": "Kingdom"}}},
+        {"status": "PAUSED", "progress": None, "media": {"type": "ANIME", "title": {"english": "Frieren", "romaji": "Sousou no Frieren"}}},
+        {"status": "COMPLETED", "media": {"type": "ANIME", "title": {}}},
+    ]}]}}}
+    assert parse(json.dumps(export)) == [
+        ImportEntry("Kingdom", "manga", "reading", 5),
+        ImportEntry("Frieren", "anime", "on_hold", None),
+    ]
+
+def test_jsonl_and_array_json_agree():
+    rows = [{"title": "Dune", "type": "movie", "status": "completed"},
+            {"name": "Severance", "media_type": "tv", "progress_episodes": 9}]
+    expected = [ImportEntry("Dune", "movie", "completed", None), ImportEntry("Severance", "tv", None, 9)]
+    assert parse("\n".join(json.dumps(row) for row in rows) + "\n\n") == expected
+    assert parse(json.dumps(rows)) == expected
+
+def test_unknown_format_is_rejected():
+    with pytest.raises(ValueError):
+        parse("title\nx\n", fmt="yaml")
+
+def test_json_array_streams_across_chunk_boundaries():
+    rows = [{"title": f"Title {i}", "tags": ["a, b", "]"], "note": "[not an array]"} for i in range(50)]
+    text = io.StringIO("  " + json.dumps(rows, indent=2))
+    assert list(iter_json_array(text, chunk_size=7)) == rows
+
+def test_json_array_without_array_yields_nothing():
+    assert list(iter_json_array(io.StringIO('{"title": "x"}'))) == []
+
+def test_truncated_json_array_raises():
+    with pytest.raises(json.JSONDecodeError):
+        list(iter_json_array(io.StringIO('[{"title": "x"}, {"title": '), chunk_size=4))
@@ -0,0 +1,102 @@
+import io
+import threading
+
+from src.services.memory_service import MemoryService
+from src.tools.import_tools import ImportTools
+
+class FakeSearch:
+    def __init__(self, known=None):
+        self.known = known
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def search_media(self, query, media_type, limit=10, deadline=None, **kwargs):
+        with self._lock:
+            self.calls.append((query, media_type))
+        if self.known is not None and query.lower() not in self.known:
+            return []
+        return [{"id": f"{media_type}_{query.lower()}", "source": "anilist", "type": media_type,
+                 "title": query, "overview": ""}]
+
+def run_import(tools, text, session_id="s", **kwargs):
+    return tools.import_library(session_id, io.BytesIO(text.encode("utf-8")), **kwargs)
+
+def test_imports_resolved_rows_with_status_and_progress():
+    memory = MemoryService()
+    tools = ImportTools(FakeSearch(known={"naruto", "berserk"}), memory, max_workers=2, batch_size=2)
+    report = run_import(tools, "title,type,status,progress\nNaruto,anime,watching,12\n"
+                               "Berserk,manga,completed,300\nNope,anime,,\n")
+
+    assert (report["processed"], report["resolved"], report["added"]) == (3, 2, 2)
+    assert report["unresolved"] == ["Nope"]
+    library = {item.title: item for item in memory.get_library("s")}
+    assert library["Naruto"].status == "watching" and library["Naruto"].progress_episodes == 12
+    assert library["Berserk"].status == "completed" and library["Berserk"].progress_chapters == 300
+
+def test_duplicate_titles_are_resolved_once_and_added_once():
+    search = FakeSearch()
+    tools = ImportTools(search, MemoryService(), batch_size=10)
+    report = run_import(tools, "title\nNaruto\n naruto \nNARUTO\n")
+
+    assert len(search.calls) == 1
+    assert report["resolved"] == 3
+    assert (report["added"], report["duplicates"]) == (1, 2)
+
+def test_resolution_cache_is_shared_across_imports_and_bounded():
+    search = FakeSearch()
+    tools = ImportTools(search, MemoryService(), batch_size=1, cache_size=2)
+    run_import(tools, "title\nA\nB\nC\n", session_id="one")
+    report = run_import(tools, "title\nC\nA\n", session_id="two")
+
+    assert len(tools._resolved) == 2
+    # C is still cached; A was evicted by the cap and looked up again
+    assert report["cache_hits"] == 1
+    assert [call[0] for call in search.calls] == ["A", "B", "C", "A"]
+
+def test_progress_callback_runs_per_batch_and_at_the_end():
+    reports = []
+    tools = ImportTools(FakeSearch(), MemoryService(), batch_size=2)
+    run_import(tools, "title\nA\nB\nC\nD\nE\n", progress_callback=lambda report: reports.append(report["processed"]))
+    assert reports == [2, 4, 5]
+
+class FlakySearch(FakeSearch):
+    # Answers like an upstream that is over quota for the first `degraded` lookups of each title
+    def __init__(self, degraded):
+        super().__init__()
+        self.degraded = degraded
+        self.attempts = {}
+
+    def search_media(self, query, media_type, limit=10, deadline=None, **kwargs):
+        with self._lock:
+            self.attempts[query] = self.attempts.get(query, 0) + 1
+            attempt = self.attempts[query]
+        if attempt <= self.degraded:
+            deadline.mark_partial(f"{media_type} search rate limited")
+            return []
+        return super().search_media(query, media_type, limit, deadline, **kwargs)
+
+def test_degraded_lookups_are_retried_rather_than_reported_missing():
+    search = FlakySearch(degraded=2)
+    report = run_import(ImportTools(search, MemoryService(), max_attempts=3), "title\nA\nB\n")
+
+    assert (report["resolved"], report["unresolved_count"], report["failed_count"]) == (2, 0, 0)
+    assert search.attempts == {"A": 3, "B": 3}
+
+def test_lookups_that_never_complete_are_failed_and_not_cached():
+    search = FlakySearch(degraded=3)
+    tools = ImportTools(search, MemoryService(), max_attempts=2)
+    report = run_import(tools, "title\nA\n")
+
+    assert report["failed"] == ["A"] and report["unresolved"] == []
+    assert not tools._resolved
+
+    # Importing again retries the title instead of remembering the failure
+    report = run_import(tools, "title\nA\n")
+    assert report["added"] == 1 and report["failed_count"] == 0
+
+def test_report_lists_are_bounded_but_counted():
+    tools = ImportTools(FakeSearch(known=set()), MemoryService(), report_titles=2)
+    report = run_import(tools, "title\n" + "".join(f"Missing {i}\n" for i in range(5)))
+
+    assert report["unresolved"] == ["Missing 0", "Missing 1"]
+    assert report["unresolved_count"] == 5
@@ -0,0 +1,96 @@
+import base64
+import json
+
+import pytest
+
+from src.models import MediaItem
+from src.services.memory_service import MemoryService
+from src.tools.library_tools import LibraryTools
+
+def make_item(i: int, **overrides) -> MediaItem:
+    fields = dict(id=f"item{i}", source="anilist", type="anime", title=f"Title {i:02d}", overview="",
+                  year=2000 + i % 7, score=None if i % 5 == 0 else float(i % 10),
+                  genres=("Action",) if i % 2 else ("Drama",), added_date=1_700_000_000.0 + i,
+                  poster_url=f"https://image.tmdb.org/t/p/w500/{i}.jpg")
+    fields.update(overrides)
+    return MediaItem(**fields)
+
+@pytest.fixture
+def tools():
+    memory = MemoryService()
+    for i in range(23):
+        memory.add_media_item("s", make_item(i, type="manga" if i % 3 == 0 else "anime"))
+    return LibraryTools(memory)
+
+def walk(tools, **kwargs):
+    ids, cursor = [], None
+    while True:
+        page = tools.query_library("s", cursor=cursor, **kwargs)
+        ids.extend(row["id"] for row in page["items"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            return ids
+
+def cursor_for(payload) -> str:
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip("=")
+
+@pytest.mark.parametrize("sort", ["added", "added_date", "title", "score", "year"])
+@pytest.mark.parametrize("order", ["asc", "desc"])
+def test_paging_matches_a_full_sorted_scan(tools, sort, order):
+    expected = [row["id"] for row in tools.iter_library("s", sort=sort, order=order)]
+    assert walk(tools, sort=sort, order=order, limit=4) == expected
+    assert len(set(expected)) == 23
+
+def test_missing_scores_sort_last_in_both_directions(tools):
+    for order in ["asc", "desc"]:
+        rows = list(tools.iter_library("s", sort="score", order=order, fields=["score"]))
+        scores = [row["score"] for row in rows]
+        assert scores[-5:] == [None] * 5
+        assert scores[:-5] == sorted(scores[:-5], reverse=(order == "desc"))
+
+def test_filters_apply_across_pages(tools):
+    ids = walk(tools, media_type="anime", genre="action", min_score=3, limit=2)
+    expected = [row["id"] for row in tools.iter_library("s", media_type="anime", genre="action", min_score=3)]
+    assert ids == expected
+    assert all(int(item_id[4:]) % 2 and int(item_id[4:]) % 3 for item_id in ids)
+
+def test_projection_returns_only_requested_fields(tools):
+    page = tools.query_library("s", limit=1, fields=["title", "added_date", "poster_proxy_url"])
+    row = page["items"][0]
+    assert set(row) == {"title", "added_date", "poster_proxy_url"}
+    assert row["added_date"].startswith("2023-")
+    assert row["poster_proxy_url"].startswith("/posters/")
+
+def test_unknown_sort_order_and_fields_are_rejected(tools):
+    for kwargs in [{"sort": "rating"}, {"order": "up"}, {"fields": ["title", "secret"]}]:
+        with pytest.raises(ValueError):
+            tools.query_library("s", **kwargs)
+
+def test_cursor_must_match_the_requested_sort(tools):
+    cursor = tools.query_library("s", sort="title", limit=2)["next_cursor"]
+    with pytest.raises(ValueError):
+        tools.query_library("s", sort="year", cursor=cursor)
+
+@pytest.mark.parametrize("payload", [
+    ["added", "asc", [False]],
+    ["added", "asc", [False, -3, "x"]],
+    ["added", "asc", [True, 1, "x"]],
+    ["added", "asc", [False, "1", "x"]],
+    ["year", "asc", [False, "2001", "x"]],
+    ["title", "asc", [False, 1, "x"]],
+    ["score", "asc", [False, 1.0, 7]],
+    ["added", "asc", "abc"],
+    {"not": "a list"},
+])
+def test_malformed_cursors_are_rejected(tools, payload):
+    sort = payload[0] if isinstance(payload, list) else "added"
+    with pytest.raises(ValueError):
+        tools.query_library("s", sort=sort, order="asc", cursor=cursor_for(payload))
+
+def test_garbage_cursor_is_rejected(tools):
+    with pytest.raises(ValueError):
+        tools.query_library("s", cursor="!!!not-base64")
+
+def test_desc_cursor_past_a_shrunk_library_restarts_from_the_end(tools):
+    page = tools.query_library("s", order="desc", limit=3, cursor=cursor_for(["added", "desc", [False, 99, "x"]]))
+    assert [row["id"] for row in page["items"]] == ["item22", "item21", "item20"]
@@ -0,0 +1,115 @@
+import os
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+from src.services.poster_cache import PosterCache, PosterFetchError
+
+class FakeResponse:
+    def __init__(self, body: bytes):
+        self.body = body
+        self.headers = {"Content-Type": "image/jpeg", "Content-Length": str(len(body))}
+
+    def raise_for_status(self):
+        pass
+
+    def iter_content(self, size):
+        for start in range(0, len(self.body), size):
+            yield self.body[start:start + size]
+
+    def close(self):
+        pass
+
+class FakeTransport:
+    def __init__(self, bodies):
+        self.bodies = bodies
+        self.calls = []
+
+    def get(self, url, timeout=10, stream=False):
+        self.calls.append(url)
+        return FakeResponse(self.bodies[url])
+
+URL = "https://image.tmdb.org/t/p/w500/a.jpg"
+
+def make_cache(directory, bodies=None, **kwargs):
+    transport = FakeTransport(bodies or {URL: b"poster-a"})
+    return PosterCache(str(directory), 1024, ["image.tmdb.org"], transport=transport, **kwargs), transport
+
+def split(proxy_url):
+    parsed = urlparse(proxy_url)
+    return parsed.path.rsplit("/", 1)[1], parse_qs(parsed.query)["src"][0]
+
+def test_proxy_url_is_served_by_a_fresh_instance(tmp_path):
+    cache, _ = make_cache(tmp_path)
+    key, source = split(cache.proxy_url(URL))
+
+    # A restarted (or another) worker has no record of the URL, only the shared secret
+    other, transport = make_cache(tmp_path)
+    poster = other.get(key, source)
+    assert open(poster.path, "rb").read() == b"poster-a"
+    assert transport.calls == [URL]
+
+    assert other.get(key) is not None
+    assert transport.calls == [URL]
+
+def test_tampered_or_disallowed_urls_are_refused(tmp_path):
+    cache, transport = make_cache(tmp_path, secret="s3cret")
+    key, _ = split(cache.proxy_url(URL))
+    _, forged = split(cache.proxy_url("https://image.tmdb.org/t/p/w500/other.jpg"))
+
+    assert cache.get(key, forged) is None
+    assert cache.get(key, "!!not base64!!") is None
+    assert cache.proxy_url("https://evil.example/a.jpg") is None
+    assert transport.calls == []
+
+def test_secret_changes_the_key_and_old_entries_are_refiled(tmp_path):
+    first, _ = make_cache(tmp_path, secret="one")
+    old_key, source = split(first.proxy_url(URL))
+    first.get(old_key, source)
+
+    second, transport = make_cache(tmp_path, secret="two")
+    new_key, _ = split(second.proxy_url(URL))
+    assert new_key != old_key
+    assert second.lookup(new_key) is not None
+    assert not os.path.exists(second._meta_path(old_key))
+    assert transport.calls == []
+
+def test_eviction_keeps_blobs_shared_with_live_entries(tmp_path):
+    urls = [f"https://image.tmdb.org/{name}.jpg" for name in ("a", "b", "c")]
+    bodies = {urls[0]: b"x" * 600, urls[1]: b"x" * 600, urls[2]: b"y" * 600}
+    cache, _ = make_cache(tmp_path, bodies)
+    posters = [cache.get(*split(cache.proxy_url(url))) for url in urls]
+
+    # a and b share one blob; adding c pushes the cache over 1024 bytes
+    assert cache.stats["evictions"] == 2
+    assert cache.total_bytes == 600
+    assert cache.blob_refs == {os.path.basename(posters[2].path): 1}
+    assert not os.path.exists(posters[0].path)
+    assert os.path.exists(posters[2].path)
+
+def test_fetch_pins_the_blob_before_checking_it_exists(tmp_path):
+    urls = [f"https://image.tmdb.org/{name}.jpg" for name in ("a", "b", "c")]
+    bodies = {urls[0]: b"x" * 600, urls[1]: b"x" * 600, urls[2]: b"y" * 600}
+    cache, _ = make_cache(tmp_path, bodies)
+    first = cache.get(*split(cache.proxy_url(urls[0])))
+    pinned = dict(cache.entries[split(cache.proxy_url(urls[0]))[0]])
+
+    # A fetch of the same bytes has taken its reference when a third poster evicts the only entry using them
+    with cache._lock:
+        assert not cache._retain(pinned)
+    cache.get(*split(cache.proxy_url(urls[2])))
+    assert cache.stats["evictions"] == 1
+    assert os.path.exists(first.path)
+
+    second = cache.get(*split(cache.proxy_url(urls[1])))
+    with cache._lock:
+        cache._release(pinned)
+    assert second.path == first.path and os.path.exists(second.path)
+    assert cache.blob_refs[os.path.basename(second.path)] == 1
+    assert cache.total_bytes == 600
+
+def test_oversized_poster_is_refused(tmp_path):
+    cache, _ = make_cache(tmp_path, {URL: b"z" * 2048}, max_image_bytes=1024)
+    with pytest.raises(PosterFetchError):
+        cache.get(*split(cache.proxy_url(URL)))
+    assert cache.entries == {} and cache.total_bytes == 0
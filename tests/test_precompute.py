@@ -0,0 +1,85 @@
+from src.models import MediaItem
+from src.services.memory_service import MemoryService
+from src.services.precompute import PrecomputeScheduler
+
+class FakeRecommendations:
+    def __init__(self, memory):
+        self.memory = memory
+        self.calls = 0
+
+    def get_recommendations(self, session_id, media_type=None, count=5):
+        self.calls += 1
+        return [{"item": item.to_dict(), "score": 1.0} for item in self.memory.get_library(session_id)]
+
+    def get_collaborative_recommendations(self, session_id, media_type=None, count=5):
+        return []
+
+def make_item(item_id: str) -> MediaItem:
+    return MediaItem(id=item_id, source="anilist", type="anime", title=item_id.title(), overview="")
+
+def make_scheduler(**kwargs):
+    memory = MemoryService()
+    tools = FakeRecommendations(memory)
+    # A long debounce keeps the background worker out of the way
+    return memory, tools, PrecomputeScheduler(memory, tools, debounce=60.0, max_wait=60.0, **kwargs)
+
+def ids(recs):
+    return [rec["item"]["id"] for rec in recs]
+
+def test_repeat_reads_are_served_from_the_cache():
+    memory, tools, scheduler = make_scheduler()
+    memory.add_media_item("s", make_item("a"))
+
+    assert ids(scheduler.recommendations("s")) == ["a"]
+    assert ids(scheduler.recommendations("s")) == ["a"]
+    assert tools.calls == 1
+    assert (scheduler.stats["sync"], scheduler.stats["hits"]) == (1, 1)
+
+def test_writer_sees_its_change_on_the_next_read():
+    memory, tools, scheduler = make_scheduler()
+    memory.add_media_item("s", make_item("a"))
+    scheduler.recommendations("s")
+
+    memory.add_media_item("s", make_item("b"))
+    assert "s" not in scheduler.results
+    assert ids(scheduler.recommendations("s")) == ["a", "b"]
+    assert scheduler.stats["invalidated"] == 1
+
+def test_other_sessions_keep_their_results():
+    memory, tools, scheduler = make_scheduler()
+    memory.add_media_item("s", make_item("a"))
+    memory.add_media_item("t", make_item("b"))
+    scheduler.recommendations("t")
+
+    memory.add_media_item("s", make_item("c"))
+    scheduler.recommendations("t")
+    assert tools.calls == 1
+
+def test_sweep_drops_results_and_versions_of_quiet_sessions():
+    memory, tools, scheduler = make_scheduler(active_window=10.0)
+    memory.add_media_item("quiet", make_item("a"))
+    memory.add_media_item("busy", make_item("b"))
+    scheduler.recommendations("quiet")
+    scheduler.recommendations("busy")
+
+    now = 1000.0
+    scheduler.last_active.update(quiet=now - 20.0, busy=now - 5.0)
+    scheduler._last_sweep = now - 120.0
+    with scheduler._cond:
+        scheduler._sweep(now)
+
+    assert set(scheduler.results) == set(scheduler.versions) == {"busy"}
+
+def test_entry_computed_before_a_sweep_is_replaced():
+    memory, tools, scheduler = make_scheduler()
+    memory.add_media_item("s", make_item("a"))
+    memory.add_media_item("s", make_item("b"))
+    stale = scheduler._compute("s")
+    # Versions restarted under an entry from before the sweep
+    scheduler.versions.clear()
+    scheduler.results["s"] = stale
+
+    scheduler.recommendations("s")
+    assert scheduler.results["s"].version == 0
+    scheduler.recommendations("s")
+    assert scheduler.stats["hits"] == 1
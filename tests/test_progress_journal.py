@@ -0,0 +1,97 @@
+import base64
+from array import array
+
+from src.models import MediaItem
+from src.services.progress_journal import DAY, WEEK, ProgressJournal
+
+NOW = 1_700_000_000.0
+
+def make_item(item_id: str = "a", media_type: str = "anime", **fields) -> MediaItem:
+    return MediaItem(id=item_id, source="anilist", type=media_type, title=item_id.title(), overview="", **fields)
+
+def test_prefix_sums_answer_any_window():
+    journal = ProgressJournal()
+    for day, (episodes, chapters) in enumerate([(3, 0), (0, 10), (2, 5), (-4, 0)]):
+        journal.record("s", make_item(), episodes=episodes, chapters=chapters, at=NOW + day * DAY)
+
+    series = journal.sessions["s"]
+    # Negative corrections are kept as events but never subtract from the sums
+    assert list(series.cum_episodes) == [0, 3, 3, 5, 5]
+    assert list(series.cum_chapters) == [0, 0, 10, 15, 15]
+    assert series.units_between(NOW, NOW + 3 * DAY) == {"episodes": 5, "chapters": 15}
+    assert series.units_between(NOW + DAY, NOW + 2 * DAY) == {"episodes": 2, "chapters": 15}
+    # Window edges are inclusive on both ends
+    assert series.units_between(NOW + 2 * DAY, NOW + 2 * DAY) == {"episodes": 2, "chapters": 5}
+    assert series.units_between(NOW + 10 * DAY, NOW + 20 * DAY) == {"episodes": 0, "chapters": 0}
+
+def test_clock_stepping_back_keeps_the_series_sorted():
+    journal = ProgressJournal()
+    journal.record("s", make_item(), episodes=1, at=NOW)
+    journal.record("s", make_item(), episodes=1, at=NOW - DAY)
+
+    assert list(journal.sessions["s"].timestamps) == [NOW, NOW]
+    assert journal.sessions["s"].units_between(NOW, NOW) == {"episodes": 2, "chapters": 0}
+
+def test_weekly_units_and_pace_use_the_windows():
+    journal = ProgressJournal(pace_weeks=2)
+    journal.record("s", make_item(), episodes=100, at=NOW - 30 * DAY)
+    journal.record("s", make_item(), episodes=6, at=NOW - 10 * DAY)
+    journal.record("s", make_item(), episodes=4, at=NOW - 3 * DAY)
+
+    weekly = journal.weekly_units("s", weeks=2, now=NOW)
+    assert [row["episodes"] for row in weekly] == [6, 4]
+    assert journal.pace("s", now=NOW) == {"episodes_per_week": 5.0, "chapters_per_week": 0.0}
+
+def test_status_counts_follow_changes():
+    journal = ProgressJournal()
+    journal.record("s", make_item("a"), status="watching", at=NOW)
+    journal.record("s", make_item("b"), status="watching", at=NOW)
+    journal.record("s", make_item("a"), status="completed", at=NOW)
+    journal.record("s", make_item("b"), status="dropped", at=NOW)
+
+    assert journal.completion_rates("s") == {"completion_rate": 0.5, "drop_rate": 0.5}
+
+def test_integer_columns_are_fixed_width():
+    journal = ProgressJournal()
+    journal.record("s", make_item(), episodes=1, at=NOW)
+    series = journal.sessions["s"]
+    for name in ("items", "episodes", "chapters", "item_total", "item_progress", "status_counts"):
+        assert getattr(series, name).typecode == "q"
+
+def test_export_import_round_trip_records_item_sizes():
+    journal = ProgressJournal()
+    journal.record("s", make_item(total_episodes=24, progress_episodes=5), episodes=5, status="watching", at=NOW)
+    journal.record("s", make_item("b", "manga"), chapters=40, at=NOW + WEEK)
+    state = journal.export_state()
+    assert state["s"]["columns"]["episodes"][:2] == ["q", 8]
+
+    restored = ProgressJournal()
+    restored.import_state(state)
+    assert restored.sessions["s"].units_between(NOW, NOW + WEEK) == {"episodes": 5, "chapters": 40}
+    assert restored.item_signals("s", NOW + WEEK) == journal.item_signals("s", NOW + WEEK)
+
+def test_import_widens_legacy_columns_and_rejects_wrong_item_sizes():
+    journal = ProgressJournal()
+    journal.record("s", make_item(), episodes=3, at=NOW)
+    state = journal.export_state()
+
+    legacy = {name: [typecode, encoded] for name, (typecode, _, encoded) in state["s"]["columns"].items()}
+    legacy["episodes"] = ["i", base64.b64encode(array("i", [3]).tobytes()).decode("ascii")]
+    wrong = {name: list(column) for name, column in state["s"]["columns"].items()}
+    wrong["episodes"][1] = 4
+
+    restored = ProgressJournal()
+    restored.import_state({"legacy": {"item_ids": ["a"], "columns": legacy},
+                           "wrong": {"item_ids": ["a"], "columns": wrong}})
+    assert set(restored.sessions) == {"legacy"}
+    assert restored.sessions["legacy"].episodes == array("q", [3])
+
+def test_truncated_column_is_rejected():
+    journal = ProgressJournal()
+    journal.record("s", make_item(), episodes=3, at=NOW)
+    state = journal.export_state()
+    state["s"]["columns"]["episodes"][2] = base64.b64encode(b"\x00" * 5).decode("ascii")
+
+    restored = ProgressJournal()
+    restored.import_state(state)
+    assert restored.sessions == {}
@@ -0,0 +1,42 @@
+import time
+
+import pytest
+
+from src.services.rate_limit import RateLimitedError, RateLimiterRegistry
+
+def make_registry(rate=20.0, burst=1.0):
+    return RateLimiterRegistry(1.0, 1.0, 10, {"api.test": (rate, burst)})
+
+def test_acquire_upstream_refuses_when_empty():
+    limits = make_registry()
+    limits.acquire_upstream("api.test")
+    with pytest.raises(RateLimitedError) as error:
+        limits.acquire_upstream("api.test")
+    assert 0 < error.value.retry_after <= 0.05
+    # Hosts without a configured limit are never throttled
+    limits.acquire_upstream("other.test")
+
+def test_reserve_waits_for_a_token_and_prepays_the_request():
+    limits = make_registry()
+    limits.acquire_upstream("api.test")
+
+    start = time.monotonic()
+    with limits.reserve_upstream("api.test", 1.0) as reserved:
+        assert reserved
+        assert time.monotonic() - start >= 0.03
+        # Paid for by the reservation rather than refused
+        limits.acquire_upstream("api.test")
+        with pytest.raises(RateLimitedError):
+            limits.acquire_upstream("api.test")
+
+def test_reserve_gives_up_after_max_wait():
+    limits = make_registry(rate=0.5)
+    limits.acquire_upstream("api.test")
+    with limits.reserve_upstream("api.test", 0.01) as reserved:
+        assert not reserved
+
+def test_unused_reservation_is_refunded():
+    limits = make_registry(rate=0.01)
+    with limits.reserve_upstream("api.test", 0.0) as reserved:
+        assert reserved
+    limits.acquire_upstream("api.test")
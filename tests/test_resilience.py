@@ -0,0 +1,28 @@
+import socket
+
+from src.clients.resilience import UpstreamGuard
+from src.services.deadline import Deadline
+from src.services.rate_limit import RateLimitedError
+
+def fail_with(error):
+    def fetch(deadline):
+        raise error
+    return fetch
+
+def test_socket_timeout_without_deadline_returns_default():
+    guard = UpstreamGuard("timeout.test", "Test")
+    assert guard.call(("q",), fail_with(socket.timeout("read timed out")), []) == []
+
+def test_socket_timeout_marks_the_deadline_partial():
+    guard = UpstreamGuard("timeout-deadline.test", "Test")
+    deadline = Deadline(5.0)
+    assert guard.call(("q",), fail_with(TimeoutError()), [], deadline) == []
+    assert deadline.reasons == ["Test q timed out"]
+
+def test_rate_limited_call_serves_stale_result():
+    guard = UpstreamGuard("limited.test", "Test")
+    assert guard.call(("q",), lambda deadline: ["fresh"], []) == ["fresh"]
+
+    deadline = Deadline(5.0)
+    assert guard.call(("q",), fail_with(RateLimitedError("limited.test over quota", 1.0)), [], deadline) == ["fresh"]
+    assert deadline.reasons == ["Test q rate limited"]
@@ -0,0 +1,118 @@
+from concurrent.futures import Future
+
+from src.clients import paging
+from src.clients.paging import iter_pages
+from src.config import config
+from src.models import MediaItem
+from src.tools.search_tools import SearchTools
+
+def make_fetcher(total: int, page_size: int):
+    calls = []
+
+    def fetch_page(page, wanted):
+        calls.append((page, wanted))
+        start = (page - 1) * page_size
+        return list(range(start, min(start + page_size, total))), start + page_size < total
+    return fetch_page, calls
+
+def test_walk_prefetches_only_what_is_still_wanted():
+    fetch_page, calls = make_fetcher(total=20, page_size=3)
+    assert list(iter_pages(fetch_page, max_items=5)) == [0, 1, 2, 3, 4]
+    assert calls == [(1, 5), (2, 2)]
+
+def test_walk_does_not_prefetch_when_the_first_page_is_enough():
+    fetch_page, calls = make_fetcher(total=20, page_size=3)
+    assert list(iter_pages(fetch_page, max_items=2)) == [0, 1]
+    assert calls == [(1, 2)]
+
+def test_unbounded_walk_reads_every_page():
+    fetch_page, calls = make_fetcher(total=7, page_size=3)
+    assert list(iter_pages(fetch_page)) == list(range(7))
+    assert [page for page, _ in calls] == [1, 2, 3]
+
+def test_extend_continues_into_the_rest_of_the_page_and_beyond():
+    fetch_page, calls = make_fetcher(total=20, page_size=3)
+    walk = iter_pages(fetch_page, max_items=2)
+    assert [next(walk), next(walk)] == [0, 1]
+
+    walk.extend(3)
+    assert list(walk) == [2, 3, 4]
+    assert calls == [(1, 2), (2, 2)]
+
+def test_close_cancels_a_queued_prefetch(monkeypatch):
+    queued = []
+
+    class IdleExecutor:
+        def submit(self, fn, *args):
+            future = Future()
+            queued.append(future)
+            return future
+
+    monkeypatch.setattr(paging, "page_pool", IdleExecutor())
+    fetch_page, calls = make_fetcher(total=20, page_size=3)
+    walk = iter_pages(fetch_page, max_items=10)
+    assert next(walk) == 0
+
+    walk.close()
+    assert [future.cancelled() for future in queued] == [True]
+    assert calls == [(1, 10)]
+
+def make_search(total: int = 50):
+    tools = SearchTools()
+    walks = []
+
+    def iter_media(query, media_type, max_items=None, deadline=None):
+        def fetch_page(page, wanted):
+            start = (page - 1) * 10
+            items = [MediaItem(id=f"anilist_anime_{i}", source="anilist", type="anime", title=f"{query} {i}",
+                               overview="") for i in range(start, min(start + 10, total))]
+            return items, start + 10 < total
+        walk = iter_pages(fetch_page, max_items)
+        walks.append(walk)
+        return walk
+
+    tools.iter_media = iter_media
+    return tools, walks
+
+def ids(page):
+    return [int(item["id"].rsplit("_", 1)[1]) for item in page["items"]]
+
+def test_same_search_from_two_clients_gets_separate_cursors():
+    tools, walks = make_search()
+    first = tools.search_page("gundam", "anime", limit=5)
+    second = tools.search_page("gundam", "anime", limit=5)
+
+    assert first["next_cursor"] != second["next_cursor"]
+    assert len(tools.live_searches) == 2
+    assert ids(tools.search_page("", "", first["next_cursor"], 5)) == [5, 6, 7, 8, 9]
+    assert ids(tools.search_page("", "", second["next_cursor"], 5)) == [5, 6, 7, 8, 9]
+    # Both resumed their own live walk rather than starting a new one
+    assert len(walks) == 2
+
+def test_cursor_that_is_no_longer_live_walks_again():
+    tools, walks = make_search()
+    cursor = tools.search_page("gundam", "anime", limit=5)["next_cursor"]
+    tools.live_searches.clear()
+
+    page = tools.search_page("", "", cursor, 5)
+    assert ids(page) == [5, 6, 7, 8, 9]
+    assert len(walks) == 2
+
+def test_last_page_has_no_cursor():
+    tools, _ = make_search(total=8)
+    page = tools.search_page("gundam", "anime", limit=5)
+    page = tools.search_page("", "", page["next_cursor"], 5)
+    assert ids(page) == [5, 6, 7]
+    assert page["next_cursor"] is None
+    assert not tools.live_searches
+
+def test_limits_are_clamped_for_pages_and_tool_calls():
+    tools, _ = make_search(total=500)
+    assert len(tools.search_page("gundam", "anime", limit=10000)["items"]) == config.SEARCH_MAX_LIMIT
+
+    seen = []
+    tools.search_media = lambda query, media_type, limit=10, deadline=None: seen.append(limit) or []
+    handler = tools.get_tool_handlers()["search_media"]
+    for limit in (5000, -3, "7", "lots", None):
+        handler("s", {"query": "q", "media_type": "anime", "limit": limit})
+    assert seen == [config.SEARCH_MAX_LIMIT, 1, 7, 10, 10]
@@ -0,0 +1,85 @@
+import json
+
+from src.agents.orchestrator import SIMILAR_RE
+from src.models import MediaItem
+from src.services.similarity_index import SimilarityIndex
+
+def make_item(item_id: str, title: str, overview: str = "a lone swordsman wanders a ruined kingdom") -> MediaItem:
+    return MediaItem(id=item_id, source="anilist", type="anime", title=title, overview=overview,
+                     genres=("Action",), status="completed")
+
+def test_similar_phrasing_is_not_matched_by_ordinary_requests():
+    assert SIMILAR_RE.search("show me something similar to Cowboy Bebop?").group(1) == "Cowboy Bebop"
+    assert SIMILAR_RE.search("more like Berserk please").group(1) == "Berserk please"
+    assert SIMILAR_RE.search("I'd like something like a comedy") is None
+
+def test_find_by_title_exact_then_shortest_partial():
+    index = SimilarityIndex()
+    index.add(make_item("1", "Attack on Titan: Final Season"))
+    index.add(make_item("2", "Attack  on Titan"))
+    index.add(make_item("3", "Titan"))
+
+    assert index.find_by_title(" attack on titan ").id == "2"
+    assert index.find_by_title("on titan: final").id == "1"
+    assert index.find_by_title("final season").id == "1"
+    # Partial matches are on whole words
+    assert index.find_by_title("tita") is None
+    assert index.find_by_title("berserk") is None
+    assert index.find_by_title("   ") is None
+
+def test_catalog_copies_do_not_carry_user_status():
+    index = SimilarityIndex()
+    index.add(make_item("1", "Berserk"))
+    assert index.get("1").status == "planned"
+
+def test_cap_evicts_the_least_recently_added_title():
+    index = SimilarityIndex(max_items=2)
+    index.add(make_item("1", "Berserk"))
+    index.add(make_item("2", "Vagabond"))
+    # Seeing Berserk again keeps it ahead of Vagabond
+    index.add(make_item("1", "Berserk"))
+    index.add(make_item("3", "Vinland Saga"))
+
+    assert set(index.items) == {"1", "3"}
+    assert index.find_by_title("vagabond") is None
+    assert "2" not in index.signatures
+    assert all("2" not in ids for table in index.buckets for ids in table.values())
+    assert all(count > 0 for count in index.doc_freq.values())
+    assert [item.id for item, _ in index.similar("1")] == ["3"]
+
+def test_save_appends_changes_and_reloads(tmp_path):
+    path = str(tmp_path / "index.jsonl")
+    index = SimilarityIndex(path, max_items=2)
+    index.add(make_item("1", "Berserk"))
+    index.save()
+    index.add(make_item("2", "Vagabond"))
+    index.add(make_item("3", "Vinland Saga"))
+    index.save()
+
+    with open(path, encoding="utf-8") as f:
+        lines = [json.loads(line) for line in f]
+    assert lines[0]["version"] == 2
+    # The first save wrote Berserk; the second appended the two adds and the eviction
+    assert [line.get("remove") or line["item"]["id"] for line in lines[1:]] == ["1", "2", "3", "1"]
+
+    reloaded = SimilarityIndex(path, max_items=2)
+    assert list(reloaded.items) == ["2", "3"]
+    assert reloaded.log_records == 4
+    assert reloaded.find_by_title("vinland saga").id == "3"
+
+def test_save_skips_clean_index_and_rewrites_after_torn_line(tmp_path):
+    path = str(tmp_path / "index.jsonl")
+    index = SimilarityIndex(path)
+    index.add(make_item("1", "Berserk"))
+    index.save()
+    with open(path, "a", encoding="utf-8") as f:
+        f.write('{"item": {"id"')
+
+    reloaded = SimilarityIndex(path)
+    assert list(reloaded.items) == ["1"]
+    reloaded.save()
+    assert open(path, encoding="utf-8").read().endswith('{"item": {"id"')
+
+    reloaded.add(make_item("2", "Vagabond"))
+    reloaded.save()
+    assert list(SimilarityIndex(path).items) == ["1", "2"]
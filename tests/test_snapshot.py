@@ -0,0 +1,111 @@
+import struct
+
+from src.clients.resilience import StaleCache
+from src.models import MediaItem
+from src.services.memory_service import MemoryService
+from src.services.session_service import SessionService
+from src.services.snapshot import (
+    CODEC_ZLIB_JSON, HEADER, ITEM_SIZE, SnapshotManager, SnapshotReader, decode_page, encode_page,
+    encode_section, write_snapshot
+)
+
+def make_item(item_id: str) -> MediaItem:
+    return MediaItem(id=item_id, source="anilist", type="anime", title=item_id.title(), overview="",
+                     genres=("Action",), status="watching", progress_episodes=3)
+
+def test_sections_round_trip_through_the_mapped_file(tmp_path):
+    path = str(tmp_path / "state.snapshot")
+    write_snapshot(path, [("a", 1, CODEC_ZLIB_JSON, encode_section({"x": [1, 2]})),
+                          ("b", 2, CODEC_ZLIB_JSON, encode_section("two"))])
+
+    reader = SnapshotReader(path)
+    try:
+        assert reader.names() == ["a", "b"]
+        assert reader.load("a", 1) == {"x": [1, 2]}
+        assert reader.load("b", 2) == "two"
+        # A section written with another schema is skipped rather than misread
+        assert reader.load("b", 1) is None
+        assert reader.load("missing", 1) is None
+    finally:
+        reader.close()
+
+def test_corrupt_section_fails_its_checksum(tmp_path):
+    path = str(tmp_path / "state.snapshot")
+    write_snapshot(path, [("a", 1, CODEC_ZLIB_JSON, encode_section({"x": 1}))])
+    with open(path, "r+b") as f:
+        f.seek(HEADER.size)
+        first = f.read(1)
+        f.seek(HEADER.size)
+        f.write(bytes([first[0] ^ 0xFF]))
+
+    reader = SnapshotReader(path)
+    assert reader.load("a", 1) is None
+    reader.close()
+
+def test_header_records_and_checks_item_size(tmp_path):
+    path = str(tmp_path / "state.snapshot")
+    write_snapshot(path, [])
+    with open(path, "rb") as f:
+        assert HEADER.unpack(f.read(HEADER.size))[3] == ITEM_SIZE
+
+    with open(path, "r+b") as f:
+        f.seek(struct.calcsize("<8sHB"))
+        f.write(bytes([ITEM_SIZE * 2]))
+    assert SnapshotReader.open(path) is None
+
+def test_unreadable_files_are_ignored(tmp_path):
+    path = tmp_path / "state.snapshot"
+    assert SnapshotReader.open(str(path)) is None
+    path.write_bytes(b"not a snapshot at all, just some bytes")
+    assert SnapshotReader.open(str(path)) is None
+
+def test_manager_restores_state_sessions_and_caches(tmp_path):
+    path = str(tmp_path / "state.snapshot")
+    sessions = SessionService()
+    memory = MemoryService()
+    cache = StaleCache()
+    manager = SnapshotManager(path, sessions)
+    manager.register("memory", 1, memory.export_state, memory.import_state)
+    manager.register("journal", 1, memory.journal.export_state, memory.journal.import_state)
+    manager.register_cache("search", cache, encode_page, decode_page)
+
+    memory.add_media_item("s", make_item("a"))
+    sessions.create_session("s")
+    sessions.update_session("s", {"role": "user", "content": "hi"})
+    cache.put(("anime", "naruto", 1), ([make_item("b")], True))
+    manager.save()
+    assert manager.stats["saves"] == 1
+
+    restored_sessions = SessionService()
+    restored_memory = MemoryService()
+    restored_cache = StaleCache()
+    restored = SnapshotManager(path, restored_sessions)
+    restored.register("memory", 1, restored_memory.export_state, restored_memory.import_state)
+    restored.register("journal", 1, restored_memory.journal.export_state, restored_memory.journal.import_state)
+    restored.register_cache("search", restored_cache, encode_page, decode_page)
+
+    [item] = restored_memory.get_library("s")
+    assert (item.id, item.status, item.progress_episodes, item.genres) == ("a", "watching", 3, ("Action",))
+    assert restored_memory.journal.event_count("s") == 1
+    # Sessions and caches are decoded from the mapped file on first use
+    assert not restored_sessions.sessions
+    assert restored_sessions.get_session("s").conversation_history == [{"role": "user", "content": "hi"}]
+    assert restored.stats["sessions_restored"] == 1
+    items, has_next = restored_cache.get(("anime", "naruto", 1))
+    assert has_next and items[0].title == "B"
+
+def test_untouched_sessions_are_carried_over_on_the_next_save(tmp_path):
+    path = str(tmp_path / "state.snapshot")
+    sessions = SessionService()
+    sessions.create_session("old")
+    SnapshotManager(path, sessions).save()
+
+    later = SessionService()
+    manager = SnapshotManager(path, later)
+    later.create_session("new")
+    manager.save()
+
+    final = SessionService()
+    SnapshotManager(path, final)
+    assert final.get_session("old") is not None
+    assert final.get_session("new") is not None